@@ -6,7 +6,12 @@ from alembic import context
 from app.config.database import SQLITE_URL
 from app.models.base import Base
 from app.models.categories import Category  # noqa: F401
+from app.models.idempotency import IdempotencyRecord  # noqa: F401
+from app.models.leases import Lease  # noqa: F401
 from app.models.notes import Attachment, Notes  # noqa: F401
+from app.models.tokens import RevokedToken  # noqa: F401
+from app.models.uploads import UploadSession  # noqa: F401
+from app.models.usage import StorageUsage  # noqa: F401
 from app.models.users import User, UserNotes  # noqa: F401
 
 # this is the Alembic Config object, which provides
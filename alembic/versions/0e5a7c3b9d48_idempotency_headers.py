@@ -0,0 +1,36 @@
+"""Store the response headers of idempotency records
+
+Revision ID: 0e5a7c3b9d48
+Revises: 7f2b9d4e6a15
+Create Date: 2026-10-20 09:14:37.620941
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0e5a7c3b9d48'
+down_revision: Union[str, None] = '7f2b9d4e6a15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Las respuestas guardadas caducan en horas: las que no tienen cabeceras
+    # se descartan en lugar de repetirlas incompletas
+    op.execute('DELETE FROM idempotencyrecord')
+    with op.batch_alter_table('idempotencyrecord', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('headers', sa.JSON(), nullable=False))
+        batch_op.drop_column('content_type')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('DELETE FROM idempotencyrecord')
+    with op.batch_alter_table('idempotencyrecord', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_type', sa.String(length=100), nullable=True))
+        batch_op.drop_column('headers')
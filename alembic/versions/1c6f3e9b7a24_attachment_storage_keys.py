@@ -0,0 +1,42 @@
+"""Attachment file_path as a storage key
+
+Revision ID: 1c6f3e9b7a24
+Revises: 4d8c2a7e1f93
+Create Date: 2026-10-19 23:05:31.772940
+
+"""
+from pathlib import Path, PurePath
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.config.settings import settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1c6f3e9b7a24'
+down_revision: Union[str, None] = '4d8c2a7e1f93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+UPDATE = sa.text('UPDATE attachment SET file_path = :file_path WHERE id = :id')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # UPLOAD_DIR/<user_id>/<fichero> pasa a ser la clave <user_id>/<fichero>
+    bind = op.get_bind()
+    rows = bind.execute(sa.text('SELECT id, file_path FROM attachment')).all()
+    for attachment_id, file_path in rows:
+        key = '/'.join(PurePath(file_path).parts[-2:])
+        bind.execute(UPDATE, {'file_path': key, 'id': attachment_id})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    rows = bind.execute(sa.text('SELECT id, file_path FROM attachment')).all()
+    for attachment_id, key in rows:
+        file_path = str(Path(settings.UPLOAD_DIR).joinpath(*key.split('/')))
+        bind.execute(UPDATE, {'file_path': file_path, 'id': attachment_id})
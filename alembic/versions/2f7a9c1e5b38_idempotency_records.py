@@ -0,0 +1,37 @@
+"""Idempotency records
+
+Revision ID: 2f7a9c1e5b38
+Revises: 9a4b6c3d1e27
+Create Date: 2026-10-19 17:41:05.218334
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2f7a9c1e5b38'
+down_revision: Union[str, None] = '9a4b6c3d1e27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('idempotencyrecord',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('status_code', sa.Integer(), nullable=False),
+    sa.Column('content_type', sa.String(length=100), nullable=True),
+    sa.Column('body', sa.LargeBinary(), nullable=False),
+    sa.Column('expiresAt', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index(op.f('ix_idempotencyrecord_expiresAt'), 'idempotencyrecord', ['expiresAt'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_idempotencyrecord_expiresAt'), table_name='idempotencyrecord')
+    op.drop_table('idempotencyrecord')
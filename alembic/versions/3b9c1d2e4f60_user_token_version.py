@@ -0,0 +1,32 @@
+"""User token version
+
+Revision ID: 3b9c1d2e4f60
+Revises: 154e4a821daa
+Create Date: 2026-10-19 09:12:04.512337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9c1d2e4f60'
+down_revision: Union[str, None] = '154e4a821daa'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'user',
+        sa.Column('token_version', sa.Integer(), server_default='0', nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('token_version')
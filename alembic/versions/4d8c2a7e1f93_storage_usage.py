@@ -0,0 +1,60 @@
+"""Attachment uploader and storage usage counters
+
+Revision ID: 4d8c2a7e1f93
+Revises: 8b3f6d2c9e71
+Create Date: 2026-10-19 21:42:10.381205
+
+"""
+from pathlib import PurePath
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4d8c2a7e1f93'
+down_revision: Union[str, None] = '8b3f6d2c9e71'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('attachment') as batch_op:
+        batch_op.add_column(sa.Column('user_id', sa.String(length=36), nullable=True))
+        batch_op.create_index(batch_op.f('ix_attachment_user_id'), ['user_id'], unique=False)
+        batch_op.create_foreign_key('fk_attachment_user_id_user', 'user', ['user_id'], ['id'], ondelete='SET NULL')
+    op.create_table('storageusage',
+    sa.Column('owner_id', sa.String(length=36), nullable=False),
+    sa.Column('bytes', sa.BigInteger(), server_default='0', nullable=False),
+    sa.Column('files', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('owner_id')
+    )
+
+    # Los adjuntos existentes se guardaron en UPLOAD_DIR/<user_id>/
+    bind = op.get_bind()
+    user_ids = set(bind.execute(sa.text('SELECT id FROM "user"')).scalars())
+    rows = bind.execute(sa.text('SELECT id, file_path FROM attachment')).all()
+    for attachment_id, file_path in rows:
+        owner = PurePath(file_path).parent.name
+        if owner in user_ids:
+            bind.execute(
+                sa.text('UPDATE attachment SET user_id = :user_id WHERE id = :id'),
+                {'user_id': owner, 'id': attachment_id},
+            )
+    for column in ('user_id', 'note_id'):
+        bind.execute(sa.text(
+            f'INSERT INTO storageusage (owner_id, bytes, files) '
+            f'SELECT {column}, SUM(file_size), COUNT(*) FROM attachment '
+            f'WHERE {column} IS NOT NULL GROUP BY {column}'
+        ))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('storageusage')
+    with op.batch_alter_table('attachment') as batch_op:
+        batch_op.drop_constraint('fk_attachment_user_id_user', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_attachment_user_id'))
+        batch_op.drop_column('user_id')
@@ -0,0 +1,33 @@
+"""Leases that elect a single worker for background tasks
+
+Revision ID: 5a1f8e2c7d39
+Revises: 0e5a7c3b9d48
+Create Date: 2026-10-20 11:02:19.384215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a1f8e2c7d39'
+down_revision: Union[str, None] = '0e5a7c3b9d48'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('lease',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('holder', sa.String(length=100), nullable=False),
+    sa.Column('expiresAt', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('lease')
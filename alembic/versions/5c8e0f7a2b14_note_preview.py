@@ -0,0 +1,31 @@
+"""Note preview
+
+Revision ID: 5c8e0f7a2b14
+Revises: 7d2e8a41c9b3
+Create Date: 2026-10-19 13:05:41.208114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c8e0f7a2b14'
+down_revision: Union[str, None] = '7d2e8a41c9b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('notes', sa.Column('preview', sa.String(length=200), nullable=True))
+    # Rellenar las notas existentes (mismo recorte que `make_preview`)
+    op.execute("UPDATE notes SET preview = substr(content, 1, 200)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('notes') as batch_op:
+        batch_op.drop_column('preview')
@@ -0,0 +1,72 @@
+"""Monotonic sequence for revoked tokens
+
+Revision ID: 6c4d2f8a1b57
+Revises: 5a1f8e2c7d39
+Create Date: 2026-10-20 16:41:08.527302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6c4d2f8a1b57'
+down_revision: Union[str, None] = '5a1f8e2c7d39'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = ('id', 'jti', 'user_id', 'expiresAt', 'createdAt', 'updatedAt', 'version', 'deletedAt')
+INDEXES = (
+    ('ix_revokedtoken_deletedAt', ['deletedAt'], False),
+    ('ix_revokedtoken_expiresAt', ['expiresAt'], False),
+    ('ix_revokedtoken_id', ['id'], True),
+    ('ix_revokedtoken_jti', ['jti'], True),
+)
+
+
+def _rebuild(*columns: sa.Column, **kwargs) -> None:
+    """Recrea `revokedtoken` con otra clave primaria conservando sus filas."""
+    op.create_table('_revokedtoken_new',
+    *columns,
+    sa.Column('jti', sa.String(length=36), nullable=False),
+    sa.Column('user_id', sa.String(length=36), nullable=True),
+    sa.Column('expiresAt', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.Column('createdAt', sa.TIMESTAMP(timezone=True), nullable=True),
+    sa.Column('updatedAt', sa.TIMESTAMP(timezone=True), nullable=True),
+    sa.Column('version', sa.Integer(), server_default='1', nullable=False),
+    sa.Column('deletedAt', sa.TIMESTAMP(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    **kwargs
+    )
+    columns_sql = ', '.join(f'"{column}"' for column in COLUMNS)
+    # En orden de creación: las filas existentes reciben `seq` crecientes
+    op.execute(
+        f'INSERT INTO _revokedtoken_new ({columns_sql}) '
+        f'SELECT {columns_sql} FROM revokedtoken ORDER BY "createdAt", rowid'
+    )
+    for name, _, _ in INDEXES:
+        op.drop_index(name, table_name='revokedtoken')
+    op.drop_table('revokedtoken')
+    op.rename_table('_revokedtoken_new', 'revokedtoken')
+    for name, index_columns, unique in INDEXES:
+        op.create_index(name, 'revokedtoken', index_columns, unique=unique)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _rebuild(
+        sa.Column('seq', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.PrimaryKeyConstraint('seq'),
+        sqlite_autoincrement=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _rebuild(
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
@@ -0,0 +1,33 @@
+"""Row version for optimistic concurrency
+
+Revision ID: 6e1d4b8a3f52
+Revises: 2f7a9c1e5b38
+Create Date: 2026-10-19 18:52:31.604127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e1d4b8a3f52'
+down_revision: Union[str, None] = '2f7a9c1e5b38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('category', 'user', 'notes', 'usernotes', 'attachment', 'revokedtoken')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in TABLES:
+        op.add_column(table, sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('version')
@@ -0,0 +1,43 @@
+"""Revoked tokens
+
+Revision ID: 7d2e8a41c9b3
+Revises: 3b9c1d2e4f60
+Create Date: 2026-10-19 10:03:47.118920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2e8a41c9b3'
+down_revision: Union[str, None] = '3b9c1d2e4f60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('revokedtoken',
+    sa.Column('jti', sa.String(length=36), nullable=False),
+    sa.Column('user_id', sa.String(length=36), nullable=True),
+    sa.Column('expiresAt', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('createdAt', sa.TIMESTAMP(timezone=True), nullable=True),
+    sa.Column('updatedAt', sa.TIMESTAMP(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_revokedtoken_expiresAt'), 'revokedtoken', ['expiresAt'], unique=False)
+    op.create_index(op.f('ix_revokedtoken_id'), 'revokedtoken', ['id'], unique=True)
+    op.create_index(op.f('ix_revokedtoken_jti'), 'revokedtoken', ['jti'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_revokedtoken_jti'), table_name='revokedtoken')
+    op.drop_index(op.f('ix_revokedtoken_id'), table_name='revokedtoken')
+    op.drop_index(op.f('ix_revokedtoken_expiresAt'), table_name='revokedtoken')
+    op.drop_table('revokedtoken')
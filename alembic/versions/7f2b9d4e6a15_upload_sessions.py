@@ -0,0 +1,45 @@
+"""Resumable upload sessions
+
+Revision ID: 7f2b9d4e6a15
+Revises: 1c6f3e9b7a24
+Create Date: 2026-10-20 00:12:48.503117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7f2b9d4e6a15'
+down_revision: Union[str, None] = '1c6f3e9b7a24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('uploadsession',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('user_id', sa.String(length=36), nullable=False),
+    sa.Column('note_id', sa.String(length=36), nullable=False),
+    sa.Column('filename', sa.String(length=255), nullable=False),
+    sa.Column('mime_type', sa.String(length=100), nullable=False),
+    sa.Column('description', sa.String(length=255), nullable=True),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('received', sa.BigInteger(), server_default='0', nullable=False),
+    sa.Column('sha256', sa.String(length=64), nullable=True),
+    sa.Column('createdAt', sa.TIMESTAMP(timezone=True), nullable=True),
+    sa.Column('expiresAt', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['note_id'], ['notes.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_uploadsession_expiresAt'), 'uploadsession', ['expiresAt'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_uploadsession_expiresAt'), table_name='uploadsession')
+    op.drop_table('uploadsession')
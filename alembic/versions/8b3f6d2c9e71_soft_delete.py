@@ -0,0 +1,35 @@
+"""Soft delete tombstones
+
+Revision ID: 8b3f6d2c9e71
+Revises: 6e1d4b8a3f52
+Create Date: 2026-10-19 20:07:44.918265
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b3f6d2c9e71'
+down_revision: Union[str, None] = '6e1d4b8a3f52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('category', 'user', 'notes', 'usernotes', 'attachment', 'revokedtoken')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in TABLES:
+        op.add_column(table, sa.Column('deletedAt', sa.TIMESTAMP(timezone=True), nullable=True))
+        op.create_index(op.f(f'ix_{table}_deletedAt'), table, ['deletedAt'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TABLES:
+        op.drop_index(op.f(f'ix_{table}_deletedAt'), table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('deletedAt')
@@ -0,0 +1,40 @@
+"""Usernotes unique user/note pair
+
+Revision ID: 9a4b6c3d1e27
+Revises: 5c8e0f7a2b14
+Create Date: 2026-10-19 15:22:10.734902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4b6c3d1e27'
+down_revision: Union[str, None] = '5c8e0f7a2b14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Conservar una sola fila por par antes de crear el índice único
+    op.execute(
+        "DELETE FROM usernotes WHERE id NOT IN "
+        "(SELECT MIN(id) FROM usernotes GROUP BY user_id, note_id)"
+    )
+    op.create_index(
+        'ix_usernotes_user_id_note_id',
+        'usernotes',
+        ['user_id', 'note_id'],
+        unique=True,
+    )
+    op.create_index(op.f('ix_usernotes_note_id'), 'usernotes', ['note_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_usernotes_note_id'), table_name='usernotes')
+    op.drop_index('ix_usernotes_user_id_note_id', table_name='usernotes')
@@ -0,0 +1,140 @@
+"""
+Dependencias de acceso a notas y adjuntos.
+
+Cada una resuelve el permiso y carga el objeto en una sola consulta sobre el
+índice único (`user_id`, `note_id`) de `usernotes`. FastAPI memoriza el
+resultado de cada dependencia durante la petición, así que varias
+dependencias que la usen no repiten la consulta.
+"""
+
+from datetime import datetime, timezone
+from typing import Any
+
+from fastapi import Depends, HTTPException, status
+from sqlalchemy import and_, select
+from sqlalchemy.orm import Session
+
+from app.auth.jwt import TokenData, get_active_token_data
+from app.config.database import get_db
+from app.models.notes import Attachment, Notes
+from app.models.uploads import UploadSession
+from app.models.users import UserNotes
+
+
+class NoteAccess:
+    """
+    Dependencia que devuelve la nota `note_id` si el usuario tiene acceso.
+
+    Las opciones de carga (`load_only`, `selectinload`...) las declara cada
+    endpoint al crear su instancia.
+    """
+
+    def __init__(self, *options: Any):
+        self.options = options
+
+    def __call__(
+        self,
+        note_id: str,
+        db: Session = Depends(get_db),
+        current_user: TokenData = Depends(get_active_token_data),
+    ) -> Notes:
+        note = (
+            db.execute(
+                select(Notes)
+                .join(
+                    UserNotes,
+                    and_(
+                        UserNotes.note_id == Notes.id,
+                        UserNotes.user_id == current_user.id,
+                    ),
+                )
+                .where(Notes.id == note_id)
+                .options(*self.options)
+            )
+            .unique()
+            .scalar_one_or_none()
+        )
+        if note is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Nota no encontrada o no tienes permiso para acceder a ella",
+            )
+        return note
+
+
+class AttachmentAccess:
+    """Dependencia que devuelve el adjunto si el usuario tiene acceso a su nota."""
+
+    def __init__(self, *options: Any):
+        self.options = options
+
+    def __call__(
+        self,
+        attachment_id: str,
+        db: Session = Depends(get_db),
+        current_user: TokenData = Depends(get_active_token_data),
+    ) -> Attachment:
+        # LEFT JOIN: distingue adjunto inexistente (404) de ajeno (403); el
+        # JOIN con la nota oculta los adjuntos de notas borradas
+        row = db.execute(
+            select(Attachment, UserNotes.user_id)
+            .join(Notes, Notes.id == Attachment.note_id)
+            .outerjoin(
+                UserNotes,
+                and_(
+                    UserNotes.note_id == Attachment.note_id,
+                    UserNotes.user_id == current_user.id,
+                ),
+            )
+            .where(Attachment.id == attachment_id)
+            .options(*self.options)
+        ).first()
+        if row is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Archivo adjunto no encontrado",
+            )
+        attachment, user_id = row
+        if user_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="No tienes permiso para acceder a este archivo adjunto",
+            )
+        return attachment
+
+
+def require_upload_access(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_active_token_data),
+) -> UploadSession:
+    """
+    Sesión de subida vigente del usuario, mientras conserve el acceso a la
+    nota; las de otros usuarios, caducadas o de notas borradas dan 404.
+    """
+    upload = db.execute(
+        select(UploadSession)
+        .join(Notes, Notes.id == UploadSession.note_id)
+        .join(
+            UserNotes,
+            and_(
+                UserNotes.note_id == UploadSession.note_id,
+                UserNotes.user_id == current_user.id,
+            ),
+        )
+        .where(
+            UploadSession.id == upload_id,
+            UploadSession.user_id == current_user.id,
+            UploadSession.expiresAt > datetime.now(timezone.utc),
+        )
+    ).scalar_one_or_none()
+    if upload is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Subida no encontrada o caducada",
+        )
+    return upload
+
+
+require_note_access = NoteAccess()
+require_attachment_access = AttachmentAccess()
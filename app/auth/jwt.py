@@ -1,15 +1,21 @@
+import threading
+import time
+import uuid
 from datetime import datetime, timedelta
-from typing import Annotated, Optional
+from typing import Annotated, Any, Dict, Optional, Tuple
 
 import jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import BackgroundTasks, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from passlib.context import CryptContext
 from pydantic import BaseModel
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
-from app.config.database import get_db
+from app.auth.revocation import denylist
+from app.config.database import SessionLocal, get_db
+from app.config.settings import settings
 from app.helpers.constance import ALGORITHM, SECRET_KEY, TIMEZONE_LOCAL
 from app.models.users import User
 
@@ -17,7 +23,12 @@ from app.models.users import User
 
 
 # Utilidades para hash de contraseñas
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# El coste definitivo se fija al arrancar (ver `configure_password_hashing`)
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__min_rounds=settings.BCRYPT_MIN_ROUNDS,
+)
 
 # OAuth2 con flujo de contraseña para obtener token JWT
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
@@ -34,6 +45,139 @@ class TokenData(BaseModel):
     """Datos contenidos en el token."""
 
     username: Optional[str] = None
+    id: Optional[str] = None
+    is_admin: bool = False
+    is_active: bool = True
+    token_version: int = 0
+    jti: Optional[str] = None
+    exp: Optional[float] = None
+
+    @classmethod
+    def from_user(cls, user: User, **claims: Any) -> "TokenData":
+        return cls(
+            username=user.username,
+            id=user.id,
+            is_admin=user.is_admin,
+            is_active=user.is_active,
+            token_version=user.token_version,
+            **claims,
+        )
+
+
+class TokenVersionCache:
+    """
+    Caché en memoria de `User.token_version` por id de usuario.
+
+    Evita una consulta por petición al validar tokens. Los cambios hechos en
+    este proceso se reflejan al instante; los de otros procesos, tras `ttl`.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 100_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[Optional[int], float]] = {}
+
+    def get(self, db: Session, user_id: str) -> Optional[int]:
+        """Devuelve la versión vigente o None si el usuario no existe."""
+        now = time.monotonic()
+        entry = self._entries.get(user_id)
+        if entry and entry[1] > now:
+            return entry[0]
+        version = db.query(User.token_version).filter(User.id == user_id).scalar()
+        self.set(user_id, version)
+        return version
+
+    def set(self, user_id: str, version: Optional[int]) -> None:
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[user_id] = (version, time.monotonic() + self.ttl)
+
+    def forget(self, user_id: str) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+token_versions = TokenVersionCache(ttl=settings.TOKEN_VERSION_CACHE_SECONDS)
+
+
+def bump_token_version(user: User) -> None:
+    """
+    Invalida todos los tokens emitidos para el usuario al hacer commit. Tras
+    el commit hay que llamar a `publish_token_version`: si la transacción
+    falla, la caché no debe tener una versión que no llegó a guardarse.
+    """
+    user.token_version = (user.token_version or 0) + 1
+
+
+def publish_token_version(user: User) -> None:
+    """Lleva a la caché del proceso la versión ya guardada del usuario."""
+    token_versions.set(user.id, user.token_version)
+
+
+def calibrate_bcrypt_rounds(
+    target_ms: float, min_rounds: int = 10, max_rounds: int = 16
+) -> int:
+    """
+    Elige el coste bcrypt más alto cuyo hash no supere `target_ms`.
+
+    Se mide el coste mínimo y se extrapola: cada ronda adicional duplica el
+    tiempo de cálculo.
+    """
+    handler = pwd_context.handler("bcrypt").using(rounds=min_rounds)
+    elapsed = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        handler.hash("calibration")
+        elapsed = min(elapsed, (time.perf_counter() - start) * 1000)
+    rounds = min_rounds
+    while rounds < max_rounds and elapsed * 2 <= target_ms:
+        elapsed *= 2
+        rounds += 1
+    return rounds
+
+
+def configure_password_hashing() -> int:
+    """
+    Fija el coste bcrypt al arrancar.
+
+    Los hashes con menos rondas quedan marcados para rehash en el siguiente
+    login correcto (ver `authenticate_user`).
+    """
+    rounds = settings.BCRYPT_ROUNDS or calibrate_bcrypt_rounds(
+        settings.BCRYPT_TARGET_MS,
+        settings.BCRYPT_MIN_ROUNDS,
+        settings.BCRYPT_MAX_ROUNDS,
+    )
+    pwd_context.update(bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds)
+    return rounds
+
+
+def current_bcrypt_rounds() -> int:
+    return int(pwd_context.handler("bcrypt").default_rounds)
+
+
+def password_cost_distribution(db: Session) -> Dict[int, int]:
+    """Cuenta los usuarios por coste de hash, agregando en la base de datos."""
+    # Formato modular crypt: "$2b$" + dos dígitos de coste
+    cost = func.substr(User.hashed_password, 5, 2)
+    rows = db.query(cost, func.count()).group_by(cost).all()
+    return {int(rounds): count for rounds, count in rows if rounds and rounds.isdigit()}
+
+
+def rehash_password(user_id: str, old_hash: str, password: str) -> None:
+    """Recalcula el hash con el coste vigente, fuera de la petición."""
+    new_hash = pwd_context.hash(password)
+    db = SessionLocal()
+    try:
+        # Solo si nadie cambió la contraseña mientras tanto
+        db.query(User).filter(
+            User.id == user_id, User.hashed_password == old_hash
+        ).update({"hashed_password": new_hash}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -51,62 +195,151 @@ def get_user(db: Session, username: str | None) -> Optional[User]:
     return db.query(User).filter(User.username == username).first()
 
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
-    """Autentica a un usuario verificando sus credenciales."""
+def authenticate_user(
+    db: Session,
+    username: str,
+    password: str,
+    background_tasks: Optional[BackgroundTasks] = None,
+) -> Optional[User]:
+    """
+    Autentica a un usuario verificando sus credenciales.
+
+    Si el hash usa un coste desactualizado y se indica `background_tasks`, se
+    programa el rehash para después de enviar la respuesta.
+    """
     user = get_user(db, username)
     if not user or not verify_password(password, user.hashed_password):
         return None
+    if background_tasks is not None and pwd_context.needs_update(
+        user.hashed_password
+    ):
+        background_tasks.add_task(
+            rehash_password, user.id, user.hashed_password, password
+        )
     return user
 
 
-def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
+def create_access_token(
+    data: dict, expires_delta: timedelta | None = None, user: User | None = None
+) -> str:
+    """
+    Genera un JWT firmado.
+
+    Si se indica `user`, el token incluye los claims necesarios para autorizar
+    sin cargar el usuario (`uid`, `is_admin`, `is_active`, `token_version`).
+    """
     to_encode = data.copy()
+    if user is not None:
+        to_encode.update(
+            {
+                "sub": user.username,
+                "uid": user.id,
+                "is_admin": user.is_admin,
+                "is_active": user.is_active,
+                "token_version": user.token_version,
+            }
+        )
     if expires_delta:
         expire = datetime.now(TIMEZONE_LOCAL) + expires_delta
     else:
         expire = datetime.now(TIMEZONE_LOCAL) + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": str(uuid.uuid4())})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
-async def get_current_user(
+async def get_token_data(
     token: Annotated[str, Depends(oauth2_scheme)], db: Session = Depends(get_db)
-) -> User:
-    """Obtiene el usuario actual a partir del token JWT."""
+) -> TokenData:
+    """Valida el token y devuelve sus claims sin cargar el usuario."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload: Dict[str, Any] = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username = payload.get("sub")
         if username is None:
             raise credentials_exception
-        token_data = TokenData(username=username)
     except InvalidTokenError:
         raise credentials_exception
 
-    user = get_user(db, username=token_data.username)
-    if user is None:
+    jti = payload.get("jti")
+    if jti is not None:
+        denylist.sync()
+        if denylist.is_revoked(jti):
+            raise credentials_exception
+
+    if "uid" not in payload or "token_version" not in payload:
+        # Tokens sin claims de autorización: se resuelven desde la base de datos
+        user = get_user(db, username=username)
+        if user is None:
+            raise credentials_exception
+        return TokenData.from_user(user, jti=jti, exp=payload.get("exp"))
+
+    try:
+        token_data = TokenData(
+            username=username,
+            id=payload["uid"],
+            is_admin=payload.get("is_admin", False),
+            is_active=payload.get("is_active", True),
+            token_version=payload["token_version"],
+            jti=jti,
+            exp=payload.get("exp"),
+        )
+    except ValueError:
+        raise credentials_exception
+    if token_versions.get(db, token_data.id) != token_data.token_version:
         raise credentials_exception
+    return token_data
+
+
+async def get_active_token_data(
+    token_data: Annotated[TokenData, Depends(get_token_data)],
+) -> TokenData:
+    """Verifica desde los claims que el usuario actual esté activo."""
+    if not token_data.is_active:
+        raise HTTPException(status_code=400, detail="Usuario inactivo")
+    return token_data
+
+
+async def get_admin_token_data(
+    token_data: Annotated[TokenData, Depends(get_token_data)],
+) -> TokenData:
+    """Verifica desde los claims que el usuario actual sea administrador."""
+    if not token_data.is_admin:
+        raise HTTPException(status_code=400, detail="Usuario no autorizado")
+    return token_data
+
+
+async def get_current_user(
+    token_data: Annotated[TokenData, Depends(get_token_data)],
+    db: Session = Depends(get_db),
+) -> User:
+    """Obtiene el usuario actual a partir del token JWT."""
+    # Session.get usa el identity map: no repite la consulta si ya se cargó
+    user = db.get(User, token_data.id)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
 
 async def get_current_active_user(
+    token_data: Annotated[TokenData, Depends(get_active_token_data)],
     current_user: Annotated[User, Depends(get_current_user)],
 ) -> User:
-    """Verifica que el usuario actual esté activo."""
-    if not current_user.is_active:
-        raise HTTPException(status_code=400, detail="Usuario inactivo")
+    """Obtiene el usuario actual verificando que esté activo."""
     return current_user
 
 
 async def get_current_admin_user(
+    token_data: Annotated[TokenData, Depends(get_admin_token_data)],
     current_user: Annotated[User, Depends(get_current_user)],
 ) -> User:
-    """Verifica que el usuario actual sea administrador."""
-    if not current_user.is_admin:
-        raise HTTPException(status_code=400, detail="Usuario no autorizado")
+    """Obtiene el usuario actual verificando que sea administrador."""
     return current_user
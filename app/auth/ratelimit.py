@@ -0,0 +1,216 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Iterator, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from app.config.settings import settings
+
+
+class RateLimitBackend(ABC):
+    """
+    Almacén del estado del limitador.
+
+    La implementación en memoria sirve para un solo proceso; con varios
+    workers se debe usar un backend compartido (p. ej. Redis) que implemente
+    estas mismas operaciones de forma atómica.
+    """
+
+    @abstractmethod
+    def take(self, key: str, capacity: int, rate: float, now: float) -> float:
+        """Consume un token del bucket; devuelve 0 o los segundos de espera."""
+
+    @abstractmethod
+    def add_failure(self, key: str, window: float, now: float) -> int:
+        """Registra un fallo y devuelve los fallos dentro de la ventana."""
+
+    @abstractmethod
+    def lock(self, key: str, until: float, now: float) -> None:
+        """Bloquea la clave hasta el instante indicado."""
+
+    @abstractmethod
+    def locked_until(self, key: str, now: float) -> float:
+        """Devuelve el fin del bloqueo vigente o 0 si no hay bloqueo."""
+
+    @abstractmethod
+    def clear(self, key: str) -> None:
+        """Olvida fallos y bloqueos de la clave."""
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Backend en memoria del proceso, acotado a `max_keys` claves (LRU)."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._failures: "OrderedDict[str, Deque[float]]" = OrderedDict()
+        self._locks: "OrderedDict[str, float]" = OrderedDict()
+
+    def _evict(self, store: "OrderedDict[str, object]") -> None:
+        while len(store) > self.max_keys:
+            store.popitem(last=False)
+
+    def take(self, key: str, capacity: int, rate: float, now: float) -> float:
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (float(capacity), now))
+            tokens = min(float(capacity), tokens + (now - last) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / rate
+            self._evict(self._buckets)  # type: ignore[arg-type]
+            return wait
+
+    def add_failure(self, key: str, window: float, now: float) -> int:
+        with self._lock:
+            failures = self._failures.pop(key, None) or deque()
+            while failures and failures[0] <= now - window:
+                failures.popleft()
+            failures.append(now)
+            self._failures[key] = failures
+            self._evict(self._failures)  # type: ignore[arg-type]
+            return len(failures)
+
+    def lock(self, key: str, until: float, now: float) -> None:
+        with self._lock:
+            self._locks.pop(key, None)
+            self._locks[key] = until
+            self._failures.pop(key, None)
+            # Con la misma duración de bloqueo, los más antiguos caducan antes
+            while self._locks:
+                oldest = next(iter(self._locks.values()))
+                if oldest > now:
+                    break
+                self._locks.popitem(last=False)
+            self._evict(self._locks)  # type: ignore[arg-type]
+
+    def locked_until(self, key: str, now: float) -> float:
+        with self._lock:
+            until = self._locks.get(key, 0.0)
+            if until and until <= now:
+                del self._locks[key]
+                return 0.0
+            return until
+
+    def clear(self, key: str) -> None:
+        with self._lock:
+            self._failures.pop(key, None)
+            self._locks.pop(key, None)
+
+
+class LoginRateLimiter:
+    """
+    Limitador de intentos de login por usuario y por IP.
+
+    Combina un token bucket (ritmo sostenido con ráfagas) con bloqueos por
+    ventana deslizante tras varios fallos consecutivos. Se consulta antes de
+    verificar la contraseña para que el tráfico rechazado no cueste un bcrypt.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[RateLimitBackend] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.backend = backend or InMemoryRateLimitBackend()
+        self.clock = clock
+        self.enabled = settings.LOGIN_RATE_LIMIT_ENABLED
+        self.username_burst = settings.LOGIN_USERNAME_BURST
+        self.username_per_minute = settings.LOGIN_USERNAME_PER_MINUTE
+        self.ip_burst = settings.LOGIN_IP_BURST
+        self.ip_per_minute = settings.LOGIN_IP_PER_MINUTE
+        self.max_failures = settings.LOGIN_MAX_FAILURES
+        self.max_ip_failures = settings.LOGIN_MAX_IP_FAILURES
+        self.failure_window = settings.LOGIN_FAILURE_WINDOW_SECONDS
+        self.lockout = settings.LOGIN_LOCKOUT_SECONDS
+
+    @staticmethod
+    def _keys(username: str, ip: str) -> Tuple[str, str]:
+        return f"login:user:{username.strip().lower()}", f"login:ip:{ip}"
+
+    @staticmethod
+    def _reject(wait: float) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Demasiados intentos de inicio de sesión, intenta más tarde",
+            headers={"Retry-After": str(max(1, int(wait + 0.999)))},
+        )
+
+    def check(self, username: str, ip: str) -> None:
+        """Lanza 429 con `Retry-After` si el intento no debe procesarse."""
+        if not self.enabled:
+            return
+        now = self.clock()
+        user_key, ip_key = self._keys(username, ip)
+        for key in (user_key, ip_key):
+            until = self.backend.locked_until(key, now)
+            if until:
+                raise self._reject(until - now)
+        limits = (
+            (ip_key, self.ip_burst, self.ip_per_minute),
+            (user_key, self.username_burst, self.username_per_minute),
+        )
+        for key, burst, per_minute in limits:
+            wait = self.backend.take(key, burst, per_minute / 60, now)
+            if wait:
+                raise self._reject(wait)
+
+    def register_failure(self, username: str, ip: str) -> None:
+        if not self.enabled:
+            return
+        now = self.clock()
+        user_key, ip_key = self._keys(username, ip)
+        for key, max_failures in (
+            (user_key, self.max_failures),
+            (ip_key, self.max_ip_failures),
+        ):
+            failures = self.backend.add_failure(key, self.failure_window, now)
+            if failures >= max_failures:
+                self.backend.lock(key, now + self.lockout, now)
+
+    def register_success(self, username: str, ip: str) -> None:
+        if not self.enabled:
+            return
+        user_key, _ = self._keys(username, ip)
+        self.backend.clear(user_key)
+
+
+class HashAdmission:
+    """
+    Control de admisión para verificaciones bcrypt.
+
+    Limita cuántas verificaciones se ejecutan a la vez; si no hay hueco en
+    `timeout` segundos la petición se rechaza con 503 en lugar de encolar
+    trabajo de CPU que degradaría al resto de la API.
+    """
+
+    def __init__(self, slots: int, timeout: float):
+        self.slots = slots
+        self.timeout = timeout
+        self._semaphore = threading.BoundedSemaphore(slots)
+
+    @contextmanager
+    def admit(self) -> Iterator[None]:
+        if not self._semaphore.acquire(timeout=self.timeout):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Servidor ocupado, intenta de nuevo",
+                headers={"Retry-After": "1"},
+            )
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+
+login_rate_limiter = LoginRateLimiter()
+hash_admission = HashAdmission(
+    slots=settings.LOGIN_MAX_CONCURRENT_HASHES,
+    timeout=settings.LOGIN_ADMISSION_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,182 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Optional
+
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config.database import SessionLocal
+from app.config.settings import settings
+from app.models.tokens import RevokedToken
+
+
+class BloomFilter:
+    """Filtro de Bloom sobre un bytearray con doble hashing (blake2b)."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.size = max(
+            8,
+            int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)),
+        )
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str) -> Iterable[int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(
+            bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+
+class TokenDenylist:
+    """
+    Lista de `jti` revocados en memoria.
+
+    El filtro de Bloom descarta en microsegundos los tokens no revocados (el
+    caso habitual); solo ante un positivo se consulta el conjunto exacto, que
+    elimina los falsos positivos. El estado se sincroniza de forma
+    incremental (por `RevokedToken.seq`) con la tabla `revokedtoken` cada
+    `refresh_interval` segundos y se poda al expirar los tokens.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 10_000,
+        refresh_interval: float = 5,
+        error_rate: float = 0.01,
+    ):
+        self.refresh_interval = refresh_interval
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self._exact: Dict[str, float] = {}
+        self._bloom = BloomFilter(capacity, error_rate)
+        # Mayor `RevokedToken.seq` cargado
+        self._last_seq = 0
+        self._next_refresh = 0.0
+        self._next_prune = 0.0
+
+    def __len__(self) -> int:
+        return len(self._exact)
+
+    def add(self, jti: str, expires_at: float) -> None:
+        with self._lock:
+            if jti in self._exact:
+                return
+            self._exact[jti] = expires_at
+            if len(self._exact) > self._bloom.capacity:
+                self._rebuild(self._bloom.capacity * 2)
+            else:
+                self._bloom.add(jti)
+
+    def is_revoked(self, jti: str, now: Optional[float] = None) -> bool:
+        if jti not in self._bloom:
+            return False
+        expires_at = self._exact.get(jti)
+        if expires_at is None:
+            return False
+        return expires_at > (now if now is not None else time.time())
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Olvida los tokens expirados y reconstruye el filtro."""
+        now = now if now is not None else time.time()
+        with self._lock:
+            expired = [jti for jti, exp in self._exact.items() if exp <= now]
+            for jti in expired:
+                del self._exact[jti]
+            if expired:
+                self._rebuild(self._bloom.capacity)
+            return len(expired)
+
+    def _rebuild(self, capacity: int) -> None:
+        bloom = BloomFilter(max(capacity, len(self._exact)), self.error_rate)
+        for jti in self._exact:
+            bloom.add(jti)
+        self._bloom = bloom
+
+    def sync(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        force: bool = False,
+    ) -> None:
+        """
+        Carga las revocaciones nuevas de la tabla si toca refrescar.
+
+        Lee del primario las filas con `seq` mayor que la última vista. SQLite
+        serializa las escrituras, así que `seq` sigue el orden de confirmación
+        y una fila no puede aparecer después con un `seq` ya superado.
+        """
+        monotonic = time.monotonic()
+        if not force and monotonic < self._next_refresh:
+            return
+        self._next_refresh = monotonic + self.refresh_interval
+        now = datetime.now(timezone.utc)
+        with session_factory() as db:
+            rows = (
+                db.query(RevokedToken.seq, RevokedToken.jti, RevokedToken.expiresAt)
+                .filter(RevokedToken.seq > self._last_seq)
+                .filter(RevokedToken.expiresAt > now)
+                .order_by(RevokedToken.seq)
+                .all()
+            )
+        for seq, jti, expires_at in rows:
+            self.add(jti, _timestamp(expires_at))
+            self._last_seq = max(self._last_seq, seq)
+        if monotonic >= self._next_prune:
+            self._next_prune = monotonic + self.refresh_interval * 60
+            self.prune()
+
+
+def _timestamp(value: datetime) -> float:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def revoke_token(
+    db: Session, jti: str, expires_at: float, user_id: Optional[str] = None
+) -> None:
+    """Revoca un token hasta su expiración."""
+    denylist.add(jti, expires_at)
+    # Las filas expiradas ya no protegen nada: se purgan en cada escritura
+    db.execute(
+        delete(RevokedToken).where(
+            RevokedToken.expiresAt <= datetime.now(timezone.utc)
+        )
+    )
+    db.add(
+        RevokedToken(
+            jti=jti,
+            user_id=user_id,
+            expiresAt=datetime.fromtimestamp(expires_at, timezone.utc),
+        )
+    )
+    try:
+        db.commit()
+    except IntegrityError:
+        # Ya estaba revocado
+        db.rollback()
+
+
+denylist = TokenDenylist(
+    capacity=settings.REVOCATION_BLOOM_CAPACITY,
+    refresh_interval=settings.REVOCATION_REFRESH_SECONDS,
+)
@@ -0,0 +1,39 @@
+"""
+Genera el esquema OpenAPI en tiempo de build.
+
+La aplicación lo sirve desde el fichero (`OPENAPI_SCHEMA_FILE`) en lugar de
+recorrer todas las rutas y modelos en la primera petición a `/openapi.json`.
+
+Uso:
+    poetry run openapi [--output openapi.json]
+"""
+
+import argparse
+import json
+from pathlib import Path
+from typing import Optional, Sequence
+
+from app.config.settings import settings
+from app.main import create_app
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Lanzado con `poetry run openapi`."""
+    parser = argparse.ArgumentParser(description="Genera el esquema OpenAPI.")
+    parser.add_argument(
+        "--output", default=settings.OPENAPI_SCHEMA_FILE or "openapi.json"
+    )
+    args = parser.parse_args(argv)
+
+    # Sin fichero previo: el esquema se genera a partir de las rutas
+    app = create_app(settings.model_copy(update={"OPENAPI_SCHEMA_FILE": ""}))
+    output = Path(args.output)
+    output.write_text(
+        json.dumps(app.openapi(), ensure_ascii=False, separators=(",", ":")),
+        encoding="utf-8",
+    )
+    print(f"Esquema OpenAPI escrito en {output}")
+
+
+if __name__ == "__main__":
+    main()
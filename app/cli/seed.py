@@ -0,0 +1,428 @@
+"""
+Generador de datos sintéticos para pruebas de escala.
+
+Carga usuarios, categorías, notas, comparticiones (`usernotes`) y adjuntos
+directamente con inserciones por lotes de SQLAlchemy Core, sin pasar por el
+ORM ni por la API. Al final escribe el uso de almacenamiento de los adjuntos
+(`storageusage`) para que las cuotas partan de los totales correctos. El
+resultado es determinista para una misma semilla.
+
+Uso:
+    poetry run seed --users 10000 --notes 1000000 --seed 42
+"""
+
+import argparse
+import logging
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Table, create_engine, delete
+from sqlalchemy.engine import Connection, Engine
+
+from app.auth.jwt import get_password_hash
+from app.config.settings import settings
+from app.models.categories import Category
+from app.models.idempotency import IdempotencyRecord
+from app.models.notes import Attachment, Notes, make_preview
+from app.models.tokens import RevokedToken
+from app.models.uploads import UploadSession
+from app.models.usage import StorageUsage
+from app.models.users import User, UserNotes
+
+logger = logging.getLogger(__name__)
+
+# PRAGMAs relajados durante la carga; al terminar se restauran los que tenía
+# la base de datos (p. ej. WAL no debe acabar en DELETE)
+LOAD_PRAGMAS = {
+    "journal_mode": "MEMORY",
+    "synchronous": "OFF",
+    "temp_store": "MEMORY",
+    "cache_size": "-262144",
+    "locking_mode": "EXCLUSIVE",
+}
+
+MIME_TYPES = (
+    ("pdf", "application/pdf"),
+    ("png", "image/png"),
+    ("jpg", "image/jpeg"),
+    ("txt", "text/plain"),
+    ("zip", "application/zip"),
+)
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod "
+    "tempor incididunt ut labore et dolore magna aliqua nota tarea reunion "
+    "proyecto cliente entrega revision borrador idea pendiente urgente"
+).split()
+
+
+@dataclass
+class SeedConfig:
+    """Parámetros de la generación."""
+
+    users: int = 10_000
+    notes: int = 1_000_000
+    categories: int = 50
+    seed: int = 42
+    password: str = "password123"
+    # Compartición: número de usuarios extra por nota (exponencial truncada)
+    share_mean: float = 2.0
+    share_max: int = 50
+    # Tamaño del contenido: log-normal en caracteres, acotada
+    content_median: int = 400
+    content_sigma: float = 1.0
+    content_max: int = 20_000
+    # Adjuntos: probabilidad de que una nota tenga adjuntos y máximo por nota
+    attachment_ratio: float = 0.1
+    attachments_max: int = 3
+    batch_size: int = 1_000
+    transaction_size: int = 100_000
+
+
+class SyntheticDataset:
+    """Genera filas deterministas a partir de una semilla."""
+
+    def __init__(self, config: SeedConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.epoch = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        # Texto base del que se recortan los contenidos, generado una sola vez
+        self.corpus = " ".join(self.rng.choice(WORDS) for _ in range(50_000))
+        self.user_ids: List[str] = []
+        self.category_ids: List[str] = []
+        # Bytes y ficheros adjuntos por usuario y por nota
+        self.usage: Dict[str, List[int]] = {}
+
+    def uuid(self) -> str:
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def timestamp(self) -> datetime:
+        return self.epoch + timedelta(seconds=self.rng.randrange(365 * 86400))
+
+    def text(self, length: int) -> str:
+        length = max(1, min(length, len(self.corpus)))
+        start = self.rng.randrange(len(self.corpus) - length + 1)
+        return self.corpus[start : start + length]
+
+    def content_length(self) -> int:
+        cfg = self.config
+        length = int(self.rng.lognormvariate(0, cfg.content_sigma) * cfg.content_median)
+        return max(1, min(length, cfg.content_max))
+
+    def fanout(self) -> int:
+        cfg = self.config
+        if cfg.share_mean <= 0:
+            return 0
+        extra = int(self.rng.expovariate(1 / cfg.share_mean))
+        return min(extra, cfg.share_max, len(self.user_ids) - 1)
+
+    def users(self, hashed_password: str) -> Iterator[Dict[str, Any]]:
+        for i in range(self.config.users):
+            user_id = self.uuid()
+            self.user_ids.append(user_id)
+            username = f"seed{self.config.seed}_user{i}"
+            yield {
+                "id": user_id,
+                "username": username,
+                "email": f"{username}@example.com",
+                "hashed_password": hashed_password,
+                "full_name": f"Seed User {i}",
+                "is_active": True,
+                "is_admin": i == 0,
+                "createdAt": self.timestamp(),
+            }
+
+    def categories(self) -> Iterator[Dict[str, Any]]:
+        for i in range(self.config.categories):
+            category_id = self.uuid()
+            self.category_ids.append(category_id)
+            yield {
+                "id": category_id,
+                "name": f"seed{self.config.seed}_cat{i}",
+                "description": self.text(60),
+                "createdAt": self.timestamp(),
+            }
+
+    def note_graph(
+        self, count: int
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Genera un bloque de notas con sus comparticiones y adjuntos."""
+        cfg = self.config
+        notes: List[Dict[str, Any]] = []
+        links: List[Dict[str, Any]] = []
+        attachments: List[Dict[str, Any]] = []
+        for _ in range(count):
+            note_id = self.uuid()
+            created = self.timestamp()
+            title = self.text(self.rng.randint(8, 80))
+            content = self.text(self.content_length())
+            notes.append(
+                {
+                    "id": note_id,
+                    "title": title,
+                    "content": content,
+                    "preview": make_preview(content),
+                    "published": self.rng.random() < 0.7,
+                    "category_id": (
+                        self.rng.choice(self.category_ids)
+                        if self.category_ids and self.rng.random() < 0.8
+                        else None
+                    ),
+                    "createdAt": created,
+                }
+            )
+            # Lista y no conjunto: el orden debe ser estable entre ejecuciones
+            owners = [self.rng.choice(self.user_ids)]
+            target = 1 + self.fanout()
+            while len(owners) < target:
+                candidate = self.rng.choice(self.user_ids)
+                if candidate not in owners:
+                    owners.append(candidate)
+            for user_id in owners:
+                links.append(
+                    {
+                        "id": self.uuid(),
+                        "user_id": user_id,
+                        "note_id": note_id,
+                        "createdAt": created,
+                    }
+                )
+            if self.rng.random() < cfg.attachment_ratio:
+                for _ in range(self.rng.randint(1, cfg.attachments_max)):
+                    extension, mime_type = self.rng.choice(MIME_TYPES)
+                    file_id = self.uuid()
+                    filename = f"{self.text(12).strip()}.{extension}"
+                    file_size = int(self.rng.lognormvariate(11, 1.5))
+                    # Los sube el propietario de la nota
+                    attachments.append(
+                        {
+                            "id": file_id,
+                            "filename": filename,
+                            "file_path": f"seed/{file_id}.{extension}",
+                            "file_size": file_size,
+                            "mime_type": mime_type,
+                            "note_id": note_id,
+                            "user_id": owners[0],
+                            "createdAt": created,
+                        }
+                    )
+                    for owner_id in (owners[0], note_id):
+                        usage = self.usage.setdefault(owner_id, [0, 0])
+                        usage[0] += file_size
+                        usage[1] += 1
+        return notes, links, attachments
+
+    def usage_rows(self) -> List[Dict[str, Any]]:
+        return [
+            {"owner_id": owner_id, "bytes": size, "files": files}
+            for owner_id, (size, files) in self.usage.items()
+        ]
+
+
+def insert_rows(
+    conn: Connection, table: Table, rows: Sequence[Dict[str, Any]], batch_size: int
+) -> None:
+    """
+    Inserta filas en lotes con un único `INSERT` compilado por tabla.
+
+    Se pasa la lista de filas en una sola llamada (executemany): SQLAlchemy
+    reutiliza la sentencia cacheada y el driver itera en C. Construir un
+    `VALUES (...), (...)` por lote obliga a recompilarlo en cada llamada y
+    resulta varias veces más lento.
+    """
+    insert = table.insert()
+    for start in range(0, len(rows), batch_size):
+        conn.execute(insert, list(rows[start : start + batch_size]))
+
+
+@contextmanager
+def relaxed_pragmas(engine: Engine) -> Iterator[Connection]:
+    """
+    Abre una conexión con durabilidad relajada mientras dura la carga y deja
+    después los PRAGMAs como estaban.
+    """
+    with engine.connect() as conn:
+        is_sqlite = engine.dialect.name == "sqlite"
+        previous: Dict[str, Any] = {}
+        if is_sqlite:
+            for name, value in LOAD_PRAGMAS.items():
+                previous[name] = conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+                conn.exec_driver_sql(f"PRAGMA {name} = {value}")
+        try:
+            yield conn
+        finally:
+            if is_sqlite:
+                conn.rollback()
+                # En orden inverso: primero se deja de tener el acceso exclusivo
+                for name, value in reversed(previous.items()):
+                    conn.exec_driver_sql(f"PRAGMA {name} = {value}")
+                # locking_mode = NORMAL suelta el bloqueo en el siguiente acceso
+                conn.exec_driver_sql("SELECT 1 FROM sqlite_master LIMIT 1").all()
+                conn.rollback()
+
+
+def reset_tables(conn: Connection) -> None:
+    # `lease` no guarda datos sino el turno de los workers en marcha
+    for model in (
+        StorageUsage,
+        UploadSession,
+        IdempotencyRecord,
+        RevokedToken,
+        Attachment,
+        UserNotes,
+        Notes,
+        Category,
+        User,
+    ):
+        conn.execute(delete(model.__table__))
+    conn.commit()
+
+
+def seed(
+    config: SeedConfig, engine: Engine, reset: bool = False, verbose: bool = True
+) -> Dict[str, int]:
+    """Carga el dataset sintético y devuelve el número de filas por tabla."""
+    dataset = SyntheticDataset(config)
+    # Un único hash bcrypt compartido por todos los usuarios
+    hashed_password = get_password_hash(config.password)
+    totals = {
+        "user": 0,
+        "category": 0,
+        "notes": 0,
+        "usernotes": 0,
+        "attachment": 0,
+        "storageusage": 0,
+    }
+    started = time.perf_counter()
+
+    def log(message: str) -> None:
+        logger.log(
+            logging.INFO if verbose else logging.DEBUG,
+            "[%8.1fs] %s",
+            time.perf_counter() - started,
+            message,
+        )
+
+    with relaxed_pragmas(engine) as conn:
+        if reset:
+            reset_tables(conn)
+            log("tablas vaciadas")
+
+        users = list(dataset.users(hashed_password))
+        categories = list(dataset.categories())
+        insert_rows(conn, User.__table__, users, config.batch_size)
+        insert_rows(conn, Category.__table__, categories, config.batch_size)
+        conn.commit()
+        totals["user"], totals["category"] = len(users), len(categories)
+        log(f"{len(users)} usuarios y {len(categories)} categorías")
+
+        if config.notes and not dataset.user_ids:
+            raise ValueError("Se necesita al menos un usuario para generar notas")
+
+        pending = 0
+        remaining = config.notes
+        while remaining > 0:
+            count = min(config.batch_size, remaining)
+            notes, links, attachments = dataset.note_graph(count)
+            insert_rows(conn, Notes.__table__, notes, config.batch_size)
+            insert_rows(conn, UserNotes.__table__, links, config.batch_size)
+            insert_rows(conn, Attachment.__table__, attachments, config.batch_size)
+            totals["notes"] += len(notes)
+            totals["usernotes"] += len(links)
+            totals["attachment"] += len(attachments)
+            remaining -= count
+            pending += count
+            if pending >= config.transaction_size or remaining == 0:
+                conn.commit()
+                pending = 0
+                log(f"{totals['notes']}/{config.notes} notas")
+
+        usage = dataset.usage_rows()
+        insert_rows(conn, StorageUsage.__table__, usage, config.batch_size)
+        conn.commit()
+        totals["storageusage"] = len(usage)
+
+    log(f"completado: {totals}")
+    return totals
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    defaults = SeedConfig()
+    parser = argparse.ArgumentParser(description="Carga un dataset sintético.")
+    parser.add_argument("--database-url", default=settings.SQLITE_URL)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--users", type=int, default=defaults.users)
+    parser.add_argument("--notes", type=int, default=defaults.notes)
+    parser.add_argument("--categories", type=int, default=defaults.categories)
+    parser.add_argument("--password", default=defaults.password)
+    parser.add_argument(
+        "--share-mean",
+        type=float,
+        default=defaults.share_mean,
+        help="Media de usuarios adicionales con los que se comparte cada nota",
+    )
+    parser.add_argument("--share-max", type=int, default=defaults.share_max)
+    parser.add_argument(
+        "--content-median",
+        type=int,
+        default=defaults.content_median,
+        help="Mediana del tamaño del contenido (caracteres, log-normal)",
+    )
+    parser.add_argument(
+        "--content-sigma", type=float, default=defaults.content_sigma
+    )
+    parser.add_argument("--content-max", type=int, default=defaults.content_max)
+    parser.add_argument(
+        "--attachment-ratio", type=float, default=defaults.attachment_ratio
+    )
+    parser.add_argument(
+        "--attachments-max", type=int, default=defaults.attachments_max
+    )
+    parser.add_argument("--batch-size", type=int, default=defaults.batch_size)
+    parser.add_argument(
+        "--transaction-size",
+        type=int,
+        default=defaults.transaction_size,
+        help="Notas por transacción",
+    )
+    parser.add_argument(
+        "--reset", action="store_true", help="Vacía las tablas antes de cargar"
+    )
+    parser.add_argument("--quiet", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Lanzado con `poetry run seed`."""
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    config = SeedConfig(
+        users=args.users,
+        notes=args.notes,
+        categories=args.categories,
+        seed=args.seed,
+        password=args.password,
+        share_mean=args.share_mean,
+        share_max=args.share_max,
+        content_median=args.content_median,
+        content_sigma=args.content_sigma,
+        content_max=args.content_max,
+        attachment_ratio=args.attachment_ratio,
+        attachments_max=args.attachments_max,
+        batch_size=args.batch_size,
+        transaction_size=args.transaction_size,
+    )
+    engine = create_engine(args.database_url)
+    try:
+        seed(config, engine, reset=args.reset, verbose=not args.quiet)
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,243 @@
-from typing import Generator
+import itertools
+import logging
+import threading
+import time
+from http.cookies import SimpleCookie
+from typing import Callable, Dict, Generator, List, Optional, Sequence, Tuple
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session, sessionmaker
+from fastapi import Request
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import (
+    ORMExecuteState,
+    Session,
+    sessionmaker,
+    with_loader_criteria,
+)
 
 from app.config.settings import settings
+from app.models.base import BaseModel
 
 SQLITE_URL = settings.SQLITE_URL
+logger = logging.getLogger(__name__)
 
 
-engine = create_engine(SQLITE_URL, connect_args={"check_same_thread": False}, echo=True)
+# create_engine no abre conexiones; el pool se calienta en el lifespan
+engine = create_engine(
+    SQLITE_URL, connect_args={"check_same_thread": False}, echo=settings.SQL_ECHO
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Métodos que se pueden servir desde una réplica
+READ_ONLY_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+# Marca de read-your-writes: instante (epoch) hasta el que se lee del primario
+PRIMARY_UNTIL_COOKIE = "db_primary_until"
+PRIMARY_UNTIL_HEADER = "X-DB-Primary-Until"
+# Sondeo de salud sobre una tabla real: SQLite crea un fichero vacío si no
+# existe, y ahí `SELECT 1` funcionaría aunque no haya datos que leer
+REPLICA_HEALTH_QUERY = "SELECT version_num FROM alembic_version"
 
-def get_db() -> Generator[Session, None, None]:
-    db = SessionLocal()
+
+def log_lazy_load(state: ORMExecuteState) -> None:
+    """Registra las cargas implícitas de relaciones (`ORM_STRICT_LOADING=warn`)."""
+    if state.lazy_loaded_from is not None:
+        logger.warning(
+            "Carga implícita de %s: declara su loader en la consulta",
+            state.loader_strategy_path[-1],
+        )
+
+
+def hide_deleted(state: ORMExecuteState) -> None:
+    """
+    Oculta las filas con borrado lógico en todas las consultas ORM, también en
+    joins y cargas de relaciones. `include_deleted=True` las incluye.
+    """
+    if (
+        state.is_select
+        and not state.is_column_load
+        and not state.execution_options.get("include_deleted", False)
+    ):
+        state.statement = state.statement.options(
+            with_loader_criteria(
+                BaseModel, lambda cls: cls.deletedAt.is_(None), include_aliases=True
+            )
+        )
+
+
+# En la clase Session: afecta también a las réplicas, al escritor y a los scripts
+event.listen(Session, "do_orm_execute", hide_deleted)
+
+if settings.ORM_STRICT_LOADING == "warn":
+    event.listen(SessionLocal, "do_orm_execute", log_lazy_load)
+
+
+def warm_up_engine(engine: Engine, connections: int) -> None:
+    """Abre `connections` conexiones y las devuelve al pool."""
+    opened = []
+    try:
+        for _ in range(connections):
+            conn = engine.connect()
+            opened.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in opened:
+            conn.close()
+
+
+class ReplicaSet:
+    """
+    Engines de las réplicas de solo lectura con seguimiento de salud.
+
+    Las réplicas sanas se reparten en round-robin. Una réplica que falla al
+    conectar queda fuera `retry_seconds` segundos y después se vuelve a probar.
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        retry_seconds: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.engines: List[Engine] = [
+            create_engine(
+                url,
+                connect_args={"check_same_thread": False},
+                echo=settings.SQL_ECHO,
+                # Detecta conexiones rotas del pool antes de usarlas
+                pool_pre_ping=True,
+            )
+            for url in urls
+        ]
+        self.retry_seconds = retry_seconds
+        self.clock = clock
+        self._down_until: Dict[Engine, float] = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def healthy(self) -> List[Engine]:
+        now = self.clock()
+        with self._lock:
+            return [e for e in self.engines if self._down_until.get(e, 0.0) <= now]
+
+    def pick(self) -> Optional[Engine]:
+        """Siguiente réplica sana, o `None` si no queda ninguna."""
+        healthy = self.healthy()
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)]
+
+    def mark_down(self, engine: Engine) -> None:
+        logger.warning("Réplica %s no disponible", engine.url)
+        with self._lock:
+            self._down_until[engine] = self.clock() + self.retry_seconds
+
+    def mark_up(self, engine: Engine) -> None:
+        with self._lock:
+            self._down_until.pop(engine, None)
+
+    def check(self) -> None:
+        """
+        Comprueba que cada réplica tiene el esquema migrado y actualiza su
+        estado; un fichero vacío o inexistente queda caído.
+        """
+        for engine in self.engines:
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text(REPLICA_HEALTH_QUERY)).one()
+            except DBAPIError:
+                self.mark_down(engine)
+            else:
+                self.mark_up(engine)
+
+    def status(self) -> Dict[str, bool]:
+        healthy = self.healthy()
+        return {
+            engine.url.render_as_string(hide_password=True): engine in healthy
+            for engine in self.engines
+        }
+
+    def dispose(self) -> None:
+        for engine in self.engines:
+            engine.dispose()
+
+
+replicas = ReplicaSet(
+    [url.strip() for url in settings.SQLITE_REPLICA_URLS.split(",") if url.strip()],
+    retry_seconds=settings.DB_REPLICA_RETRY_SECONDS,
+)
+
+
+def reads_from_primary(request: Request) -> bool:
+    """Escrituras y lecturas dentro de la ventana read-your-writes van al primario."""
+    if request.method not in READ_ONLY_METHODS:
+        return True
+    marker = request.headers.get(PRIMARY_UNTIL_HEADER) or request.cookies.get(
+        PRIMARY_UNTIL_COOKIE
+    )
+    try:
+        until = float(marker)
+    except (TypeError, ValueError):
+        return False
+    now = time.time()
+    # El servidor nunca emite una marca más allá de la ventana: una posterior
+    # la ha escrito el cliente y no fija sus lecturas en el primario
+    return now < until <= now + settings.DB_READ_YOUR_WRITES_SECONDS
+
+
+def mark_primary_window(request: Request) -> None:
+    """
+    Anota en la petición hasta cuándo debe leer el cliente del primario;
+    `PrimaryWindowMiddleware` lo añade a la respuesta que salga, sea cual sea.
+    """
+    request.state.primary_until = time.time() + settings.DB_READ_YOUR_WRITES_SECONDS
+
+
+def primary_window_headers(until: float) -> List[Tuple[bytes, bytes]]:
+    """Cookie y cabecera que piden al cliente leer del primario hasta `until`."""
+    value = f"{until:.3f}"
+    cookie: SimpleCookie = SimpleCookie()
+    cookie[PRIMARY_UNTIL_COOKIE] = value
+    cookie[PRIMARY_UNTIL_COOKIE]["max-age"] = int(
+        settings.DB_READ_YOUR_WRITES_SECONDS + 1
+    )
+    cookie[PRIMARY_UNTIL_COOKIE]["path"] = "/"
+    cookie[PRIMARY_UNTIL_COOKIE]["httponly"] = True
+    cookie[PRIMARY_UNTIL_COOKIE]["samesite"] = "lax"
+    return [
+        (b"set-cookie", cookie.output(header="").strip().encode("latin-1")),
+        (PRIMARY_UNTIL_HEADER.lower().encode("latin-1"), value.encode("latin-1")),
+    ]
+
+
+def replica_session() -> Optional[Session]:
+    """Sesión en una réplica sana; las que no responden se marcan caídas."""
+    while True:
+        replica = replicas.pick()
+        if replica is None:
+            return None
+        db = SessionLocal(bind=replica)
+        try:
+            db.connection()
+            return db
+        except DBAPIError:
+            db.close()
+            replicas.mark_down(replica)
+
+
+def session_for(request: Request) -> Session:
+    """Sesión en el primario o en una réplica según la petición."""
+    if not reads_from_primary(request):
+        db = replica_session()
+        if db is not None:
+            return db
+    return SessionLocal()
+
+
+def get_db(request: Request) -> Generator[Session, None, None]:
+    if replicas.engines and request.method not in READ_ONLY_METHODS:
+        mark_primary_window(request)
+    db = session_for(request)
     try:
         yield db
     finally:
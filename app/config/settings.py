@@ -1,3 +1,6 @@
+import os
+from typing import Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -8,6 +11,119 @@ class Settings(BaseSettings):
     BACKEND_CORS_ORIGINS: str = ""
     LOGGING_CONFIG_FILE: str = ""
     PROJECT_VERSION: str = ""
+    SQL_ECHO: bool = False
+    # Cargas implícitas de relaciones: "off", "warn" (se registran) o "raise"
+    ORM_STRICT_LOADING: str = "off"
+    # Backend de los adjuntos: "local" (en UPLOAD_DIR), "memory" o "s3"
+    STORAGE_BACKEND: str = "local"
+    UPLOAD_DIR: str = "./uploads"
+    S3_ENDPOINT_URL: str = ""
+    S3_BUCKET: str = ""
+    S3_REGION: str = "us-east-1"
+    S3_ACCESS_KEY_ID: str = ""
+    S3_SECRET_ACCESS_KEY: str = ""
+    # Subidas reanudables: directorio de trabajo (por defecto UPLOAD_DIR/.staging),
+    # fragmento máximo por PATCH y vigencia de una sesión sin actividad
+    UPLOAD_STAGING_DIR: str = ""
+    UPLOAD_CHUNK_MAX_BYTES: int = 64 * 1024 * 1024
+    UPLOAD_SESSION_TTL_SECONDS: int = 24 * 3600
+    UPLOAD_SESSION_REAP_INTERVAL_SECONDS: float = 600.0
+    # Miniaturas WebP de los adjuntos de imagen (requiere `Pillow`)
+    THUMBNAIL_SIZES: str = "64,256,512"
+    THUMBNAIL_WORKERS: int = 2
+    # Imágenes con más píxeles no se decodifican (bombas de descompresión)
+    THUMBNAIL_MAX_PIXELS: int = 50_000_000
+    # Cuotas de adjuntos por usuario y por nota (0 = sin límite)
+    QUOTA_USER_BYTES: int = 1024 * 1024 * 1024
+    QUOTA_USER_FILES: int = 10_000
+    QUOTA_NOTE_BYTES: int = 256 * 1024 * 1024
+    QUOTA_NOTE_FILES: int = 500
+    # Segundos entre recálculos de los contadores de uso (0 = nunca)
+    QUOTA_RECONCILE_INTERVAL_SECONDS: float = 3600.0
+    # Vigencia por defecto y máxima de las URLs firmadas de descarga
+    SIGNED_URL_TTL_SECONDS: int = 300
+    SIGNED_URL_MAX_TTL_SECONDS: int = 3600
+    # Descarga en ZIP de los adjuntos de una nota: nivel de deflate (1-9)
+    ZIP_DEFLATE_LEVEL: int = 6
+    # Conexiones del pool que se abren al arrancar
+    DB_WARMUP_CONNECTIONS: int = 2
+    # Réplicas de solo lectura (URLs separadas por comas) para GET/HEAD
+    SQLITE_REPLICA_URLS: str = ""
+    # Segundos que un cliente lee del primario tras escribir
+    DB_READ_YOUR_WRITES_SECONDS: float = 5.0
+    # Segundos que una réplica caída queda fuera antes de reintentarla
+    DB_REPLICA_RETRY_SECONDS: float = 30.0
+    # Escrituras serializadas en un hilo escritor con commit agrupado
+    DB_WRITE_QUEUE: bool = False
+    DB_WRITE_QUEUE_MAX_BATCH: int = 64
+    DB_WRITE_QUEUE_MAX_WAIT_MS: float = 0.0
+    # Esquema generado con `poetry run openapi`; vacío (por defecto) o sin el
+    # fichero se genera al vuelo. Un fichero de otra versión serviría rutas viejas
+    OPENAPI_SCHEMA_FILE: str = ""
+    # Compresión de respuestas; br y zstd requieren `brotli` y `zstandard`
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+    COMPRESSION_ENCODINGS: str = "zstd,br,gzip"
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    COMPRESSION_ZSTD_LEVEL: int = 3
+    # Filas leídas por lote del cursor en `GET /notes/export`
+    EXPORT_BATCH_SIZE: int = 500
+    # Notas insertadas por lote, errores devueltos y caracteres por línea
+    # (una nota más larga no se importa) en `POST /notes/import`
+    IMPORT_BATCH_SIZE: int = 1000
+    IMPORT_MAX_ERRORS: int = 100
+    IMPORT_MAX_LINE_LENGTH: int = 1_048_576
+    # Purga de borrados lógicos en lotes cuando no hay peticiones en curso
+    PURGE_ENABLED: bool = True
+    PURGE_BATCH_SIZE: int = 500
+    PURGE_INTERVAL_SECONDS: float = 60.0
+    PURGE_IDLE_SECONDS: float = 2.0
+    # `Idempotency-Key`: vigencia de las respuestas guardadas y caché en memoria
+    IDEMPOTENCY_ENABLED: bool = True
+    IDEMPOTENCY_TTL_SECONDS: int = 24 * 3600
+    IDEMPOTENCY_CACHE_SIZE: int = 10_000
+    IDEMPOTENCY_MAX_RESPONSE_BYTES: int = 1024 * 1024
+
+    # Servidor de producción (`poetry run serve`); workers por defecto: CPUs
+    SERVER_HOST: str = "0.0.0.0"  # nosec B104
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: Optional[int] = None
+    SERVER_LOOP: str = "uvloop"
+    SERVER_HTTP: str = "httptools"
+    SERVER_BACKLOG: int = 2048
+    SERVER_KEEPALIVE_SECONDS: int = 5
+    SERVER_LIMIT_CONCURRENCY: Optional[int] = None
+    SERVER_MAX_REQUESTS: Optional[int] = 10_000
+    SERVER_GRACEFUL_TIMEOUT_SECONDS: int = 30
+    SERVER_FORWARDED_ALLOW_IPS: str = "127.0.0.1"
+    SERVER_ACCESS_LOG: bool = False
+
+    # Límite de intentos de login (token bucket + bloqueo por fallos)
+    LOGIN_RATE_LIMIT_ENABLED: bool = True
+    LOGIN_USERNAME_BURST: int = 5
+    LOGIN_USERNAME_PER_MINUTE: float = 5
+    LOGIN_IP_BURST: int = 20
+    LOGIN_IP_PER_MINUTE: float = 30
+    LOGIN_MAX_FAILURES: int = 10
+    # Por IP: detrás de un NAT o un proxy comparten IP muchos usuarios
+    LOGIN_MAX_IP_FAILURES: int = 50
+    LOGIN_FAILURE_WINDOW_SECONDS: float = 600
+    LOGIN_LOCKOUT_SECONDS: float = 900
+    # Coste bcrypt: fijo con BCRYPT_ROUNDS o calibrado al arrancar
+    BCRYPT_ROUNDS: Optional[int] = None
+    BCRYPT_TARGET_MS: float = 250
+    BCRYPT_MIN_ROUNDS: int = 10
+    BCRYPT_MAX_ROUNDS: int = 16
+    # Verificaciones bcrypt simultáneas antes de responder 503
+    LOGIN_MAX_CONCURRENT_HASHES: int = os.cpu_count() or 1
+    LOGIN_ADMISSION_TIMEOUT_SECONDS: float = 2
+
+    # Segundos que se reutiliza la versión de token de un usuario
+    TOKEN_VERSION_CACHE_SECONDS: float = 30
+    # Lista de tokens revocados en memoria
+    REVOCATION_BLOOM_CAPACITY: int = 10_000
+    REVOCATION_REFRESH_SECONDS: float = 5
 
     model_config = SettingsConfigDict(
         env_file_encoding="utf-8",
@@ -0,0 +1,200 @@
+"""
+Cola de escritura con un único escritor y commit agrupado (group commit).
+
+Con SQLite, las peticiones que escriben a la vez compiten por el bloqueo de
+escritura ("database is locked") y cada `commit` paga su propio fsync. Con
+`DB_WRITE_QUEUE=true` las unidades de escritura se envían a un hilo escritor
+con una sola conexión, que ejecuta las pendientes en una misma transacción
+(cada una en su SAVEPOINT) y hace un único commit. Cada llamante recibe su
+resultado o su excepción.
+
+Pasan por la cola las escrituras de notas: alta, edición, borrado, accesos
+compartidos, lotes de importación y borrado de adjuntos. La cola es de
+mejor esfuerzo: el resto (usuarios, revocación de tokens, idempotencia, el
+purgador) confirma en su propia sesión y compite por el bloqueo con el
+escritor igual que sin la cola. Así quedan también la subida de adjuntos y
+las subidas reanudables, cuya transacción (reserva de cuota incluida) se
+intercala con E/S del almacenamiento.
+"""
+
+import asyncio
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple, TypeVar
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.config.settings import settings
+
+T = TypeVar("T")
+# Una unidad de escritura recibe la sesión del escritor y no hace commit
+WriteUnit = Callable[[Session], T]
+
+logger = logging.getLogger(__name__)
+
+
+def create_writer_engine(url: str) -> Engine:
+    """Engine de una sola conexión que abre las transacciones con BEGIN IMMEDIATE."""
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        echo=settings.SQL_ECHO,
+        pool_size=1,
+        max_overflow=0,
+    )
+    if engine.dialect.name == "sqlite":
+        # pysqlite no emite BEGIN hasta el primer INSERT/UPDATE y los
+        # SAVEPOINT harían commit al liberarse: la transacción se abre a mano
+        @event.listens_for(engine, "connect")
+        def _disable_pysqlite_begin(dbapi_connection: Any, _: Any) -> None:
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(engine, "begin")
+        def _begin_immediate(conn: Connection) -> None:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return engine
+
+
+class WriteQueue:
+    """
+    Hilo escritor que agrupa las unidades de escritura en transacciones.
+
+    Mientras se hace el commit de un grupo, las unidades que llegan se acumulan
+    y forman el siguiente (hasta `max_batch`). `max_wait` añade una espera
+    opcional para juntar más unidades cuando la cola está casi vacía.
+    """
+
+    def __init__(self, url: str, max_batch: int = 64, max_wait: float = 0.0) -> None:
+        self.url = url
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.commits = 0
+        self._queue: "queue.Queue[Optional[Tuple[WriteUnit[Any], Future]]]" = (
+            queue.Queue()
+        )
+        self._thread: Optional[threading.Thread] = None
+        self._engine: Optional[Engine] = None
+        self._session_factory: Optional[sessionmaker] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._engine = create_writer_engine(self.url)
+        # Los objetos devueltos siguen siendo legibles tras el commit
+        self._session_factory = sessionmaker(
+            bind=self._engine, autoflush=False, expire_on_commit=False
+        )
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Procesa lo pendiente y detiene el hilo escritor."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        if self._engine is not None:
+            self._engine.dispose()
+
+    def submit(self, unit: WriteUnit[T]) -> "Future[T]":
+        if not self.running:
+            raise RuntimeError("La cola de escritura no está en marcha")
+        future: "Future[T]" = Future()
+        self._queue.put((unit, future))
+        return future
+
+    def run(self, unit: WriteUnit[T]) -> T:
+        return self.submit(unit).result()
+
+    async def run_async(self, unit: WriteUnit[T]) -> T:
+        return await asyncio.wrap_future(self.submit(unit))
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(
+                        timeout=self.max_wait or None, block=bool(self.max_wait)
+                    )
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+
+    def _commit(self, batch: List[Tuple[WriteUnit[Any], Future]]) -> None:
+        assert self._session_factory is not None
+        outcomes: List[Tuple[Future, Any, Optional[BaseException]]] = []
+        with self._session_factory() as db:
+            try:
+                for unit, future in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    # El fallo de una unidad solo deshace su SAVEPOINT
+                    savepoint = db.begin_nested()
+                    try:
+                        result = unit(db)
+                        db.flush()
+                    except Exception as exc:
+                        savepoint.rollback()
+                        outcomes.append((future, None, exc))
+                    else:
+                        savepoint.commit()
+                        outcomes.append((future, result, None))
+                db.commit()
+                self.commits += 1
+            except Exception as exc:
+                logger.exception("Fallo en el commit de %d escrituras", len(batch))
+                db.rollback()
+                # Ninguna escritura del grupo se ha guardado
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                return
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+write_queue = WriteQueue(
+    settings.SQLITE_URL,
+    max_batch=settings.DB_WRITE_QUEUE_MAX_BATCH,
+    max_wait=settings.DB_WRITE_QUEUE_MAX_WAIT_MS / 1000,
+)
+
+
+async def run_write(db: Session, unit: WriteUnit[T]) -> T:
+    """Ejecuta `unit` en la cola de escritura si está activa; si no, en `db`."""
+    if write_queue.running:
+        return await write_queue.run_async(unit)
+    result = unit(db)
+    db.commit()
+    return result
+
+
+def run_write_sync(db: Session, unit: WriteUnit[T]) -> T:
+    """Como `run_write`, para código que ya se ejecuta en un hilo."""
+    if write_queue.running:
+        return write_queue.run(unit)
+    result = unit(db)
+    db.commit()
+    return result
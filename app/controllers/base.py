@@ -16,6 +16,7 @@ from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Query, Session
+from sqlalchemy.orm.exc import StaleDataError
 
 
 # Protocol to enforce the presence of an `id` attribute
@@ -119,6 +120,9 @@ class ControllerBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
     ) -> ModelType:
         """
         Update an existing record.
+
+        The UPDATE checks the row version, so a concurrent change made after
+        `model` was loaded raises 412 instead of being overwritten.
         """
         item_data = jsonable_encoder(model)
         if isinstance(schema, dict):
@@ -129,17 +133,33 @@ class ControllerBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
             if field in update_data:
                 setattr(model, field, update_data[field])
         db.add(model)
-        db.commit()
+        try:
+            db.commit()
+        except StaleDataError:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="Item was modified by another request",
+            )
         db.refresh(model)
         return model
 
     def delete(self, db: Session, *, id: Any) -> ModelType:
         """
-        Delete a record by ID.
+        Soft delete a record by ID: the row is hidden from queries at once and
+        hard deleted later by the background purger. Like `update`, a
+        concurrent change to the row raises 412.
         """
         obj = db.query(self.model).filter(self.model.id == id).first()
         if not obj:
             raise HTTPException(status_code=404, detail="Item not found")
-        db.delete(obj)
-        db.commit()
+        obj.soft_delete()  # type: ignore[attr-defined]
+        try:
+            db.commit()
+        except StaleDataError:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="Item was modified by another request",
+            )
         return obj
@@ -5,3 +5,8 @@ class NoteCategory(str, enum.Enum):
     STICK = "stick"
     SMALL = "small"
     BIG = "big"
+
+
+class ExportFormat(str, enum.Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
@@ -0,0 +1,61 @@
+"""
+Elección de un único worker para una tarea de fondo.
+
+Cada worker arranca las mismas tareas en su lifespan. Las que no deben
+solaparse piden antes un turno (`lease`) con nombre: una fila con el worker
+que lo tiene y hasta cuándo. Quien lo tiene lo renueva antes de cada lote;
+si deja de hacerlo (se cae, se reinicia), al caducar lo toma otro worker.
+"""
+
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config.database import SessionLocal
+from app.models.leases import Lease
+
+# Identifica a este proceso; el sufijo distingue pids reutilizados
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def acquire_lease(
+    name: str,
+    seconds: float,
+    holder: str = WORKER_ID,
+    session_factory: Callable[[], Session] = SessionLocal,
+    now: Optional[datetime] = None,
+) -> bool:
+    """
+    Toma o renueva el turno `name` durante `seconds`. Devuelve False si lo
+    tiene otro worker y aún no ha caducado.
+    """
+    now = now or datetime.now(timezone.utc)
+    expires_at = now + timedelta(seconds=seconds)
+    with session_factory() as db:
+        taken = db.execute(
+            update(Lease)
+            .where(
+                Lease.name == name,
+                or_(Lease.holder == holder, Lease.expiresAt <= now),
+            )
+            .values(holder=holder, expiresAt=expires_at)
+        ).rowcount
+        if taken:
+            db.commit()
+            return True
+        if db.get(Lease, name) is not None:
+            return False
+        # Primera vez: si otro worker inserta a la vez, gana el suyo
+        db.add(Lease(name=name, holder=holder, expiresAt=expires_at))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            return False
+        return True
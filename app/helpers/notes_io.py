@@ -0,0 +1,347 @@
+"""
+Exportación e importación de notas en streaming.
+
+En la exportación las filas se leen con un cursor de servidor (`yield_per`) en
+lotes de tamaño fijo y cada lote se serializa y se envía antes de leer el
+siguiente. La importación lee el cuerpo línea a línea e inserta por lotes. En
+ambos casos la memoria no crece con el número de notas.
+"""
+
+import codecs
+import csv
+import io
+import json
+import logging
+import uuid
+from datetime import datetime
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config.database import SessionLocal
+from app.config.writer import run_write_sync
+from app.helpers.enum import ExportFormat
+from app.models.categories import Category
+from app.models.notes import Attachment, Notes, make_preview
+from app.models.users import UserNotes
+from app.schemas.notes import NoteCreate
+
+logger = logging.getLogger(__name__)
+
+EXPORT_COLUMNS = (
+    "id",
+    "title",
+    "content",
+    "published",
+    "category_id",
+    "category",
+    "createdAt",
+    "updatedAt",
+)
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv",
+}
+
+
+def _json_default(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} no es serializable")
+
+
+def iter_note_batches(
+    db: Session, user_id: str, batch_size: int, attachments: bool = False
+) -> Iterator[List[Dict[str, Any]]]:
+    """Recorre las notas del usuario en lotes de `batch_size` filas."""
+    query = (
+        select(
+            Notes.id,
+            Notes.title,
+            Notes.content,
+            Notes.published,
+            Notes.category_id,
+            Category.name.label("category"),
+            Notes.createdAt,
+            Notes.updatedAt,
+        )
+        .join(UserNotes, UserNotes.note_id == Notes.id)
+        .outerjoin(Category, Category.id == Notes.category_id)
+        .where(UserNotes.user_id == user_id)
+        .order_by(Notes.createdAt, Notes.id)
+        # yield_per implica stream_results: cursor de servidor donde exista
+        .execution_options(yield_per=batch_size)
+    )
+    for rows in db.execute(query).partitions():
+        notes = [row._asdict() for row in rows]
+        if attachments:
+            _attach_metadata(db, notes)
+        yield notes
+
+
+def _attach_metadata(db: Session, notes: List[Dict[str, Any]]) -> None:
+    """Añade los metadatos de adjuntos de un lote con una sola consulta."""
+    by_note: Dict[str, List[Dict[str, Any]]] = {note["id"]: [] for note in notes}
+    rows = db.execute(
+        select(
+            Attachment.note_id,
+            Attachment.id,
+            Attachment.filename,
+            Attachment.file_size,
+            Attachment.mime_type,
+            Attachment.description,
+            Attachment.createdAt,
+        )
+        .where(Attachment.note_id.in_(list(by_note)))
+        .order_by(Attachment.createdAt, Attachment.id)
+    )
+    for row in rows:
+        metadata = row._asdict()
+        by_note[metadata.pop("note_id")].append(metadata)
+    for note in notes:
+        note["attachments"] = by_note[note["id"]]
+
+
+def _ndjson_chunks(batches: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    for notes in batches:
+        yield "".join(
+            json.dumps(note, default=_json_default, ensure_ascii=False) + "\n"
+            for note in notes
+        ).encode()
+
+
+def _csv_chunks(
+    batches: Iterator[List[Dict[str, Any]]], attachments: bool
+) -> Iterator[bytes]:
+    columns = EXPORT_COLUMNS + (("attachments",) if attachments else ())
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for notes in batches:
+        for note in notes:
+            if attachments:
+                note["attachments"] = json.dumps(
+                    note["attachments"], default=_json_default, ensure_ascii=False
+                )
+            writer.writerow(
+                _json_default(note[c]) if isinstance(note[c], datetime) else note[c]
+                for c in columns
+            )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def export_notes(
+    user_id: str,
+    export_format: ExportFormat,
+    batch_size: int,
+    attachments: bool = False,
+    session_factory: Callable[[], Session] = SessionLocal,
+) -> Iterator[bytes]:
+    """
+    Genera la exportación de las notas del usuario.
+
+    Usa su propia sesión: el generador se consume mientras se envía la
+    respuesta, cuando la sesión de la petición ya se ha cerrado.
+    """
+    db = session_factory()
+    try:
+        batches = iter_note_batches(db, user_id, batch_size, attachments)
+        if export_format == ExportFormat.CSV:
+            yield from _csv_chunks(batches, attachments)
+        else:
+            yield from _ndjson_chunks(batches)
+    finally:
+        db.close()
+
+
+def iter_text_lines(
+    chunks: Iterable[bytes], max_length: int
+) -> Iterator[Optional[str]]:
+    """
+    Decodifica trozos UTF-8 y los corta en líneas, con su salto de línea.
+
+    Una línea de más de `max_length` caracteres se descarta sin acumularla
+    entera y en su lugar se emite `None`.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    # Se está descartando el resto de una línea demasiado larga
+    skipping = False
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        # `splitlines` cortaría también en U+2028, válido dentro de JSON
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            if skipping:
+                skipping = False
+                continue
+            yield line + "\n" if len(line) <= max_length else None
+        if skipping:
+            pending = ""
+        elif len(pending) > max_length:
+            yield None
+            skipping, pending = True, ""
+    pending += decoder.decode(b"", final=True)
+    if pending and not skipping:
+        yield pending if len(pending) <= max_length else None
+
+
+# (número de línea, registro o None, error o None)
+ImportRecord = Tuple[int, Optional[Dict[str, Any]], Optional[str]]
+
+LINE_TOO_LONG = "Línea demasiado larga"
+
+
+def parse_records(
+    lines: Iterable[Optional[str]], import_format: ExportFormat
+) -> Iterator[ImportRecord]:
+    """
+    Convierte las líneas NDJSON o CSV en registros numerados.
+
+    Una línea demasiado larga (`None`) es un error de esa línea; en CSV
+    además termina la importación, porque un campo entre comillas puede
+    ocupar varias líneas y el resto ya no se puede interpretar.
+    """
+    if import_format == ExportFormat.CSV:
+        truncated = False
+
+        def csv_lines() -> Iterator[str]:
+            nonlocal truncated
+            for line in lines:
+                if line is None:
+                    truncated = True
+                    return
+                yield line
+
+        reader = csv.DictReader(csv_lines())
+        for record in reader:
+            # Celdas vacías = campo ausente (p. ej. `category_id` sin categoría)
+            fields = {
+                key: value
+                for key, value in record.items()
+                if key is not None and value != ""
+            }
+            yield reader.line_num, fields, None
+        if truncated:
+            yield reader.line_num + 1, None, f"{LINE_TOO_LONG}; se omite el resto"
+        return
+    for number, line in enumerate(lines, start=1):
+        if line is None:
+            yield number, None, LINE_TOO_LONG
+            continue
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield number, None, f"JSON no válido: {exc}"
+            continue
+        if not isinstance(record, dict):
+            yield number, None, "Se esperaba un objeto JSON"
+            continue
+        yield number, record, None
+
+
+def _validation_message(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+        for error in exc.errors()
+    )
+
+
+def import_notes(
+    db: Session,
+    user_id: str,
+    records: Iterable[ImportRecord],
+    batch_size: int,
+    max_errors: int = 100,
+) -> Dict[str, Any]:
+    """
+    Valida cada registro con `NoteCreate` e inserta las notas por lotes.
+
+    Cada lote se inserta en `notes` y `usernotes` con una sentencia por tabla
+    y se confirma, así que una importación interrumpida conserva los lotes ya
+    escritos. Se guardan como mucho `max_errors` errores.
+    """
+    # Las categorías se resuelven por nombre o id sin consultar por línea
+    categories: Dict[str, str] = dict(
+        db.execute(select(Category.name, Category.id)).all()
+    )
+    category_ids = set(categories.values())
+    notes: List[Dict[str, Any]] = []
+    links: List[Dict[str, Any]] = []
+    report: Dict[str, Any] = {"imported": 0, "failed": 0, "errors": []}
+
+    def fail(number: int, message: str) -> None:
+        report["failed"] += 1
+        if len(report["errors"]) < max_errors:
+            report["errors"].append({"line": number, "error": message})
+
+    def flush() -> None:
+        if not notes:
+            return
+
+        def insert_batch(session: Session) -> None:
+            session.execute(Notes.__table__.insert(), notes)
+            session.execute(UserNotes.__table__.insert(), links)
+
+        run_write_sync(db, insert_batch)
+        report["imported"] += len(notes)
+        notes.clear()
+        links.clear()
+        logger.info(
+            "Importación de %s: %d notas importadas, %d con errores",
+            user_id,
+            report["imported"],
+            report["failed"],
+        )
+
+    for number, record, error in records:
+        if record is None:
+            fail(number, error or "Registro no válido")
+            continue
+        category_name = record.pop("category", None)
+        if category_name and not record.get("category_id"):
+            record["category_id"] = categories.get(category_name)
+            if record["category_id"] is None:
+                fail(number, f"Categoría no encontrada: {category_name}")
+                continue
+        try:
+            note = NoteCreate.model_validate(record)
+        except ValidationError as exc:
+            fail(number, _validation_message(exc))
+            continue
+        if note.category_id and note.category_id not in category_ids:
+            fail(number, "La categoría especificada no existe")
+            continue
+        note_id = str(uuid.uuid4())
+        notes.append(
+            {
+                "id": note_id,
+                "title": note.title,
+                "content": note.content,
+                "preview": make_preview(note.content),
+                "published": note.published,
+                "category_id": note.category_id,
+            }
+        )
+        links.append({"id": str(uuid.uuid4()), "user_id": user_id, "note_id": note_id})
+        if len(notes) >= batch_size:
+            flush()
+    flush()
+    return report
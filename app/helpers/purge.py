@@ -0,0 +1,228 @@
+"""
+Purga de las filas con borrado lógico.
+
+Los borrados de la API solo marcan `deletedAt` (un UPDATE de una fila). Este
+módulo elimina después lo marcado en lotes acotados: notas con sus adjuntos
+(y ficheros) y filas de `usernotes`, usuarios con las notas que solo eran
+suyas, y categorías sin notas. `run_purger` lo ejecuta en segundo plano, en
+un solo worker, cuando ese worker no está atendiendo peticiones.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, delete, exists, select, update
+from sqlalchemy.orm import Session, aliased
+
+from app.config.database import SessionLocal
+from app.helpers.leases import acquire_lease
+from app.helpers.quotas import release
+from app.helpers.thumbnails import thumbnail_keys
+from app.middleware.activity import RequestActivity
+from app.models.categories import Category
+from app.models.notes import Attachment, Notes
+from app.models.tokens import RevokedToken
+from app.models.uploads import UploadSession
+from app.models.usage import StorageUsage
+from app.models.users import User, UserNotes
+from app.storage import storage
+
+logger = logging.getLogger(__name__)
+
+INCLUDE_DELETED = {"include_deleted": True}
+# Turno que elige al único worker que purga
+PURGE_LEASE = "purge"
+
+
+def _deleted_ids(db: Session, model: type, limit: int) -> List[str]:
+    return list(
+        db.scalars(
+            select(model.id)
+            .where(model.deletedAt.is_not(None))
+            .order_by(model.deletedAt)
+            .limit(limit)
+            .execution_options(**INCLUDE_DELETED)
+        )
+    )
+
+
+def purge_notes(db: Session, batch_size: int, keys: List[str]) -> int:
+    """
+    Elimina hasta `batch_size` notas borradas con sus adjuntos y permisos.
+    Añade a `keys` los objetos del almacenamiento que quedan por borrar.
+    """
+    note_ids = _deleted_ids(db, Notes, batch_size)
+    if not note_ids:
+        return 0
+    attachments = db.execute(
+        select(Attachment.file_path, Attachment.user_id, Attachment.file_size)
+        .where(Attachment.note_id.in_(note_ids))
+        .execution_options(**INCLUDE_DELETED)
+    ).all()
+    # El espacio de los adjuntos y de las subidas en curso a estas notas deja
+    # de contar para quien los subió
+    uploaded = [(user_id, size) for _, user_id, size in attachments]
+    uploaded += db.execute(
+        select(UploadSession.user_id, UploadSession.size).where(
+            UploadSession.note_id.in_(note_ids)
+        )
+    ).all()
+    released: Dict[str, List[int]] = {}
+    for user_id, size in uploaded:
+        if user_id is not None:
+            released.setdefault(user_id, []).append(size)
+    for user_id, sizes in released.items():
+        db.execute(
+            update(StorageUsage)
+            .where(StorageUsage.owner_id == user_id)
+            .values(
+                bytes=StorageUsage.bytes - sum(sizes),
+                files=StorageUsage.files - len(sizes),
+            )
+        )
+    db.execute(delete(StorageUsage).where(StorageUsage.owner_id.in_(note_ids)))
+    db.execute(delete(Attachment).where(Attachment.note_id.in_(note_ids)))
+    # Sus ficheros de trabajo los descarta el recolector de subidas
+    db.execute(delete(UploadSession).where(UploadSession.note_id.in_(note_ids)))
+    db.execute(delete(UserNotes).where(UserNotes.note_id.in_(note_ids)))
+    db.execute(delete(Notes).where(Notes.id.in_(note_ids)))
+    db.commit()
+    # Los objetos se borran cuando las filas ya no existen
+    for key, _, _ in attachments:
+        keys.extend((key, *thumbnail_keys(key)))
+    return len(note_ids)
+
+
+def purge_users(db: Session, batch_size: int) -> int:
+    """
+    Avanza la purga de un usuario borrado: hasta `batch_size` de sus permisos
+    por lote. Sus notas sin otros usuarios quedan marcadas para `purge_notes`;
+    la fila del usuario se elimina cuando ya no le quedan permisos.
+    """
+    user_ids = _deleted_ids(db, User, 1)
+    if not user_ids:
+        return 0
+    user_id = user_ids[0]
+    note_ids = list(
+        db.scalars(
+            select(UserNotes.note_id)
+            .where(UserNotes.user_id == user_id)
+            .limit(batch_size)
+            .execution_options(**INCLUDE_DELETED)
+        )
+    )
+    if note_ids:
+        others = aliased(UserNotes)
+        db.execute(
+            update(Notes)
+            .where(
+                Notes.id.in_(note_ids),
+                Notes.deletedAt.is_(None),
+                ~exists().where(
+                    and_(others.note_id == Notes.id, others.user_id != user_id)
+                ),
+            )
+            .values(deletedAt=datetime.now(timezone.utc))
+            .execution_options(synchronize_session=False)
+        )
+        db.execute(
+            delete(UserNotes).where(
+                UserNotes.user_id == user_id, UserNotes.note_id.in_(note_ids)
+            )
+        )
+    else:
+        db.execute(
+            update(Attachment)
+            .where(Attachment.user_id == user_id)
+            .values(user_id=None)
+            .execution_options(synchronize_session=False)
+        )
+        db.execute(delete(StorageUsage).where(StorageUsage.owner_id == user_id))
+        db.execute(delete(RevokedToken).where(RevokedToken.user_id == user_id))
+        # Sus subidas en curso dejan de contar en las notas que sobreviven
+        uploads = db.execute(
+            delete(UploadSession)
+            .where(UploadSession.user_id == user_id)
+            .returning(UploadSession.note_id, UploadSession.size)
+        ).all()
+        for note_id, size in uploads:
+            release(db, None, note_id, size)
+        db.execute(delete(User).where(User.id == user_id))
+    db.commit()
+    return len(note_ids) or 1
+
+
+def purge_categories(db: Session, batch_size: int) -> int:
+    """Elimina las categorías borradas que ya no tienen notas (ni borradas)."""
+    category_ids = list(
+        db.scalars(
+            select(Category.id)
+            .where(
+                Category.deletedAt.is_not(None),
+                ~exists().where(Notes.category_id == Category.id),
+            )
+            .limit(batch_size)
+            .execution_options(**INCLUDE_DELETED)
+        )
+    )
+    if category_ids:
+        db.execute(delete(Category).where(Category.id.in_(category_ids)))
+        db.commit()
+    return len(category_ids)
+
+
+def purge_batch(
+    batch_size: int, session_factory: Callable[[], Session] = SessionLocal
+) -> Tuple[int, List[str]]:
+    """
+    Un paso acotado de purga: filas tratadas (0 si no queda nada) y claves de
+    los objetos que hay que borrar del almacenamiento.
+    """
+    keys: List[str] = []
+    with session_factory() as db:
+        purged = purge_notes(db, batch_size, keys)
+        for purge in (purge_users, purge_categories):
+            if purged:
+                break
+            purged = purge(db, batch_size)
+    return purged, keys
+
+
+async def run_purger(
+    activity: RequestActivity,
+    batch_size: int,
+    interval: float,
+    idle_seconds: float,
+) -> None:
+    """
+    Purga en lotes mientras no haya peticiones; revisa cada `interval` s.
+
+    Solo purga el worker con el turno `PURGE_LEASE`, que lo renueva antes de
+    cada lote y lo pierde a los tres intervalos sin renovarlo. La espera a que
+    no haya peticiones es por worker: mira el tráfico de este proceso, no el
+    de los demás. Si el elegido no queda libre, su turno caduca y lo toma otro
+    que sí lo esté.
+    """
+    lease_seconds = 3 * interval
+    while True:
+        await asyncio.sleep(interval)
+        purged = 0
+        while activity.is_quiet(idle_seconds):
+            try:
+                if not await run_in_threadpool(
+                    acquire_lease, PURGE_LEASE, lease_seconds
+                ):
+                    break
+                count, keys = await run_in_threadpool(purge_batch, batch_size)
+                await storage.delete_many(keys)
+            except Exception:
+                logger.exception("Fallo al purgar filas borradas")
+                break
+            if not count:
+                break
+            purged += count
+        if purged:
+            logger.info("Purgadas %d filas borradas", purged)
@@ -0,0 +1,181 @@
+"""
+Cuotas de adjuntos por usuario y por nota.
+
+El uso se lleva en `storageusage` (bytes y número de ficheros por usuario y
+por nota), actualizado en la misma transacción que crea o borra el adjunto:
+comprobar una cuota es una lectura por clave primaria. `charge` reserva el
+espacio con un UPDATE condicional, de modo que dos subidas simultáneas no
+pueden superar juntas el límite. Las subidas reanudables en curso también
+cuentan: reservan su tamaño al abrirse. `reconcile_usage` recalcula los
+contadores desde `attachment` y `uploadsession` por si alguno se desvía.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, func, insert, select, union_all, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.config.database import SessionLocal
+from app.config.settings import settings
+from app.models.notes import Attachment
+from app.models.uploads import UploadSession
+from app.models.usage import StorageUsage
+
+logger = logging.getLogger(__name__)
+
+QUOTA_EXCEEDED = "Se ha superado la cuota de almacenamiento"
+INCLUDE_DELETED = {"include_deleted": True}
+
+
+@dataclass(frozen=True)
+class Quota:
+    """Límites de bytes y de ficheros; 0 es sin límite."""
+
+    max_bytes: int = 0
+    max_files: int = 0
+
+    def remaining_bytes(self, used: int) -> Optional[int]:
+        return None if not self.max_bytes else max(self.max_bytes - used, 0)
+
+    def allows(self, used_bytes: int, used_files: int, size: int) -> bool:
+        return (not self.max_bytes or used_bytes + size <= self.max_bytes) and (
+            not self.max_files or used_files + 1 <= self.max_files
+        )
+
+
+USER_QUOTA = Quota(settings.QUOTA_USER_BYTES, settings.QUOTA_USER_FILES)
+NOTE_QUOTA = Quota(settings.QUOTA_NOTE_BYTES, settings.QUOTA_NOTE_FILES)
+
+
+def quota_exceeded() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=QUOTA_EXCEEDED
+    )
+
+
+def get_usage(db: Session, *owner_ids: str) -> Dict[str, Tuple[int, int]]:
+    """`(bytes, ficheros)` de cada id en una sola lectura por clave primaria."""
+    rows = db.execute(
+        select(StorageUsage.owner_id, StorageUsage.bytes, StorageUsage.files).where(
+            StorageUsage.owner_id.in_(owner_ids)
+        )
+    )
+    usage = {owner_id: (0, 0) for owner_id in owner_ids}
+    usage.update({owner_id: (used, files) for owner_id, used, files in rows})
+    return usage
+
+
+def upload_allowance(
+    db: Session, user_id: str, note_id: str
+) -> Tuple[bool, Optional[int]]:
+    """
+    Si cabe otro fichero y cuántos bytes quedan (`None`: sin límite) para una
+    subida de `user_id` a `note_id`.
+    """
+    usage = get_usage(db, user_id, note_id)
+    room = True
+    remaining: Optional[int] = None
+    for owner_id, quota in ((user_id, USER_QUOTA), (note_id, NOTE_QUOTA)):
+        used, files = usage[owner_id]
+        room = room and quota.allows(used, files, 0)
+        left = quota.remaining_bytes(used)
+        if left is not None:
+            remaining = left if remaining is None else min(remaining, left)
+    return room, remaining
+
+
+def _ensure_rows(db: Session, *owner_ids: str) -> None:
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    db.execute(
+        dialect.insert(StorageUsage)
+        .values([{"owner_id": owner_id} for owner_id in owner_ids])
+        .on_conflict_do_nothing(index_elements=["owner_id"])
+    )
+
+
+def _reserve(db: Session, owner_id: str, quota: Quota, size: int) -> bool:
+    statement = update(StorageUsage).where(StorageUsage.owner_id == owner_id)
+    if quota.max_bytes:
+        statement = statement.where(StorageUsage.bytes + size <= quota.max_bytes)
+    if quota.max_files:
+        statement = statement.where(StorageUsage.files + 1 <= quota.max_files)
+    result = db.execute(
+        statement.values(
+            bytes=StorageUsage.bytes + size, files=StorageUsage.files + 1
+        ).execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def charge(db: Session, user_id: str, note_id: str, size: int) -> None:
+    """
+    Suma un adjunto de `size` bytes al uso del usuario y de la nota, o lanza
+    413 si no cabe. No hace commit ni rollback: va en la transacción del
+    adjunto y quien llama la deshace si falla.
+    """
+    _ensure_rows(db, user_id, note_id)
+    if not (
+        _reserve(db, user_id, USER_QUOTA, size)
+        and _reserve(db, note_id, NOTE_QUOTA, size)
+    ):
+        raise quota_exceeded()
+
+
+def release(db: Session, user_id: Optional[str], note_id: str, size: int) -> None:
+    """Resta un adjunto del uso del usuario y de la nota (sin commit)."""
+    owner_ids = [note_id] if user_id is None else [user_id, note_id]
+    db.execute(
+        update(StorageUsage)
+        .where(StorageUsage.owner_id.in_(owner_ids))
+        .values(bytes=StorageUsage.bytes - size, files=StorageUsage.files - 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def reconcile_usage(session_factory: Callable[[], Session] = SessionLocal) -> None:
+    """
+    Recalcula todos los contadores desde los adjuntos y las subidas en curso
+    en una transacción.
+    """
+    sources = [
+        select(
+            column.label("owner_id"),
+            func.sum(size).label("bytes"),
+            func.count().label("files"),
+        )
+        .where(column.is_not(None))
+        .group_by(column)
+        # Los adjuntos de notas borradas ocupan disco hasta la purga
+        .execution_options(**INCLUDE_DELETED)
+        for size, columns in (
+            (Attachment.file_size, (Attachment.user_id, Attachment.note_id)),
+            (UploadSession.size, (UploadSession.user_id, UploadSession.note_id)),
+        )
+        for column in columns
+    ]
+    usage = union_all(*sources).subquery()
+    totals = select(
+        usage.c.owner_id, func.sum(usage.c.bytes), func.sum(usage.c.files)
+    ).group_by(usage.c.owner_id)
+    with session_factory() as db:
+        db.execute(delete(StorageUsage))
+        db.execute(
+            insert(StorageUsage).from_select(["owner_id", "bytes", "files"], totals)
+        )
+        db.commit()
+
+
+async def run_reconciler(interval: float) -> None:
+    """Recalcula los contadores cada `interval` segundos."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(reconcile_usage)
+        except Exception:
+            logger.exception("Fallo al recalcular el uso de almacenamiento")
@@ -0,0 +1,95 @@
+"""
+Compartición de notas con operaciones por conjuntos sobre `usernotes`.
+
+Ninguna función carga la colección `Notes.users`: los usuarios se resuelven
+con una consulta `IN`, las altas con un `INSERT ... ON CONFLICT DO NOTHING`
+y las bajas con un único `DELETE`.
+"""
+
+import uuid
+from typing import Iterable, List, Tuple
+
+from sqlalchemy import and_, delete, exists, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, aliased
+
+from app.models.users import User, UserNotes
+
+
+def resolve_users(db: Session, refs: Iterable[str]) -> Tuple[List[str], List[str]]:
+    """
+    Resuelve ids o nombres de usuario en una sola consulta.
+
+    Devuelve los ids encontrados y las referencias que no existen, sin
+    duplicados y en el orden recibido.
+    """
+    refs = list(dict.fromkeys(refs))
+    if not refs:
+        return [], []
+    rows = db.execute(
+        select(User.id, User.username).where(
+            or_(User.id.in_(refs), User.username.in_(refs))
+        )
+    ).all()
+    found = {user_id for user_id, _ in rows} | {username for _, username in rows}
+    user_ids = list(dict.fromkeys(user_id for user_id, _ in rows))
+    return user_ids, [ref for ref in refs if ref not in found]
+
+
+def share_with(db: Session, note_id: str, user_ids: List[str]) -> int:
+    """Da acceso a la nota a `user_ids`; devuelve cuántos accesos son nuevos."""
+    if not user_ids:
+        return 0
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    statement = (
+        dialect.insert(UserNotes)
+        .values(
+            [
+                {"id": str(uuid.uuid4()), "user_id": user_id, "note_id": note_id}
+                for user_id in user_ids
+            ]
+        )
+        .on_conflict_do_nothing(index_elements=["user_id", "note_id"])
+    )
+    return db.execute(statement).rowcount
+
+
+def unshare_with(db: Session, note_id: str, user_ids: List[str]) -> int:
+    """
+    Quita el acceso a `user_ids` si la nota conserva al menos otro usuario.
+
+    Devuelve las filas borradas: 0 si ninguno tenía acceso o si la baja
+    dejaría la nota sin usuarios.
+    """
+    if not user_ids:
+        return 0
+    remaining = aliased(UserNotes)
+    result = db.execute(
+        delete(UserNotes)
+        .where(
+            UserNotes.note_id == note_id,
+            UserNotes.user_id.in_(user_ids),
+            exists().where(
+                and_(
+                    remaining.note_id == note_id,
+                    remaining.user_id.not_in(user_ids),
+                )
+            ),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+def shared_with_any(db: Session, note_id: str, user_ids: List[str]) -> bool:
+    """Indica si alguno de `user_ids` tiene acceso a la nota."""
+    return bool(
+        user_ids
+        and db.scalar(
+            select(
+                exists().where(
+                    UserNotes.note_id == note_id, UserNotes.user_id.in_(user_ids)
+                )
+            )
+        )
+    )
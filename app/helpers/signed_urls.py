@@ -0,0 +1,59 @@
+"""
+URLs firmadas y con caducidad para descargar adjuntos.
+
+La firma es un HMAC-SHA256 sobre el id del adjunto, su clave en el
+almacenamiento, la caducidad, el nombre y el tipo MIME. Todo lo que la ruta de
+descarga necesita viaja en la URL, así que basta con verificar la firma: no
+hace falta el token del usuario ni consultar la base de datos.
+"""
+
+import hashlib
+import hmac
+import time
+from typing import Dict, Optional
+
+from app.helpers.constance import SECRET_KEY
+
+# Clave derivada: una firma de URL no sirve como firma de otra cosa
+SIGNING_KEY = hmac.new(
+    SECRET_KEY.encode(), b"attachment-download-url", hashlib.sha256
+).digest()
+
+
+def _signature(
+    attachment_id: str, key: str, expires: int, filename: str, mime_type: str
+) -> str:
+    message = "\n".join((attachment_id, key, str(expires), filename, mime_type))
+    return hmac.new(SIGNING_KEY, message.encode(), hashlib.sha256).hexdigest()
+
+
+def sign(
+    attachment_id: str,
+    key: str,
+    expires: int,
+    filename: str,
+    mime_type: str,
+) -> Dict[str, str]:
+    """Parámetros de consulta de la URL firmada (caduca en `expires`, epoch)."""
+    return {
+        "expires": str(expires),
+        "filename": filename,
+        "type": mime_type,
+        "signature": _signature(attachment_id, key, expires, filename, mime_type),
+    }
+
+
+def verify(
+    attachment_id: str,
+    key: str,
+    expires: int,
+    filename: str,
+    mime_type: str,
+    signature: str,
+    now: Optional[float] = None,
+) -> bool:
+    """Si la firma es válida y la URL no ha caducado."""
+    expected = _signature(attachment_id, key, expires, filename, mime_type)
+    if not hmac.compare_digest(expected, signature):
+        return False
+    return expires > (time.time() if now is None else now)
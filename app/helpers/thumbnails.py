@@ -0,0 +1,193 @@
+"""
+Miniaturas de los adjuntos de imagen.
+
+Se generan en un pool de procesos, fuera del bucle de eventos y del GIL de los
+workers: `create_attachment` las pide en segundo plano al subir el archivo y
+el endpoint de miniaturas las genera bajo demanda si aún no existen. Se
+guardan en WebP en el almacenamiento, junto al original
+(`<id>.thumb-<tamaño>.webp`), y no cambian nunca porque un adjunto no se
+modifica tras subirlo.
+
+El original no pasa por memoria ni se envía al pool: el proceso lo abre por
+ruta (el propio fichero con el backend local, una copia temporal con los
+demás). Las imágenes de más de `THUMBNAIL_MAX_PIXELS` se rechazan antes de
+decodificarlas, y los JPEG se decodifican ya reducidos. Las peticiones
+simultáneas de un mismo adjunto comparten una sola generación (por proceso).
+"""
+
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from pathlib import PurePosixPath
+from typing import AsyncIterator, Dict, List, Optional, Sequence
+
+import anyio
+from PIL import Image, ImageOps
+
+from app.config.settings import settings
+from app.storage import (
+    LocalStorage,
+    ObjectNotFound,
+    Storage,
+    sibling_key,
+    storage,
+)
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_MEDIA_TYPE = "image/webp"
+THUMBNAIL_SIZES = tuple(
+    sorted(int(size) for size in settings.THUMBNAIL_SIZES.split(",") if size.strip())
+)
+SUPPORTED_TYPES = frozenset(
+    {"image/jpeg", "image/png", "image/gif", "image/webp", "image/bmp", "image/tiff"}
+)
+
+# Pillow solo avisa por encima del límite y falla a partir del doble;
+# generate_thumbnails rechaza ya lo que lo supera
+Image.MAX_IMAGE_PIXELS = settings.THUMBNAIL_MAX_PIXELS
+
+
+class ImageTooLarge(ValueError):
+    """La imagen supera `THUMBNAIL_MAX_PIXELS`."""
+
+
+def supports_thumbnails(mime_type: str) -> bool:
+    return mime_type.lower() in SUPPORTED_TYPES
+
+
+def thumbnail_key(key: str, size: int) -> str:
+    return sibling_key(key, f"{PurePosixPath(key).stem}.thumb-{size}.webp")
+
+
+def thumbnail_keys(key: str) -> List[str]:
+    """Claves de todas las miniaturas posibles de un adjunto (existan o no)."""
+    return [thumbnail_key(key, size) for size in THUMBNAIL_SIZES]
+
+
+def generate_thumbnails(
+    path: str, sizes: Sequence[int], max_pixels: int = settings.THUMBNAIL_MAX_PIXELS
+) -> Dict[int, bytes]:
+    """WebP de la imagen en `path` para cada tamaño (se ejecuta en el pool)."""
+    thumbnails = {}
+    # Abrir solo lee la cabecera: el tamaño se conoce antes de decodificar
+    with Image.open(path) as image:
+        if image.width * image.height > max_pixels:
+            raise ImageTooLarge(
+                f"{image.width}x{image.height} supera {max_pixels} píxeles"
+            )
+        # JPEG: decodificar a 1/2, 1/4 o 1/8 si basta para el tamaño mayor
+        largest = max(sizes)
+        image.draft(None, (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        # De mayor a menor: cada reducción parte de la anterior
+        for size in sorted(sizes, reverse=True):
+            image.thumbnail((size, size))
+            output = io.BytesIO()
+            image.save(output, "WEBP", quality=80, method=4)
+            thumbnails[size] = output.getvalue()
+    return thumbnails
+
+
+@asynccontextmanager
+async def source_path(storage: Storage, key: str) -> AsyncIterator[str]:
+    """
+    Ruta de un fichero con el contenido de `key`: el propio fichero con el
+    backend local; con los demás, una copia temporal descargada en streaming.
+    """
+    if isinstance(storage, LocalStorage):
+        path = storage.path(key)
+        if not await anyio.Path(path).is_file():
+            raise ObjectNotFound(key)
+        yield str(path)
+        return
+    fd, copy = await anyio.to_thread.run_sync(tempfile.mkstemp)
+    os.close(fd)
+    try:
+        async with await anyio.open_file(copy, "wb") as file:
+            async for chunk in storage.get(key):
+                await file.write(chunk)
+        yield copy
+    finally:
+        await anyio.Path(copy).unlink(missing_ok=True)
+
+
+class ThumbnailPool:
+    """Pool de procesos creado en el primer uso."""
+
+    def __init__(
+        self,
+        storage: Storage,
+        workers: int,
+        sizes: Sequence[int] = THUMBNAIL_SIZES,
+        max_pixels: int = settings.THUMBNAIL_MAX_PIXELS,
+    ) -> None:
+        self.storage = storage
+        self.workers = workers
+        self.sizes = tuple(sizes)
+        self.max_pixels = max_pixels
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._inflight: Dict[str, "asyncio.Task[None]"] = {}
+
+    def submit(self, path: str, sizes: Sequence[int]) -> "Future[Dict[int, bytes]]":
+        if self._executor is None:
+            # spawn: un fork del worker copiaría sus hilos y conexiones abiertas
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor.submit(generate_thumbnails, path, sizes, self.max_pixels)
+
+    async def ensure(self, key: str) -> None:
+        """
+        Genera y guarda las miniaturas que falten del adjunto `key`. Si ya se
+        están generando, espera a esa generación y comparte su resultado.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(self._generate(key))
+            task.add_done_callback(lambda done: self._finished(key, done))
+        # Si quien espera se cancela (el cliente se fue), la generación sigue
+        await asyncio.shield(task)
+
+    def _finished(self, key: str, task: "asyncio.Task[None]") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Marcar la excepción como vista aunque ya nadie espere la tarea
+            task.exception()
+
+    async def _generate(self, key: str) -> None:
+        pending = [
+            size
+            for size in self.sizes
+            if not await self.storage.exists(thumbnail_key(key, size))
+        ]
+        if not pending:
+            return
+        async with source_path(self.storage, key) as path:
+            thumbnails = await asyncio.wrap_future(self.submit(path, pending))
+        for size, thumbnail in thumbnails.items():
+            await self.storage.put_bytes(thumbnail_key(key, size), thumbnail)
+
+    async def enqueue(self, key: str) -> None:
+        """Como `ensure`, para segundo plano: los fallos solo se registran."""
+        try:
+            await self.ensure(key)
+        except Exception as exc:
+            logger.warning("No se pudieron generar miniaturas de %s: %s", key, exc)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+
+thumbnails = ThumbnailPool(storage, workers=settings.THUMBNAIL_WORKERS)
@@ -0,0 +1,292 @@
+"""
+Subidas reanudables de adjuntos grandes.
+
+`POST /notes/{id}/uploads` abre una sesión con el tamaño total del fichero;
+cada `PATCH /notes/uploads/{id}` envía un fragmento con `Upload-Offset` (los
+bytes ya recibidos) y, opcionalmente, `Upload-Checksum: <algoritmo> <base64>`;
+`GET /notes/uploads/{id}` devuelve el offset desde el que reanudar tras un
+corte y `POST /notes/uploads/{id}/complete` convierte la sesión en adjunto.
+
+Cada sesión tiene un fichero de trabajo (`UPLOAD_STAGING_DIR/<id>.part`) y
+cada fragmento se escribe en su posición con `pwrite`, sin volver a copiar lo
+ya recibido. Un `flock` sobre el fichero impide que dos PATCH de la misma
+sesión escriban a la vez, también desde workers distintos; donde no hay
+`fcntl` (Windows) el bloqueo solo cubre el proceso actual. Si el fragmento
+no cuadra con su checksum, se trunca el fichero al offset anterior.
+
+El directorio de trabajo es local al nodo. Al finalizar, con el backend
+local el fichero se renombra a su clave; con los demás se sube en streaming.
+Una sesión reserva su tamaño en la cuota al abrirse; el adjunto hereda la
+reserva al finalizar y se devuelve al cancelarla o descartarla. Las sesiones
+caducan tras `UPLOAD_SESSION_TTL_SECONDS` sin fragmentos y `run_reaper`
+borra las caducadas y sus ficheros.
+"""
+
+import asyncio
+import base64
+import binascii
+import hashlib
+import hmac
+import logging
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import AsyncIterable, AsyncIterator, Callable, Optional, Set, Tuple
+
+import anyio
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from app.config.database import SessionLocal
+from app.config.settings import settings
+from app.helpers.quotas import release
+from app.models.uploads import UploadSession
+from app.storage import LocalStorage, Storage
+from app.storage.base import CHUNK_SIZE
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+STAGING_DIR = Path(
+    settings.UPLOAD_STAGING_DIR or os.path.join(settings.UPLOAD_DIR, ".staging")
+)
+CHECKSUM_ALGORITHMS = frozenset({"md5", "sha1", "sha256"})
+SESSION_TTL = timedelta(seconds=settings.UPLOAD_SESSION_TTL_SECONDS)
+
+# Sesiones bloqueadas en este proceso cuando no hay `flock`
+_local_locks: Set[str] = set()
+
+
+def staging_path(upload_id: str) -> Path:
+    return STAGING_DIR / f"{upload_id}.part"
+
+
+def session_expiry(now: Optional[datetime] = None) -> datetime:
+    return (now or datetime.now(timezone.utc)) + SESSION_TTL
+
+
+def parse_checksum(value: Optional[str]) -> Optional[Tuple[str, bytes]]:
+    """`(algoritmo, digest)` de una cabecera `Upload-Checksum`, si la hay."""
+    if not value:
+        return None
+    algorithm, _, encoded = value.strip().partition(" ")
+    algorithm = algorithm.lower()
+    try:
+        digest = base64.b64decode(encoded.strip(), validate=True)
+    except binascii.Error:
+        digest = b""
+    if (
+        algorithm not in CHECKSUM_ALGORITHMS
+        or len(digest) != hashlib.new(algorithm).digest_size
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=(
+                "Upload-Checksum no válido; formato '<algoritmo> <base64>' con "
+                f"algoritmo en {sorted(CHECKSUM_ALGORITHMS)}"
+            ),
+        )
+    return algorithm, digest
+
+
+def create_part(upload_id: str) -> None:
+    STAGING_DIR.mkdir(parents=True, exist_ok=True)
+    staging_path(upload_id).touch(exist_ok=False)
+
+
+def discard_part(upload_id: str) -> None:
+    staging_path(upload_id).unlink(missing_ok=True)
+
+
+def _busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Ya hay otro fragmento de esta subida en curso",
+    )
+
+
+def _lock(fd: int) -> None:
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        raise _busy()
+
+
+@asynccontextmanager
+async def locked_part(upload_id: str) -> AsyncIterator[int]:
+    """
+    Descriptor del fichero de trabajo con un bloqueo exclusivo; 409 si otra
+    petición lo tiene. El bloqueo se libera al cerrar el descriptor.
+    """
+    try:
+        # O_BINARY: en Windows los descriptores se abren en modo texto
+        fd = await anyio.to_thread.run_sync(
+            os.open, staging_path(upload_id), os.O_RDWR | getattr(os, "O_BINARY", 0)
+        )
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Subida no encontrada o caducada",
+        )
+    try:
+        if fcntl is not None:
+            await anyio.to_thread.run_sync(_lock, fd)
+            yield fd
+            return
+        if upload_id in _local_locks:
+            raise _busy()
+        _local_locks.add(upload_id)
+        try:
+            yield fd
+        finally:
+            _local_locks.discard(upload_id)
+    finally:
+        await anyio.to_thread.run_sync(os.close, fd)
+
+
+def _write_at(fd: int, data: bytes, position: int) -> None:
+    view = memoryview(data)
+    while view:
+        if hasattr(os, "pwrite"):
+            written = os.pwrite(fd, view, position)
+        else:  # Windows: el bloqueo evita escrituras concurrentes
+            os.lseek(fd, position, os.SEEK_SET)
+            written = os.write(fd, view)
+        view = view[written:]
+        position += written
+
+
+def _commit(fd: int, size: int) -> None:
+    # Descarta lo que pudiera quedar de un fragmento interrumpido y persiste
+    os.ftruncate(fd, size)
+    os.fsync(fd)
+
+
+async def write_chunk(
+    fd: int,
+    offset: int,
+    chunks: AsyncIterable[bytes],
+    max_bytes: int,
+    checksum: Optional[Tuple[str, bytes]] = None,
+) -> int:
+    """
+    Escribe el fragmento en `offset` y devuelve su longitud. Con más de
+    `max_bytes` (413) o con un checksum que no cuadra (400) el fichero vuelve
+    a terminar en `offset`.
+    """
+    digest = hashlib.new(checksum[0]) if checksum else None
+    position = offset
+    try:
+        async for chunk in chunks:
+            if position + len(chunk) - offset > max_bytes:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail="El fragmento supera el tamaño permitido",
+                )
+            await anyio.to_thread.run_sync(_write_at, fd, chunk, position)
+            if digest is not None:
+                digest.update(chunk)
+            position += len(chunk)
+        if digest is not None and not hmac.compare_digest(digest.digest(), checksum[1]):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="El checksum del fragmento no coincide",
+            )
+    except BaseException:
+        with anyio.CancelScope(shield=True):
+            await anyio.to_thread.run_sync(_commit, fd, offset)
+        raise
+    await anyio.to_thread.run_sync(_commit, fd, position)
+    return position - offset
+
+
+async def read_part(upload_id: str) -> AsyncIterator[bytes]:
+    async with await anyio.open_file(staging_path(upload_id), "rb") as file:
+        while chunk := await file.read(CHUNK_SIZE):
+            yield chunk
+
+
+async def part_sha256(upload_id: str) -> str:
+    digest = hashlib.sha256()
+    async for chunk in read_part(upload_id):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def store_part(storage: Storage, upload_id: str, key: str) -> int:
+    """Lleva el fichero de trabajo completo a `key` en el almacenamiento."""
+    if isinstance(storage, LocalStorage):
+        # Mismo sistema de ficheros (por defecto bajo UPLOAD_DIR): renombrar
+        try:
+            return await storage.adopt(key, staging_path(upload_id))
+        except OSError as exc:
+            logger.debug("No se pudo renombrar %s, se copia: %s", upload_id, exc)
+    size = await storage.put(key, read_part(upload_id))
+    await anyio.to_thread.run_sync(discard_part, upload_id)
+    return size
+
+
+async def discard_session(db: Session, upload: UploadSession) -> None:
+    """Borra la sesión, devuelve su reserva de cuota y quita su fichero."""
+    upload_id = upload.id
+    release(db, upload.user_id, upload.note_id, upload.size)
+    db.delete(upload)
+    db.commit()
+    await anyio.to_thread.run_sync(discard_part, upload_id)
+
+
+def expire_sessions(
+    session_factory: Callable[[], Session] = SessionLocal,
+    now: Optional[datetime] = None,
+) -> int:
+    """
+    Borra las sesiones caducadas y los ficheros de trabajo sin actividad en
+    `UPLOAD_SESSION_TTL_SECONDS` (también los de sesiones ya purgadas).
+    """
+    now = now or datetime.now(timezone.utc)
+    with session_factory() as db:
+        expired = db.execute(
+            delete(UploadSession)
+            .where(UploadSession.expiresAt <= now)
+            .returning(
+                UploadSession.id,
+                UploadSession.user_id,
+                UploadSession.note_id,
+                UploadSession.size,
+            )
+        ).all()
+        for _, user_id, note_id, size in expired:
+            release(db, user_id, note_id, size)
+        db.commit()
+    upload_ids = [upload_id for upload_id, _, _, _ in expired]
+    for upload_id in upload_ids:
+        discard_part(upload_id)
+    if STAGING_DIR.is_dir():
+        cutoff = now.timestamp() - SESSION_TTL.total_seconds()
+        for path in STAGING_DIR.glob("*.part"):
+            try:
+                if path.stat().st_mtime <= cutoff:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+    return len(upload_ids)
+
+
+async def run_reaper(interval: float) -> None:
+    """Descarta las subidas abandonadas cada `interval` segundos."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            expired = await run_in_threadpool(expire_sessions)
+        except Exception:
+            logger.exception("Fallo al descartar subidas caducadas")
+            continue
+        if expired:
+            logger.info("Descartadas %d subidas caducadas", expired)
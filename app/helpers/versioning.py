@@ -0,0 +1,46 @@
+from typing import Any, FrozenSet, Optional
+
+from fastapi import Header, HTTPException, status
+
+VERSION_CONFLICT = "El recurso fue modificado por otra petición"
+
+
+def version_etag(version: int) -> str:
+    """ETag fuerte a partir de la versión de la fila."""
+    return f'"{version}"'
+
+
+def if_match_versions(
+    if_match: Optional[str] = Header(None),
+) -> Optional[FrozenSet[int]]:
+    """
+    Versiones aceptadas por la cabecera `If-Match` (`None` con `*`).
+
+    Sin la cabecera responde 428; las ETags débiles (`W/"..."`) nunca coinciden
+    en `If-Match`, así que una cabecera sin ETags de versión responde 412.
+    """
+    if if_match is None:
+        raise HTTPException(
+            status_code=status.HTTP_428_PRECONDITION_REQUIRED,
+            detail="Falta la cabecera If-Match con la ETag del recurso",
+        )
+    if if_match.strip() == "*":
+        return None
+    versions = set()
+    for tag in if_match.split(","):
+        tag = tag.strip()
+        if len(tag) > 2 and tag[0] == tag[-1] == '"' and tag[1:-1].isdigit():
+            versions.add(int(tag[1:-1]))
+    if not versions:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED, detail=VERSION_CONFLICT
+        )
+    return frozenset(versions)
+
+
+def check_version(model: Any, versions: Optional[FrozenSet[int]]) -> None:
+    """412 si la versión actual de `model` no es ninguna de las esperadas."""
+    if versions is not None and model.version not in versions:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED, detail=VERSION_CONFLICT
+        )
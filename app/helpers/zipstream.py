@@ -0,0 +1,367 @@
+"""
+Archivos ZIP generados al vuelo.
+
+Cada entrada se escribe como cabecera local, datos y "data descriptor" (bit
+3 de los flags): el CRC y los tamaños se calculan mientras pasan los datos y
+van detrás de ellos, así que nada se lee dos veces ni se guarda en un
+temporal. Solo se acumula el directorio central (unos 100 bytes por entrada)
+para emitirlo al final. Las extensiones ZIP64 se usan cuando un tamaño, un
+desplazamiento o el número de entradas no caben en los campos clásicos, de
+modo que el archivo no tiene el límite de 4 GiB.
+
+Los tamaños del data descriptor solo pueden ser de 8 bytes si la cabecera
+local lleva el extra ZIP64 (APPNOTE 4.3.9): los lectores en streaming lo
+miran para saber cómo leerlo. Como la cabecera sale antes que los datos, se
+decide con el tamaño que anuncia la entrada; sin tamaño conocido la entrada
+va siempre como ZIP64.
+
+Los tipos que ya vienen comprimidos (imágenes, audio, vídeo, PDF, otros
+archivos...) se guardan tal cual ("stored"); el resto va con deflate.
+"""
+
+import logging
+import struct
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import PurePosixPath
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+import anyio
+
+from app.storage import ObjectNotFound
+from app.storage.base import CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Valores a partir de los cuales un campo pasa a su extensión ZIP64, donde
+# el campo clásico queda con todos los bits a 1
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_COUNT_LIMIT = 0xFFFF
+MAX_UINT32 = 0xFFFFFFFF
+MAX_UINT16 = 0xFFFF
+
+STORED = 0
+DEFLATED = 8
+FLAG_DATA_DESCRIPTOR = 0x08
+FLAG_UTF8 = 0x800
+VERSION_DEFAULT = 20
+VERSION_ZIP64 = 45
+# "Creado en" Unix: los permisos van en los atributos externos
+MADE_BY_UNIX = 3 << 8
+FILE_ATTRIBUTES = 0o100644 << 16
+
+PRECOMPRESSED_PREFIXES = (
+    "audio/",
+    "video/",
+    "application/vnd.openxmlformats-officedocument.",
+    "application/vnd.oasis.opendocument.",
+)
+PRECOMPRESSED_TYPES = frozenset(
+    {
+        "image/jpeg",
+        "image/png",
+        "image/gif",
+        "image/webp",
+        "image/avif",
+        "image/heic",
+        "application/pdf",
+        "application/zip",
+        "application/gzip",
+        "application/x-gzip",
+        "application/x-bzip2",
+        "application/x-xz",
+        "application/zstd",
+        "application/x-7z-compressed",
+        "application/vnd.rar",
+        "application/x-rar-compressed",
+        "application/java-archive",
+        "application/epub+zip",
+    }
+)
+
+
+def is_precompressed(mime_type: str) -> bool:
+    media_type = mime_type.split(";", 1)[0].strip().lower()
+    return media_type in PRECOMPRESSED_TYPES or media_type.startswith(
+        PRECOMPRESSED_PREFIXES
+    )
+
+
+def entry_names(filenames: Iterable[str]) -> List[str]:
+    """
+    Nombres de entrada sin rutas y sin repetir: el segundo `a.txt` pasa a
+    ser `a (1).txt`.
+    """
+    names: List[str] = []
+    seen: Set[str] = set()
+    for filename in filenames:
+        name = filename.replace("\\", "_").replace("/", "_").strip() or "archivo"
+        path = PurePosixPath(name)
+        candidate, counter = name, 0
+        while candidate.lower() in seen:
+            counter += 1
+            candidate = f"{path.stem} ({counter}){path.suffix}"
+        seen.add(candidate.lower())
+        names.append(candidate)
+    return names
+
+
+@dataclass
+class ZipEntry:
+    """Fichero que añadir al archivo: su contenido se lee al escribirlo."""
+
+    name: str
+    chunks: AsyncIterable[bytes]
+    modified: datetime
+    compress: bool = True
+    # Tamaño sin comprimir, si se conoce antes de leer el contenido
+    size: Optional[int] = None
+
+
+@dataclass
+class _Record:
+    name: bytes
+    method: int
+    dos_time: int
+    dos_date: int
+    crc: int
+    compressed_size: int
+    size: int
+    offset: int
+    zip64: bool
+
+
+def dos_datetime(moment: datetime) -> Tuple[int, int]:
+    """`(hora, fecha)` en formato MS-DOS (de 1980 a 2107, a 2 s)."""
+    year = min(max(moment.year, 1980), 2107)
+    dos_time = (moment.hour << 11) | (moment.minute << 5) | (moment.second // 2)
+    dos_date = ((year - 1980) << 9) | (moment.month << 5) | moment.day
+    return dos_time, dos_date
+
+
+def needs_zip64(size: Optional[int], compress: bool) -> bool:
+    """Si una entrada de `size` bytes puede necesitar tamaños de 8 bytes."""
+    if size is None:
+        return True
+    if compress:
+        # Cota de zlib (compressBound): deflate hace crecer lo incompresible
+        size += (size >> 12) + (size >> 14) + (size >> 25) + 13
+    return size >= ZIP64_LIMIT
+
+
+def _local_header(
+    name: bytes, method: int, dos_time: int, dos_date: int, zip64: bool
+) -> bytes:
+    # CRC y tamaños van en el data descriptor; con ZIP64 los tamaños clásicos
+    # quedan a 0xFFFFFFFF y el extra los lleva a cero
+    extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0) if zip64 else b""
+    placeholder = MAX_UINT32 if zip64 else 0
+    return (
+        struct.pack(
+            "<IHHHHHIIIHH",
+            0x04034B50,
+            VERSION_ZIP64 if zip64 else VERSION_DEFAULT,
+            FLAG_DATA_DESCRIPTOR | FLAG_UTF8,
+            method,
+            dos_time,
+            dos_date,
+            0,
+            placeholder,
+            placeholder,
+            len(name),
+            len(extra),
+        )
+        + name
+        + extra
+    )
+
+
+def _deflate(
+    compress: Callable[[bytes], bytes], chunk: bytes, crc: int
+) -> Tuple[bytes, int]:
+    return compress(chunk), zlib.crc32(chunk, crc)
+
+
+async def _chain(
+    first: Optional[bytes], rest: AsyncIterator[bytes]
+) -> AsyncIterator[bytes]:
+    if first is not None:
+        yield first
+        async for chunk in rest:
+            yield chunk
+
+
+def _central_directory_entry(record: _Record) -> bytes:
+    size, compressed_size, offset = record.size, record.compressed_size, record.offset
+    # Los campos que no caben van, en este orden, en el extra ZIP64
+    zip64_fields = []
+    if size >= ZIP64_LIMIT:
+        zip64_fields.append(size)
+        size = MAX_UINT32
+    if compressed_size >= ZIP64_LIMIT:
+        zip64_fields.append(compressed_size)
+        compressed_size = MAX_UINT32
+    if offset >= ZIP64_LIMIT:
+        zip64_fields.append(offset)
+        offset = MAX_UINT32
+    extra = b""
+    if zip64_fields:
+        extra = struct.pack(
+            f"<HH{len(zip64_fields)}Q", 0x0001, 8 * len(zip64_fields), *zip64_fields
+        )
+    version = VERSION_ZIP64 if zip64_fields or record.zip64 else VERSION_DEFAULT
+    return (
+        struct.pack(
+            "<IHHHHHHIIIHHHHHII",
+            0x02014B50,
+            MADE_BY_UNIX | version,
+            version,
+            FLAG_DATA_DESCRIPTOR | FLAG_UTF8,
+            record.method,
+            record.dos_time,
+            record.dos_date,
+            record.crc,
+            compressed_size,
+            size,
+            len(record.name),
+            len(extra),
+            0,
+            0,
+            0,
+            FILE_ATTRIBUTES,
+            offset,
+        )
+        + record.name
+        + extra
+    )
+
+
+def _end_records(count: int, size: int, offset: int) -> bytes:
+    end = b""
+    if count >= ZIP64_COUNT_LIMIT or size >= ZIP64_LIMIT or offset >= ZIP64_LIMIT:
+        zip64_end_offset = offset + size
+        end += struct.pack(
+            "<IQHHIIQQQQ",
+            0x06064B50,
+            44,
+            MADE_BY_UNIX | VERSION_ZIP64,
+            VERSION_ZIP64,
+            0,
+            0,
+            count,
+            count,
+            size,
+            offset,
+        )
+        end += struct.pack("<IIQI", 0x07064B50, 0, zip64_end_offset, 1)
+    zip64 = bool(end)
+    end += struct.pack(
+        "<IHHHHIIH",
+        0x06054B50,
+        0,
+        0,
+        MAX_UINT16 if zip64 else count,
+        MAX_UINT16 if zip64 else count,
+        MAX_UINT32 if zip64 else size,
+        MAX_UINT32 if zip64 else offset,
+        0,
+    )
+    return end
+
+
+async def stream_zip(
+    entries: AsyncIterable[ZipEntry], level: int = 6
+) -> AsyncIterator[bytes]:
+    """
+    Genera el archivo con las entradas en orden. Una entrada cuyo objeto no
+    existe en el almacenamiento se omite; una que no es ZIP64 y resulta
+    ocupar 4 GiB o más corta el archivo con `ValueError`.
+    """
+    records: List[_Record] = []
+    offset = 0
+    async for entry in entries:
+        chunks = entry.chunks.__aiter__()
+        try:
+            first = await chunks.__anext__()
+        except StopAsyncIteration:
+            first = None
+        except ObjectNotFound:
+            logger.warning(
+                "Se omite %s del ZIP: falta en el almacenamiento", entry.name
+            )
+            continue
+
+        name = entry.name.encode()
+        method = DEFLATED if entry.compress else STORED
+        dos_time, dos_date = dos_datetime(entry.modified)
+        zip64 = needs_zip64(entry.size, entry.compress)
+        header = _local_header(name, method, dos_time, dos_date, zip64)
+        yield header
+
+        crc = size = compressed_size = 0
+        compressor = (
+            zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+            if method == DEFLATED
+            else None
+        )
+        async for chunk in _chain(first, chunks):
+            size += len(chunk)
+            if compressor is not None:
+                # Deflate y CRC en un hilo: no bloquean el bucle de eventos
+                chunk, crc = await anyio.to_thread.run_sync(
+                    _deflate, compressor.compress, chunk, crc
+                )
+            else:
+                crc = zlib.crc32(chunk, crc)
+            if chunk:
+                compressed_size += len(chunk)
+                yield chunk
+        if compressor is not None:
+            tail = compressor.flush()
+            compressed_size += len(tail)
+            yield tail
+
+        if zip64:
+            descriptor = struct.pack("<IIQQ", 0x08074B50, crc, compressed_size, size)
+        elif size >= ZIP64_LIMIT or compressed_size >= ZIP64_LIMIT:
+            raise ValueError(f"{entry.name} ocupa más que el tamaño anunciado")
+        else:
+            descriptor = struct.pack("<IIII", 0x08074B50, crc, compressed_size, size)
+        yield descriptor
+
+        records.append(
+            _Record(
+                name,
+                method,
+                dos_time,
+                dos_date,
+                crc,
+                compressed_size,
+                size,
+                offset,
+                zip64,
+            )
+        )
+        offset += len(header) + compressed_size + len(descriptor)
+
+    # El directorio central sale en bloques de CHUNK_SIZE, no entrada a entrada
+    directory = bytearray()
+    directory_size = 0
+    for record in records:
+        directory += _central_directory_entry(record)
+        if len(directory) >= CHUNK_SIZE:
+            directory_size += len(directory)
+            yield bytes(directory)
+            directory.clear()
+    directory_size += len(directory)
+    yield bytes(directory + _end_records(len(records), directory_size, offset))
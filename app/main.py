@@ -1,26 +1,83 @@
-import uvicorn
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+"""
+Punto de entrada de la aplicación.
 
-from app.config.settings import settings
-from app.routes.api import router
-from app.utils.exception import AppBaseException
+`import app.main` no carga FastAPI, SQLAlchemy ni las rutas: la aplicación se
+construye con `create_app` y `app.main:app` se crea en el primer acceso.
+"""
 
-app = FastAPI()
+import asyncio
+import importlib.util
+import json
+import logging
+import os
+import re
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, Optional
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+if TYPE_CHECKING:
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse
 
-app.include_router(router, prefix=settings.API_PREFIX)
+    from app.config.settings import Settings
 
 
-async def base_exception_handler(request: Request, exc: Exception) -> JSONResponse:
+@asynccontextmanager
+async def lifespan(app: "FastAPI") -> AsyncIterator[None]:
+    from fastapi.concurrency import run_in_threadpool
+
+    from app.auth.jwt import configure_password_hashing
+    from app.config.database import engine, replicas, warm_up_engine
+    from app.config.writer import write_queue
+    from app.helpers.purge import run_purger
+    from app.helpers.quotas import run_reconciler
+    from app.helpers.thumbnails import thumbnails
+    from app.helpers.uploads import run_reaper
+    from app.middleware.activity import activity
+    from app.storage import storage
+
+    settings: "Settings" = app.state.settings
+    # Calibrar el coste bcrypt para este hardware
+    await run_in_threadpool(configure_password_hashing)
+    Path(settings.UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
+    # Abrir las conexiones del pool antes de recibir tráfico
+    await run_in_threadpool(warm_up_engine, engine, settings.DB_WARMUP_CONNECTIONS)
+    await run_in_threadpool(replicas.check)
+    if settings.DB_WRITE_QUEUE:
+        write_queue.start()
+    purger = None
+    if settings.PURGE_ENABLED:
+        purger = asyncio.create_task(
+            run_purger(
+                activity,
+                batch_size=settings.PURGE_BATCH_SIZE,
+                interval=settings.PURGE_INTERVAL_SECONDS,
+                idle_seconds=settings.PURGE_IDLE_SECONDS,
+            )
+        )
+    reconciler = None
+    if settings.QUOTA_RECONCILE_INTERVAL_SECONDS:
+        reconciler = asyncio.create_task(
+            run_reconciler(settings.QUOTA_RECONCILE_INTERVAL_SECONDS)
+        )
+    reaper = asyncio.create_task(
+        run_reaper(settings.UPLOAD_SESSION_REAP_INTERVAL_SECONDS)
+    )
+    yield
+    for task in (purger, reconciler, reaper):
+        if task is not None:
+            task.cancel()
+    write_queue.stop()
+    thumbnails.shutdown()
+    await storage.aclose()
+    engine.dispose()
+    replicas.dispose()
+
+
+async def base_exception_handler(request: "Request", exc: Exception) -> "JSONResponse":
+    from fastapi import HTTPException
+    from fastapi.responses import JSONResponse
+
     if isinstance(exc, HTTPException):
         return JSONResponse(
             status_code=exc.status_code,
@@ -32,14 +89,166 @@ async def base_exception_handler(request: Request, exc: Exception) -> JSONRespon
     )
 
 
-app.add_exception_handler(AppBaseException, base_exception_handler)
+def use_prebuilt_openapi(app: "FastAPI", path: Path) -> None:
+    """Sirve el esquema OpenAPI generado con `poetry run openapi`."""
+
+    def openapi() -> Dict[str, Any]:
+        if app.openapi_schema is None:
+            app.openapi_schema = json.loads(path.read_text(encoding="utf-8"))
+        return app.openapi_schema
+
+    app.openapi = openapi  # type: ignore[method-assign]
 
 
-@app.get("/api/healthchecker")
-def root() -> dict:
-    return {"message": "Welcome to FastAPI with SQLAlchemy"}
+def create_app(settings: Optional["Settings"] = None) -> "FastAPI":
+    """
+    Construye la aplicación FastAPI a partir de la configuración.
+
+    `settings` decide lo que se monta aquí (middlewares, prefijo de rutas,
+    esquema OpenAPI) y las tareas del lifespan, que la leen de
+    `app.state.settings`. Los recursos de módulo (engine y réplicas, almacén
+    de adjuntos, cuotas, límites de peticiones, cola de escritura) se crean al
+    importarse con `app.config.settings.settings` y no cambian con ella.
+    """
+    from fastapi import FastAPI
+    from fastapi.middleware.cors import CORSMiddleware
+
+    from app.middleware.primary import PrimaryWindowMiddleware
+    from app.middleware.quota import UploadQuotaMiddleware
+    from app.routes.api import router
+    from app.utils.exception import AppBaseException
+
+    if settings is None:
+        from app.config.settings import settings
+
+    app = FastAPI(
+        title=settings.PROJECT_NAME or "FastAPI",
+        version=settings.PROJECT_VERSION or "0.1.0",
+        lifespan=lifespan,
+    )
+    app.state.settings = settings
+
+    # Por dentro de la idempotencia, que guarda la marca con la respuesta
+    app.add_middleware(PrimaryWindowMiddleware)
+    # Por dentro de la idempotencia: un reintento cuya respuesta está guardada
+    # se repite aunque la cuota ya esté llena (ese fichero ya cuenta en ella)
+    app.add_middleware(
+        UploadQuotaMiddleware,
+        path=rf"{re.escape(settings.API_PREFIX)}/notes/([^/]+)/attachments/?",
+    )
+    if settings.IDEMPOTENCY_ENABLED:
+        from app.middleware.idempotency import (
+            IdempotencyMiddleware,
+            ResponseStore,
+        )
+
+        # Por dentro de la compresión: se guarda el cuerpo sin comprimir
+        prefix = re.escape(settings.API_PREFIX)
+        app.add_middleware(
+            IdempotencyMiddleware,
+            paths=[
+                rf"{prefix}/notes/?",
+                rf"{prefix}/notes/[^/]+/attachments/?",
+                rf"{prefix}/users/?",
+            ],
+            store=ResponseStore(
+                ttl=settings.IDEMPOTENCY_TTL_SECONDS,
+                cache_size=settings.IDEMPOTENCY_CACHE_SIZE,
+            ),
+            max_response_bytes=settings.IDEMPOTENCY_MAX_RESPONSE_BYTES,
+        )
+    if settings.COMPRESSION_ENABLED:
+        from app.middleware.compression import CompressionMiddleware
+
+        app.add_middleware(
+            CompressionMiddleware,
+            minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+            encodings=settings.COMPRESSION_ENCODINGS.split(","),
+            gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+            brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+            zstd_level=settings.COMPRESSION_ZSTD_LEVEL,
+        )
+
+    if settings.PURGE_ENABLED:
+        from app.middleware.activity import ActivityMiddleware, activity
+
+        app.add_middleware(ActivityMiddleware, activity=activity)
+
+    # La última en añadirse queda por fuera de todas: también las respuestas
+    # que generan las demás (413 de cuota, repeticiones...) llevan CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    app.include_router(router, prefix=settings.API_PREFIX)
+    app.add_exception_handler(AppBaseException, base_exception_handler)
+
+    @app.get("/api/healthchecker")
+    def root() -> dict:
+        return {"message": "Welcome to FastAPI with SQLAlchemy"}
+
+    schema_file = Path(settings.OPENAPI_SCHEMA_FILE)
+    if settings.OPENAPI_SCHEMA_FILE and schema_file.is_file():
+        use_prebuilt_openapi(app, schema_file)
+
+    return app
+
+
+def __getattr__(name: str) -> Any:
+    # `app.main:app` se construye la primera vez que se pide
+    if name == "app":
+        application = create_app()
+        globals()["app"] = application
+        return application
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def start() -> None:
     """Launched with `poetry run start` at root level"""
+    import uvicorn
+
     uvicorn.run("app.main:app", host="127.0.0.1", port=8000, reload=True)
+
+
+def server_options(settings: "Settings") -> Dict[str, Any]:
+    """Opciones de uvicorn para producción a partir de la configuración."""
+    loop, http = settings.SERVER_LOOP, settings.SERVER_HTTP
+    # uvloop/httptools vienen con uvicorn[standard]; si faltan, usar asyncio/h11
+    if loop == "uvloop" and importlib.util.find_spec("uvloop") is None:
+        logging.getLogger(__name__).warning("uvloop no disponible, usando asyncio")
+        loop = "asyncio"
+    if http == "httptools" and importlib.util.find_spec("httptools") is None:
+        logging.getLogger(__name__).warning("httptools no disponible, usando h11")
+        http = "h11"
+    return {
+        "host": settings.SERVER_HOST,
+        "port": settings.SERVER_PORT,
+        "workers": settings.SERVER_WORKERS or os.cpu_count() or 1,
+        "loop": loop,
+        "http": http,
+        "backlog": settings.SERVER_BACKLOG,
+        "timeout_keep_alive": settings.SERVER_KEEPALIVE_SECONDS,
+        "limit_concurrency": settings.SERVER_LIMIT_CONCURRENCY,
+        # Reciclar workers tras N peticiones (el supervisor los relanza)
+        "limit_max_requests": settings.SERVER_MAX_REQUESTS,
+        # En SIGTERM: dejar de aceptar y esperar a las peticiones en curso
+        "timeout_graceful_shutdown": settings.SERVER_GRACEFUL_TIMEOUT_SECONDS,
+        "proxy_headers": True,
+        "forwarded_allow_ips": settings.SERVER_FORWARDED_ALLOW_IPS,
+        "access_log": settings.SERVER_ACCESS_LOG,
+    }
+
+
+def serve() -> None:
+    """Servidor de producción multi-worker, lanzado con `poetry run serve`."""
+    import uvicorn
+
+    from app.config.settings import settings
+
+    # Cada worker construye su propia app (y su engine) con la factoría; el
+    # lifespan libera el pool del worker al terminar
+    uvicorn.run("app.main:create_app", factory=True, **server_options(settings))
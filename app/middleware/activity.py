@@ -0,0 +1,44 @@
+"""
+Seguimiento de las peticiones HTTP en curso.
+
+Permite a las tareas de fondo (la purga de borrados) trabajar solo en los
+periodos sin tráfico.
+"""
+
+import time
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+class RequestActivity:
+    """Peticiones en curso y momento en que terminó la última."""
+
+    def __init__(self) -> None:
+        self.active = 0
+        self.last_finished = time.monotonic()
+
+    def is_quiet(self, idle_seconds: float) -> bool:
+        """Sin peticiones en curso ni terminadas en los últimos `idle_seconds`."""
+        return (
+            self.active == 0 and time.monotonic() - self.last_finished >= idle_seconds
+        )
+
+
+class ActivityMiddleware:
+    def __init__(self, app: ASGIApp, activity: RequestActivity) -> None:
+        self.app = app
+        self.activity = activity
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        self.activity.active += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.activity.active -= 1
+            self.activity.last_finished = time.monotonic()
+
+
+activity = RequestActivity()
@@ -0,0 +1,255 @@
+"""
+Compresión de respuestas negociada con `Accept-Encoding`.
+
+Soporta gzip siempre y brotli/zstd si están instalados los paquetes opcionales
+`brotli` y `zstandard`. Solo se comprimen tipos de contenido textuales (JSON,
+texto, CSV...), de modo que las descargas de adjuntos (imágenes, PDF, zip) se
+sirven tal cual.
+
+Las respuestas de tipo comprimible llevan `Vary: Accept-Encoding` aunque no se
+compriman, para que una caché no sirva la versión sin comprimir a quien pidió
+la comprimida ni al revés. Al comprimir, una ETag fuerte recibe el sufijo de
+la codificación (`"3"` pasa a `"3-gzip"`): los bytes ya no son los mismos. El
+sufijo se quita de `If-Match` e `If-None-Match` antes de llegar a la ruta.
+"""
+
+import re
+import zlib
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependencia opcional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - dependencia opcional
+    zstandard = None
+
+# Orden de preferencia del servidor ante pesos iguales del cliente
+DEFAULT_ENCODINGS = ("zstd", "br", "gzip")
+AVAILABLE_ENCODINGS = frozenset(
+    name
+    for name, module in (("zstd", zstandard), ("br", brotli), ("gzip", zlib))
+    if module is not None
+)
+COMPRESSIBLE_TYPES = frozenset(
+    {
+        "application/json",
+        "application/x-ndjson",
+        "application/javascript",
+        "application/xml",
+        "image/svg+xml",
+    }
+)
+
+ETAG_SUFFIX = re.compile(
+    r'-(?:{})"'.format("|".join(map(re.escape, DEFAULT_ENCODINGS)))
+)
+CONDITIONAL_HEADERS = frozenset({b"if-match", b"if-none-match"})
+
+Compressor = Tuple[Callable[[bytes], bytes], Callable[[], bytes]]
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Convierte `gzip;q=0.8, br` en `{"gzip": 0.8, "br": 1.0}`."""
+    weights: Dict[str, float] = {}
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        weights[name] = quality
+    return weights
+
+
+def negotiate_encoding(header: str, encodings: Sequence[str]) -> Optional[str]:
+    """Elige la codificación con mayor peso; los empates los decide `encodings`."""
+    weights = parse_accept_encoding(header)
+    wildcard = weights.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for name in encodings:
+        quality = weights.get(name, wildcard)
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """ETag de la versión comprimida; las débiles no cambian."""
+    if etag.startswith("W/") or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def strip_etag_suffixes(scope: Scope) -> None:
+    """Quita de las cabeceras condicionales el sufijo de `encoded_etag`."""
+    scope["headers"] = [
+        (
+            (name, ETAG_SUFFIX.sub('"', value.decode("latin-1")).encode("latin-1"))
+            if name in CONDITIONAL_HEADERS
+            else (name, value)
+        )
+        for name, value in scope["headers"]
+    ]
+
+
+def is_compressible(content_type: str) -> bool:
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    if media_type == "text/event-stream":
+        # Cada evento debe llegar en cuanto se emite
+        return False
+    return (
+        media_type.startswith("text/")
+        or media_type in COMPRESSIBLE_TYPES
+        or media_type.endswith(("+json", "+xml"))
+    )
+
+
+class CompressionMiddleware:
+    """
+    Middleware ASGI que comprime las respuestas con gzip, brotli o zstd.
+
+    Las respuestas completas por debajo de `minimum_size` bytes no se tocan.
+    Las respuestas en streaming se comprimen trozo a trozo con un compresor
+    incremental, sin acumular el cuerpo en memoria.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        encodings: Iterable[str] = DEFAULT_ENCODINGS,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        zstd_level: int = 3,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        names = (name.strip().lower() for name in encodings)
+        self.encodings: List[str] = [
+            name for name in names if name in AVAILABLE_ENCODINGS
+        ]
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.zstd_level = zstd_level
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        strip_etag_suffixes(scope)
+        header = Headers(scope=scope).get("accept-encoding", "")
+        encoding = negotiate_encoding(header, self.encodings) if header else None
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+    def compressor(self, encoding: str) -> Compressor:
+        """Devuelve las funciones `(compress, flush)` de un compresor nuevo."""
+        if encoding == "zstd":
+            zstd = zstandard.ZstdCompressor(level=self.zstd_level).compressobj()
+            return zstd.compress, zstd.flush
+        if encoding == "br":
+            br = brotli.Compressor(quality=self.brotli_quality)
+            return br.process, br.finish
+        # wbits=31: formato gzip (cabecera y CRC) en lugar de zlib
+        gz = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+        return gz.compress, gz.flush
+
+
+class _CompressionResponder:
+    def __init__(
+        self, middleware: CompressionMiddleware, encoding: Optional[str], send: Send
+    ) -> None:
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send_next = send
+        self.start_message: Optional[Message] = None
+        self.compressor: Optional[Compressor] = None
+        self.passthrough = False
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # Se retiene hasta ver el primer trozo del cuerpo
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._flush_start()
+            await self.send_next(message)
+            return
+
+        body: bytes = message.get("body", b"")
+        more_body: bool = message.get("more_body", False)
+        if self.compressor is None:
+            await self._first_chunk(message, body, more_body)
+            return
+
+        compress, flush = self.compressor
+        data = compress(body)
+        if not more_body:
+            data += flush()
+        if data or not more_body:
+            await self.send_next(
+                {"type": "http.response.body", "body": data, "more_body": more_body}
+            )
+
+    async def _first_chunk(
+        self, message: Message, body: bytes, more_body: bool
+    ) -> None:
+        assert self.start_message is not None
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        compressible = (
+            is_compressible(headers.get("content-type", ""))
+            and "content-encoding" not in headers
+            # Un rango se refiere a los bytes sin comprimir
+            and "content-range" not in headers
+            and "no-transform" not in headers.get("cache-control", "")
+        )
+        if compressible:
+            headers.add_vary_header("Accept-Encoding")
+        if (
+            not compressible
+            or self.encoding is None
+            or (not more_body and len(body) < self.middleware.minimum_size)
+        ):
+            self.passthrough = True
+            await self._flush_start()
+            await self.send_next(message)
+            return
+
+        self.compressor = compress, flush = self.middleware.compressor(self.encoding)
+        headers["Content-Encoding"] = self.encoding
+        if "etag" in headers:
+            headers["ETag"] = encoded_etag(headers["etag"], self.encoding)
+        if not more_body:
+            data = compress(body) + flush()
+            headers["Content-Length"] = str(len(data))
+            await self._flush_start()
+            await self.send_next({"type": "http.response.body", "body": data})
+            return
+
+        # Streaming: la longitud final no se conoce de antemano
+        del headers["Content-Length"]
+        await self._flush_start()
+        data = compress(body)
+        if data:
+            await self.send_next(
+                {"type": "http.response.body", "body": data, "more_body": True}
+            )
+
+    async def _flush_start(self) -> None:
+        if self.start_message is not None:
+            await self.send_next(self.start_message)
+            self.start_message = None
@@ -0,0 +1,369 @@
+"""
+Soporte de la cabecera `Idempotency-Key` en los POST que crean recursos.
+
+La primera respuesta se guarda bajo una huella del usuario, la ruta, la clave y
+el hash del cuerpo, en la tabla `idempotencyrecord` y en una caché en memoria
+con TTL. Un reintento con la misma huella recibe la respuesta guardada, con
+sus cabeceras (`ETag`, `Location`, la marca de lectura en el primario...) y
+`Idempotent-Replayed: true`, sin ejecutar la ruta; los duplicados que llegan
+mientras la primera petición sigue en curso esperan a que termine. La espera
+es por proceso: entre workers distintos la tabla evita repeticiones en cuanto
+la primera respuesta se ha guardado.
+
+Solo se guardan los éxitos y los errores de validación del cuerpo (422), que
+se repetirían igual; el resto (un 400 por una categoría que aún no existe, 401,
+409, 413...) puede cambiar al reintentar. Las respuestas solo se repiten a
+tokens que la ruta aceptaría: uno revocado o de una versión anterior no ve
+las respuestas guardadas.
+Si la respuesta es demasiado grande para guardarla, se guarda en su lugar un
+409 para que un reintento no vuelva a crear el recurso.
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import IO, Callable, Dict, List, Optional, Sequence, Tuple
+
+import anyio
+from fastapi import HTTPException
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.auth.jwt import get_token_data
+from app.config.database import SessionLocal
+from app.models.idempotency import IdempotencyRecord
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+MAX_KEY_LENGTH = 255
+# Cuerpos de petición por encima de este tamaño se vuelcan a disco
+SPOOL_MAX_MEMORY = 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+# Cabeceras de conexión, que no se repiten; la longitud se recalcula
+UNSTORED_HEADERS = frozenset(
+    {
+        "connection",
+        "content-length",
+        "keep-alive",
+        "proxy-authenticate",
+        "proxy-authorization",
+        "te",
+        "trailer",
+        "transfer-encoding",
+        "upgrade",
+    }
+)
+TOO_LARGE_TO_REPLAY = (
+    "La petición con esta Idempotency-Key ya se procesó, pero su respuesta "
+    "es demasiado grande para repetirla"
+)
+
+ResponseHeaders = List[Tuple[str, str]]
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    status_code: int
+    headers: ResponseHeaders
+    body: bytes
+    expires_at: float
+
+
+def is_storable(status_code: int) -> bool:
+    """
+    Éxitos y errores de validación del cuerpo: el mismo cuerpo daría el mismo
+    resultado. Un 400 puede depender del estado (un nombre de usuario ya
+    ocupado, una categoría que aún no existe), igual que auth, conflictos,
+    cuotas, 429 y 5xx.
+    """
+    return 200 <= status_code < 300 or status_code == 422
+
+
+def stored_headers(raw: List[Tuple[bytes, bytes]]) -> ResponseHeaders:
+    return [
+        (name.decode("latin-1").lower(), value.decode("latin-1"))
+        for name, value in raw
+        if name.decode("latin-1").lower() not in UNSTORED_HEADERS
+    ]
+
+
+class ResponseStore:
+    """Respuestas guardadas: caché LRU en memoria delante de la tabla."""
+
+    def __init__(
+        self,
+        ttl: float,
+        cache_size: int = 10_000,
+        session_factory: Callable[[], Session] = SessionLocal,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.session_factory = session_factory
+        self.clock = clock
+        self._cache: "OrderedDict[str, StoredResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cached(self, key: str) -> Optional[StoredResponse]:
+        with self._lock:
+            stored = self._cache.get(key)
+            if stored is None:
+                return None
+            if stored.expires_at <= self.clock():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return stored
+
+    def _remember(self, key: str, stored: StoredResponse) -> None:
+        with self._lock:
+            self._cache[key] = stored
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        """Busca en la caché y, si no está, en la tabla."""
+        stored = self.cached(key)
+        if stored is not None:
+            return stored
+        with self.session_factory() as db:
+            record = db.get(IdempotencyRecord, key)
+            if record is None:
+                return None
+            stored = StoredResponse(
+                status_code=record.status_code,
+                headers=[(name, value) for name, value in record.headers],
+                body=record.body,
+                expires_at=_timestamp(record.expiresAt),
+            )
+        if stored.expires_at <= self.clock():
+            return None
+        self._remember(key, stored)
+        return stored
+
+    def save(
+        self, key: str, status_code: int, headers: ResponseHeaders, body: bytes
+    ) -> StoredResponse:
+        stored = StoredResponse(status_code, headers, body, self.clock() + self.ttl)
+        self._remember(key, stored)
+        with self.session_factory() as db:
+            # Las filas expiradas ya no se repiten: se purgan en cada escritura
+            now = datetime.fromtimestamp(self.clock(), timezone.utc)
+            db.execute(
+                delete(IdempotencyRecord).where(IdempotencyRecord.expiresAt <= now)
+            )
+            db.add(
+                IdempotencyRecord(
+                    key=key,
+                    status_code=status_code,
+                    headers=[list(header) for header in headers],
+                    body=body,
+                    expiresAt=datetime.fromtimestamp(stored.expires_at, timezone.utc),
+                )
+            )
+            try:
+                db.commit()
+            except IntegrityError:
+                # Otro worker la guardó antes
+                db.rollback()
+        return stored
+
+
+def _timestamp(value: datetime) -> float:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+async def request_owner(
+    headers: Headers, session_factory: Callable[[], Session] = SessionLocal
+) -> Optional[str]:
+    """
+    Usuario del token Bearer, `"anonymous"` sin token o `None` si el token no
+    es válido (la petición sigue su curso y la ruta responde 401).
+
+    El token se valida como en las rutas (`get_token_data`): firma, lista de
+    revocados y versión del usuario.
+    """
+    authorization = headers.get("authorization")
+    if not authorization:
+        return "anonymous"
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer":
+        return None
+    with session_factory() as db:
+        try:
+            token_data = await get_token_data(token, db)
+        except HTTPException:
+            return None
+    return token_data.id
+
+
+class IdempotencyMiddleware:
+    """
+    Middleware ASGI que repite la respuesta guardada de los POST con
+    `Idempotency-Key` cuya ruta coincide con alguna de `paths` (regex).
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        paths: Sequence[str],
+        store: ResponseStore,
+        max_response_bytes: int = 1024 * 1024,
+    ) -> None:
+        self.app = app
+        self.paths = re.compile("|".join(f"(?:{path})" for path in paths))
+        self.store = store
+        self.max_response_bytes = max_response_bytes
+        self._inflight: Dict[str, asyncio.Event] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or not self.paths.fullmatch(scope["path"])
+        ):
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        key = headers.get(IDEMPOTENCY_HEADER)
+        owner = (
+            await request_owner(headers, self.store.session_factory)
+            if key is not None
+            else None
+        )
+        if key is None or owner is None:
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > MAX_KEY_LENGTH:
+            response = JSONResponse(
+                {"detail": "La cabecera Idempotency-Key no es válida"}, status_code=400
+            )
+            await response(scope, receive, send)
+            return
+
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY) as body:
+            body_hash = await _read_body(receive, body)
+            if body_hash is None:
+                return  # El cliente se desconectó
+            fingerprint = hashlib.sha256(
+                "\0".join((owner, scope["path"], key, body_hash)).encode()
+            ).hexdigest()
+
+            while True:
+                stored = self.store.cached(fingerprint)
+                if stored is None:
+                    stored = await anyio.to_thread.run_sync(self.store.get, fingerprint)
+                if stored is not None:
+                    await _replay(stored, send)
+                    return
+                pending = self._inflight.get(fingerprint)
+                if pending is None:
+                    break
+                # Duplicado simultáneo: esperar a la petición en curso
+                await pending.wait()
+
+            done = self._inflight[fingerprint] = asyncio.Event()
+            try:
+                await self._run(scope, _body_receiver(body, receive), send, fingerprint)
+            finally:
+                del self._inflight[fingerprint]
+                done.set()
+
+    async def _run(
+        self, scope: Scope, receive: Receive, send: Send, fingerprint: str
+    ) -> None:
+        status_code = 500
+        headers: ResponseHeaders = []
+        chunks: List[bytes] = []
+        size = 0
+
+        async def capture(message: Message) -> None:
+            nonlocal status_code, headers, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = stored_headers(message.get("headers", []))
+            elif message["type"] == "http.response.body" and size >= 0:
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                if size > self.max_response_bytes:
+                    size, chunks[:] = -1, []
+                else:
+                    chunks.append(chunk)
+            await send(message)
+
+        await self.app(scope, receive, capture)
+        if not is_storable(status_code):
+            return
+        body = b"".join(chunks)
+        if size < 0:
+            # Demasiado grande para repetirla: un reintento recibe un 409 en
+            # lugar de ejecutar la ruta otra vez
+            status_code = 409
+            headers = [("content-type", "application/json")]
+            body = json.dumps({"detail": TOO_LARGE_TO_REPLAY}).encode()
+        await anyio.to_thread.run_sync(
+            self.store.save, fingerprint, status_code, headers, body
+        )
+
+
+async def _read_body(receive: Receive, spool: IO[bytes]) -> Optional[str]:
+    """Vuelca el cuerpo de la petición en `spool` y devuelve su SHA-256."""
+    digest = hashlib.sha256()
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunk = message.get("body", b"")
+        digest.update(chunk)
+        spool.write(chunk)
+        more_body = message.get("more_body", False)
+    spool.seek(0)
+    return digest.hexdigest()
+
+
+def _body_receiver(spool: IO[bytes], receive: Receive) -> Receive:
+    """Entrega de nuevo a la aplicación el cuerpo ya leído."""
+    finished = False
+
+    async def replay_receive() -> Message:
+        nonlocal finished
+        if finished:
+            return await receive()
+        chunk = spool.read(CHUNK_SIZE)
+        finished = len(chunk) < CHUNK_SIZE
+        return {"type": "http.request", "body": chunk, "more_body": not finished}
+
+    return replay_receive
+
+
+async def _replay(stored: StoredResponse, send: Send) -> None:
+    headers = [
+        (name.encode("latin-1"), value.encode("latin-1"))
+        for name, value in stored.headers
+    ]
+    headers += [
+        (b"content-length", str(len(stored.body)).encode()),
+        (b"idempotent-replayed", b"true"),
+    ]
+    await send(
+        {
+            "type": "http.response.start",
+            "status": stored.status_code,
+            "headers": headers,
+        }
+    )
+    await send({"type": "http.response.body", "body": stored.body})
@@ -0,0 +1,33 @@
+"""
+Marca de read-your-writes en las respuestas.
+
+`get_db` anota en el estado de la petición hasta cuándo debe leer el cliente
+del primario. El middleware la añade a la respuesta como cookie y cabecera,
+también si la ruta devuelve su propia `Response` o si termina en error.
+"""
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config.database import primary_window_headers
+
+
+class PrimaryWindowMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_marker(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                until = scope.get("state", {}).get("primary_until")
+                if until is not None:
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        *primary_window_headers(until),
+                    ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_marker)
@@ -0,0 +1,109 @@
+"""
+Rechazo temprano de las subidas que no caben en la cuota.
+
+Antes de que la ruta lea el cuerpo multipart, el middleware consulta el uso del
+usuario del token y de la nota de la URL (una lectura por clave primaria) y
+responde 413 si ya no cabe otro fichero o si `Content-Length` supera los bytes
+que quedan. Sin `Content-Length` corta la subida en cuanto el cuerpo recibido
+los supera. La ruta vuelve a comprobar el tamaño real al guardar el adjunto.
+
+Va por dentro de `IdempotencyMiddleware`, que repite la respuesta guardada de
+un reintento antes de mirar la cuota; con `Idempotency-Key` el cuerpo ya se ha
+leído para calcular su huella, así que el rechazo temprano solo ahorra
+procesarlo en la ruta.
+"""
+
+import re
+from typing import Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.requests import ClientDisconnect
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config.database import SessionLocal
+from app.helpers.quotas import QUOTA_EXCEEDED, upload_allowance
+from app.middleware.idempotency import request_owner
+
+# Cabeceras multipart y campos de formulario que acompañan al fichero
+MULTIPART_SLACK = 64 * 1024
+
+
+def _allowance(user_id: str, note_id: str) -> Tuple[bool, Optional[int]]:
+    with SessionLocal() as db:
+        return upload_allowance(db, user_id, note_id)
+
+
+class UploadQuotaMiddleware:
+    """
+    Middleware ASGI que aplica la cuota a los POST cuya ruta coincide con
+    `path` (regex cuyo primer grupo es el id de la nota).
+    """
+
+    def __init__(self, app: ASGIApp, path: str) -> None:
+        self.app = app
+        self.path = re.compile(path)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        match = None
+        if scope["type"] == "http" and scope["method"] == "POST":
+            match = self.path.fullmatch(scope["path"])
+        if match is None:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        owner = await request_owner(headers)
+        if owner is None or owner == "anonymous":
+            # Sin usuario válido la ruta responde 401
+            await self.app(scope, receive, send)
+            return
+
+        room, remaining = await anyio.to_thread.run_sync(
+            _allowance, owner, match.group(1)
+        )
+        if remaining is not None:
+            remaining += MULTIPART_SLACK
+        length = headers.get("content-length")
+        if not room or (
+            remaining is not None
+            and length
+            and length.isdigit()
+            and int(length) > remaining
+        ):
+            await _reject(scope, receive, send)
+            return
+        if remaining is None:
+            await self.app(scope, receive, send)
+            return
+
+        received = 0
+        rejected = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, rejected
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > remaining:
+                    # La ruta ve una desconexión y no guarda nada
+                    rejected = True
+                    await _reject(scope, receive, send)
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message: Message) -> None:
+            if not rejected:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except ClientDisconnect:
+            # La desconexión simulada tras responder 413 no es un error
+            if not rejected:
+                raise
+
+
+async def _reject(scope: Scope, receive: Receive, send: Send) -> None:
+    response = JSONResponse({"detail": QUOTA_EXCEEDED}, status_code=413)
+    await response(scope, receive, send)
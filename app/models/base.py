@@ -1,10 +1,19 @@
-from typing import Any, Type
+from datetime import datetime, timezone
+from typing import Any, Dict, Type
 from uuid import uuid4
 
-from sqlalchemy import TIMESTAMP, Column, String
+from sqlalchemy import TIMESTAMP, Column, Integer, String
 from sqlalchemy.orm import declarative_base, declared_attr
 from sqlalchemy.sql import func
 
+from app.config.settings import settings
+
+# Estrategia por defecto de las relaciones; en modo estricto cualquier carga
+# implícita lanza una excepción y cada consulta debe declarar sus loaders
+RELATIONSHIP_LAZY = (
+    "raise_on_sql" if settings.ORM_STRICT_LOADING == "raise" else "select"
+)
+
 
 class BaseClass:
     __abstract__ = True
@@ -30,3 +39,17 @@ class BaseModel(Base):  # type: ignore
     )
     createdAt = Column(TIMESTAMP(timezone=True), default=func.now())
     updatedAt = Column(TIMESTAMP(timezone=True), onupdate=func.now())
+    # Concurrencia optimista: cada UPDATE del ORM incrementa la versión y falla
+    # con StaleDataError si otra transacción la cambió antes
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    # Borrado lógico: las consultas ORM no ven las filas con `deletedAt` y el
+    # purgador las elimina en lotes (ver `app.helpers.purge`)
+    deletedAt = Column(TIMESTAMP(timezone=True), nullable=True, index=True)
+
+    @declared_attr  # type: ignore
+    def __mapper_args__(cls) -> Dict[str, Any]:
+        return {"version_id_col": cls.version}
+
+    def soft_delete(self) -> None:
+        self.deletedAt = datetime.now(timezone.utc)
@@ -1,7 +1,7 @@
 from sqlalchemy import Column, String
 from sqlalchemy.orm import relationship
 
-from app.models.base import BaseModel
+from app.models.base import RELATIONSHIP_LAZY, BaseModel
 
 
 class Category(BaseModel):
@@ -11,4 +11,4 @@ class Category(BaseModel):
     description = Column(String(200), nullable=True)
 
     # Relación uno a muchos con notas
-    notes = relationship("Notes", back_populates="category")
+    notes = relationship("Notes", back_populates="category", lazy=RELATIONSHIP_LAZY)
@@ -0,0 +1,16 @@
+from sqlalchemy import JSON, TIMESTAMP, Column, Integer, LargeBinary, String
+
+from app.models.base import Base
+
+
+class IdempotencyRecord(Base):  # type: ignore
+    """Respuesta guardada de una petición con `Idempotency-Key`."""
+
+    # SHA-256 de usuario, método, ruta, clave y hash del cuerpo
+    key = Column(String(64), primary_key=True)
+    status_code = Column(Integer, nullable=False)
+    # Cabeceras de la respuesta como lista de pares, sin las de conexión
+    headers = Column(JSON, nullable=False)
+    body = Column(LargeBinary, nullable=False)
+    # Pasada esta fecha la respuesta ya no se repite y la fila puede purgarse
+    expiresAt = Column(TIMESTAMP(timezone=True), nullable=False, index=True)
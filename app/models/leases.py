@@ -0,0 +1,13 @@
+from sqlalchemy import TIMESTAMP, Column, String
+
+from app.models.base import Base
+
+
+class Lease(Base):  # type: ignore
+    """Turno de una tarea de fondo que solo debe ejecutar un worker."""
+
+    name = Column(String(50), primary_key=True)
+    # Worker que la tiene: host, pid y un sufijo aleatorio
+    holder = Column(String(100), nullable=False)
+    # Si no la renueva antes, cualquier otro worker puede quedársela
+    expiresAt = Column(TIMESTAMP(timezone=True), nullable=False)
@@ -1,7 +1,19 @@
+from typing import Optional
+
 from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import backref, relationship, validates
+
+from app.models.base import RELATIONSHIP_LAZY, BaseModel
+
+# Caracteres iniciales de `content` que se guardan en `preview`
+PREVIEW_LENGTH = 200
+
 
-from app.models.base import BaseModel
+def make_preview(content: Optional[str]) -> Optional[str]:
+    """Resumen de una nota para los listados."""
+    if content is None:
+        return None
+    return content[:PREVIEW_LENGTH]
 
 
 class Notes(BaseModel):
@@ -9,12 +21,24 @@ class Notes(BaseModel):
 
     title = Column(String(200), nullable=False)
     content = Column(Text, nullable=False)
+    # Se calcula al escribir para que los listados no lean `content`
+    preview = Column(String(PREVIEW_LENGTH), nullable=True)
     published = Column(Boolean, nullable=False, default=True)
 
     category_id = Column(String(36), ForeignKey("category.id"), nullable=True)
-    category = relationship("Category", back_populates="notes")
+    category = relationship("Category", back_populates="notes", lazy=RELATIONSHIP_LAZY)
 
-    users = relationship("User", secondary="usernotes", back_populates="notes")
+    users = relationship(
+        "User",
+        secondary="usernotes",
+        back_populates="notes",
+        lazy=RELATIONSHIP_LAZY,
+    )
+
+    @validates("content")
+    def _update_preview(self, key: str, content: str) -> str:
+        self.preview = make_preview(content)
+        return content
 
 
 class Attachment(BaseModel):
@@ -25,9 +49,20 @@ class Attachment(BaseModel):
     file_size = Column(Integer, nullable=False)
     mime_type = Column(String(100), nullable=False)
     description = Column(String(255), nullable=True)
+    # Usuario que lo subió: se le descuenta de su cuota
+    user_id = Column(
+        String(36),
+        ForeignKey("user.id", ondelete="SET NULL"),
+        nullable=True,
+        index=True,
+    )
 
     # Relación con la nota a la que pertenece
     note_id = Column(
         String(36), ForeignKey("notes.id", ondelete="CASCADE"), nullable=False
     )
-    note = relationship("Notes", backref="attachments")
+    note = relationship(
+        "Notes",
+        backref=backref("attachments", lazy=RELATIONSHIP_LAZY),
+        lazy=RELATIONSHIP_LAZY,
+    )
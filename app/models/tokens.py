@@ -0,0 +1,28 @@
+from uuid import uuid4
+
+from sqlalchemy import TIMESTAMP, Column, ForeignKey, Integer, String
+
+from app.models.base import BaseModel
+
+
+class RevokedToken(BaseModel):
+    """Modelo de tokens JWT revocados antes de su expiración."""
+
+    # AUTOINCREMENT: `seq` crece con cada revocación y no se reutiliza aunque
+    # se purguen las filas más recientes; la denylist se sincroniza por él
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    id = Column(
+        String(36),
+        nullable=False,
+        default=lambda: str(uuid4()),
+        unique=True,
+        index=True,
+    )
+    jti = Column(String(36), nullable=False, unique=True, index=True)
+    user_id = Column(
+        String(36), ForeignKey("user.id", ondelete="CASCADE"), nullable=True
+    )
+    # Pasada esta fecha el token ya no es válido y la fila puede purgarse
+    expiresAt = Column(TIMESTAMP(timezone=True), nullable=False, index=True)
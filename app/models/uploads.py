@@ -0,0 +1,29 @@
+from uuid import uuid4
+
+from sqlalchemy import TIMESTAMP, BigInteger, Column, ForeignKey, String
+from sqlalchemy.sql import func
+
+from app.models.base import Base
+
+
+class UploadSession(Base):  # type: ignore
+    """Subida reanudable en curso; el contenido se va añadiendo en disco."""
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid4()))
+    user_id = Column(
+        String(36), ForeignKey("user.id", ondelete="CASCADE"), nullable=False
+    )
+    note_id = Column(
+        String(36), ForeignKey("notes.id", ondelete="CASCADE"), nullable=False
+    )
+    filename = Column(String(255), nullable=False)
+    mime_type = Column(String(100), nullable=False)
+    description = Column(String(255), nullable=True)
+    # Tamaño anunciado y bytes ya recibidos (el offset del siguiente fragmento)
+    size = Column(BigInteger, nullable=False)
+    received = Column(BigInteger, nullable=False, default=0, server_default="0")
+    # SHA-256 (hex) opcional del fichero completo, comprobado al finalizar
+    sha256 = Column(String(64), nullable=True)
+    createdAt = Column(TIMESTAMP(timezone=True), default=func.now())
+    # Se renueva con cada fragmento; pasada la fecha la sesión se descarta
+    expiresAt = Column(TIMESTAMP(timezone=True), nullable=False, index=True)
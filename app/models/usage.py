@@ -0,0 +1,18 @@
+from sqlalchemy import BigInteger, Column, Integer, String
+
+from app.models.base import Base
+
+
+class StorageUsage(Base):  # type: ignore
+    """
+    Espacio ocupado por los adjuntos de un usuario o de una nota.
+
+    Se actualiza en la misma transacción que crea o borra el adjunto, así que
+    comprobar una cuota es una lectura por clave primaria en lugar de un
+    `SUM(file_size)`; `reconcile_usage` lo recalcula desde `attachment`.
+    """
+
+    # Id del usuario (que subió los adjuntos) o de la nota
+    owner_id = Column(String(36), primary_key=True)
+    bytes = Column(BigInteger, nullable=False, default=0, server_default="0")
+    files = Column(Integer, nullable=False, default=0, server_default="0")
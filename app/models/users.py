@@ -1,7 +1,7 @@
-from sqlalchemy import Boolean, Column, ForeignKey, String
+from sqlalchemy import Boolean, Column, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import relationship
 
-from app.models.base import BaseModel
+from app.models.base import RELATIONSHIP_LAZY, BaseModel
 
 
 class User(BaseModel):
@@ -13,14 +13,25 @@ class User(BaseModel):
     full_name = Column(String(100), nullable=True)
     is_active = Column(Boolean, default=True, nullable=False)
     is_admin = Column(Boolean, default=False, nullable=False)
-
-    notes = relationship("Notes", secondary="usernotes", back_populates="users")
+    # Se incrementa para invalidar los tokens emitidos (ver app.auth.jwt)
+    token_version = Column(Integer, default=0, server_default="0", nullable=False)
+
+    notes = relationship(
+        "Notes",
+        secondary="usernotes",
+        back_populates="users",
+        lazy=RELATIONSHIP_LAZY,
+    )
 
 
 class UserNotes(BaseModel):
     """Modelo de relación entre usuarios y notas."""
 
     __tablename__ = "usernotes"
+    __table_args__ = (
+        # Un par usuario-nota por fila: permite INSERT ... ON CONFLICT DO NOTHING
+        Index("ix_usernotes_user_id_note_id", "user_id", "note_id", unique=True),
+    )
 
     user_id = Column(
         String(36),
@@ -31,4 +42,5 @@ class UserNotes(BaseModel):
         String(36),
         ForeignKey("notes.id", ondelete="CASCADE"),
         primary_key=True,
+        index=True,
     )
@@ -1,34 +1,81 @@
 from datetime import timedelta
 from typing import Any, Dict
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    HTTPException,
+    Request,
+    status,
+)
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
-from app.auth.jwt import Token, authenticate_user, create_access_token
+from app.auth.jwt import (
+    Token,
+    TokenData,
+    authenticate_user,
+    create_access_token,
+    get_token_data,
+)
+from app.auth.ratelimit import hash_admission, login_rate_limiter
+from app.auth.revocation import revoke_token
 from app.config.database import get_db
 from app.helpers.constance import ACCESS_TOKEN_EXPIRE_MINUTES
+from app.schemas.base import ResponseSchemaBase
 
 router = APIRouter()
 
 
 @router.post("/token", response_model=Token)
 async def login_for_access_token(
+    request: Request,
+    background_tasks: BackgroundTasks,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db),
 ) -> Dict[str, Any]:
     """Endpoint para obtener un token JWT mediante login."""
-    user = authenticate_user(db, form_data.username, form_data.password)
+    client_ip = request.client.host if request.client else "unknown"
+    # Rechazar antes de gastar CPU en bcrypt
+    login_rate_limiter.check(form_data.username, client_ip)
+
+    def verify() -> Any:
+        with hash_admission.admit():
+            return authenticate_user(
+                db, form_data.username, form_data.password, background_tasks
+            )
+
+    # bcrypt bloquea: ejecutarlo fuera del event loop
+    user = await run_in_threadpool(verify)
     if not user:
+        login_rate_limiter.register_failure(form_data.username, client_ip)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Usuario o contraseña incorrectos",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    login_rate_limiter.register_success(form_data.username, client_ip)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username}, expires_delta=access_token_expires, user=user
     )
 
     return {"access_token": access_token, "token_type": "bearer"}
+
+
+@router.post("/logout", response_model=ResponseSchemaBase)
+async def logout(
+    token_data: TokenData = Depends(get_token_data),
+    db: Session = Depends(get_db),
+) -> Dict[str, str]:
+    """Revoca el token actual antes de su expiración."""
+    if token_data.jti is None or token_data.exp is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El token no admite revocación",
+        )
+    revoke_token(db, token_data.jti, token_data.exp, token_data.id)
+    return {"message": "Sesión cerrada correctamente"}
@@ -1,14 +1,15 @@
 from typing import Any, Dict
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import exists, select
 from sqlalchemy.orm import Session
 
 from app import controllers
-from app.auth.jwt import get_current_active_user, get_current_admin_user
+from app.auth.jwt import TokenData, get_active_token_data, get_admin_token_data
 from app.config.database import get_db
 from app.helpers.response import ResponseHelper
 from app.models.categories import Category
-from app.models.users import User
+from app.models.notes import Notes
 from app.schemas.base import ResponseSchemaBase
 from app.schemas.categories import (
     CategoryCreate,
@@ -25,7 +26,7 @@ async def get_categories(
     page: int = 0,
     page_size: int = 10,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: TokenData = Depends(get_active_token_data),
 ) -> Dict[str, Any]:
     """Obtiene todas las categorías."""
     categories = controllers.categories.read(
@@ -44,8 +45,8 @@ async def get_categories(
 async def create_category(
     category_create: CategoryCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(
-        get_current_admin_user
+    current_user: TokenData = Depends(
+        get_admin_token_data
     ),  # Solo admin puede crear categorías
 ) -> Dict[str, Any]:
     """Crea una nueva categoría (solo admin)."""
@@ -65,7 +66,7 @@ async def create_category(
 async def get_category(
     category_id: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: TokenData = Depends(get_active_token_data),
 ) -> Dict[str, Any]:
     """Obtiene una categoría por ID."""
     category = controllers.categories.get(id=category_id, db=db, error_out=True)
@@ -77,8 +78,8 @@ async def update_category(
     category_id: str,
     category_update: CategoryUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(
-        get_current_admin_user
+    current_user: TokenData = Depends(
+        get_admin_token_data
     ),  # Solo admin puede actualizar categorías
 ) -> Dict[str, Any]:
     """Actualiza una categoría por ID (solo admin)."""
@@ -106,15 +107,16 @@ async def update_category(
 async def delete_category(
     category_id: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(
-        get_current_admin_user
+    current_user: TokenData = Depends(
+        get_admin_token_data
     ),  # Solo admin puede eliminar categorías
 ) -> Dict[str, str]:
     """Elimina una categoría por ID (solo admin)."""
     # Primero, verificar si hay notas asociadas a esta categoría
     category = controllers.categories.get(id=category_id, db=db, error_out=True)
 
-    if len(category.notes) > 0:
+    has_notes = db.scalar(select(exists().where(Notes.category_id == category.id)))
+    if has_notes:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="No se puede eliminar una categoría con notas asociadas",
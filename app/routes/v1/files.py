@@ -0,0 +1,100 @@
+import re
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import APIRouter, Header, HTTPException, Query, status
+from fastapi.responses import Response, StreamingResponse
+
+from app.helpers.signed_urls import verify
+from app.storage import InvalidKey, ObjectNotFound, storage
+
+router = APIRouter()
+
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+def parse_range(value: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    `(inicio, fin)` (fin excluido) de una cabecera `Range` con un solo rango.
+    `None` si no hay rango que aplicar; `ValueError` si no se puede satisfacer.
+    """
+    match = RANGE_PATTERN.fullmatch(value.strip()) if value else None
+    if match is None:
+        # Sin cabecera, con varios rangos o con otra unidad: el objeto entero
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(size - int(last), 0), size
+    else:
+        start = int(first)
+        end = size if not last else min(int(last) + 1, size)
+    if start >= size or start >= end:
+        raise ValueError(value)
+    return start, end
+
+
+def content_disposition(filename: str) -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+@router.get("/{attachment_id}/{key:path}", response_class=StreamingResponse)
+async def download_attachment(
+    attachment_id: str,
+    key: str,
+    expires: int = Query(...),
+    filename: str = Query(...),
+    type: str = Query(...),
+    signature: str = Query(...),
+    range: Optional[str] = Header(None),
+) -> Response:
+    """
+    Descarga un adjunto con una URL firmada por
+    `GET /notes/attachments/{attachment_id}/url`. Solo se verifica la firma:
+    sin token ni consultas a la base de datos.
+    """
+    now = time.time()
+    if not verify(attachment_id, key, expires, filename, type, signature, now):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="URL firmada no válida o caducada",
+        )
+    try:
+        size = (await storage.stat(key)).size
+    except (InvalidKey, ObjectNotFound):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Archivo no encontrado"
+        )
+
+    headers: Dict[str, str] = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": content_disposition(filename),
+        # Cacheable solo mientras la URL sea válida
+        "Cache-Control": f"private, max-age={int(expires - now)}",
+    }
+    try:
+        requested = parse_range(range, size)
+    except ValueError:
+        return Response(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={**headers, "Content-Range": f"bytes */{size}"},
+        )
+    start, end = requested or (0, size)
+    headers["Content-Length"] = str(end - start)
+    if requested is not None:
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+    return StreamingResponse(
+        storage.get(key, start, end),
+        status_code=(
+            status.HTTP_206_PARTIAL_CONTENT
+            if requested is not None
+            else status.HTTP_200_OK
+        ),
+        media_type=type,
+        headers=headers,
+    )
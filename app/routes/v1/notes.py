@@ -1,53 +1,186 @@
 import os
-import shutil
+import re
+import time
 import uuid
-from pathlib import Path
-from typing import Any, Dict
+from datetime import datetime, timezone
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterator,
+    List,
+    Optional,
+    Union,
+)
 
+import anyio
 from fastapi import (
     APIRouter,
+    BackgroundTasks,
     Depends,
     File,
     Form,
+    Header,
     HTTPException,
+    Query,
+    Request,
+    Response,
     UploadFile,
     status,
 )
-from sqlalchemy.orm import Session
-
-from app import controllers
-from app.auth.jwt import get_current_active_user
-from app.config.database import get_db
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session, joinedload, load_only, selectinload
+from sqlalchemy.orm.exc import StaleDataError
+
+from app.auth.access import (
+    NoteAccess,
+    require_attachment_access,
+    require_note_access,
+    require_upload_access,
+)
+from app.auth.jwt import TokenData, get_active_token_data
+from app.config.database import get_db, session_for
+from app.config.settings import settings
+from app.config.writer import run_write
+from app.helpers.enum import ExportFormat
+from app.helpers.notes_io import (
+    EXPORT_MEDIA_TYPES,
+    export_notes,
+    import_notes,
+    iter_text_lines,
+    parse_records,
+)
+from app.helpers.quotas import charge, release
 from app.helpers.response import ResponseHelper
+from app.helpers.sharing import (
+    resolve_users,
+    share_with,
+    shared_with_any,
+    unshare_with,
+)
+from app.helpers.signed_urls import sign
+from app.helpers.thumbnails import (
+    THUMBNAIL_MEDIA_TYPE,
+    THUMBNAIL_SIZES,
+    ImageTooLarge,
+    supports_thumbnails,
+    thumbnail_key,
+    thumbnail_keys,
+    thumbnails,
+)
+from app.helpers.uploads import (
+    create_part,
+    discard_part,
+    discard_session,
+    locked_part,
+    parse_checksum,
+    part_sha256,
+    session_expiry,
+    store_part,
+    write_chunk,
+)
+from app.helpers.versioning import (
+    VERSION_CONFLICT,
+    check_version,
+    if_match_versions,
+    version_etag,
+)
+from app.helpers.zipstream import (
+    ZipEntry,
+    entry_names,
+    is_precompressed,
+    stream_zip,
+)
 from app.models.categories import Category
 from app.models.notes import Attachment, Notes
-from app.models.users import User
+from app.models.uploads import UploadSession
+from app.models.users import UserNotes
 from app.schemas.attachments import (
     AttachmentDetailResponse,
     AttachmentListResponse,
+    AttachmentUrlResponse,
 )
 from app.schemas.base import ResponseSchemaBase
 from app.schemas.notes import (
     NoteCreate,
     NoteDetailResponse,
+    NoteImportResponse,
     NoteListResponse,
+    NoteResponse,
+    NoteShareRequest,
+    NoteShareResponse,
+    NoteUnshareResponse,
     NoteUpdate,
+    sparse_note_list_model,
+)
+from app.schemas.uploads import (
+    UploadSessionCreate,
+    UploadSessionDetailResponse,
 )
+from app.storage import ObjectNotFound, storage
+from app.storage.base import CHUNK_SIZE
 
 router = APIRouter()
 
+# Relaciones que serializa `NoteResponse`
+NOTE_DETAIL_OPTIONS = (joinedload(Notes.category), selectinload(Notes.users))
+
+# Acceso a una nota con la carga que necesita cada endpoint
+note_detail_access = NoteAccess(*NOTE_DETAIL_OPTIONS)
+note_ref_access = NoteAccess(load_only(Notes.id))
+
+# Campos de `NoteResponse` que son relaciones y no columnas de `Notes`
+NOTE_RELATIONS = ("category", "users")
+
+
+def parse_note_fields(fields: Optional[str]) -> Optional[FrozenSet[str]]:
+    """Convierte `fields=id,title` en el conjunto de campos pedidos."""
+    if not fields:
+        return None
+    selected = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = selected - set(NoteResponse.model_fields)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Campos no válidos: {', '.join(sorted(unknown))}",
+        )
+    return frozenset(selected | {"id"})
+
+
+def note_load_options(selected: Optional[FrozenSet[str]]) -> List[Any]:
+    """Opciones de carga para que solo se lean de la BD los campos pedidos."""
+    if selected is None:
+        return list(NOTE_DETAIL_OPTIONS)
+    columns = [getattr(Notes, name) for name in selected if name not in NOTE_RELATIONS]
+    options: List[Any] = [load_only(*columns)]
+    if "category" in selected:
+        options.append(joinedload(Notes.category))
+    if "users" in selected:
+        options.append(selectinload(Notes.users))
+    return options
+
 
 @router.get("", response_model=NoteListResponse)
 async def get_notes(
     page: int = 0,
     page_size: int = 10,
+    fields: Optional[str] = Query(
+        None,
+        description="Campos a devolver separados por comas, p. ej. `id,title,preview`",
+    ),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
-) -> Dict[str, Any]:
+    current_user: TokenData = Depends(get_active_token_data),
+) -> Union[Dict[str, Any], Response]:
     """Obtiene las notas del usuario actual."""
+    selected = parse_note_fields(fields)
     # Obtener las notas asociadas al usuario actual
     notes = (
         db.query(Notes)
+        .options(*note_load_options(selected))
         .filter(Notes.users.any(id=current_user.id))
         .offset(page * page_size)
         .limit(page_size)
@@ -56,18 +189,23 @@ async def get_notes(
 
     # Contar el total de notas del usuario
     total_items = db.query(Notes).filter(Notes.users.any(id=current_user.id)).count()
+    metadata = ResponseHelper.pagination_meta(page, page_size, total_items)
 
-    return {
-        "data": notes,
-        "metadata": ResponseHelper.pagination_meta(page, page_size, total_items),
-    }
+    if selected is not None:
+        # Las columnas no pedidas no se han cargado: serializar solo las pedidas
+        model = sparse_note_list_model(selected)
+        payload = model.model_validate({"data": notes, "metadata": metadata})
+        return Response(payload.model_dump_json(), media_type="application/json")
+
+    return {"data": notes, "metadata": metadata}
 
 
 @router.post("", response_model=NoteDetailResponse, status_code=status.HTTP_201_CREATED)
 async def create_note(
     note_create: NoteCreate,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: TokenData = Depends(get_active_token_data),
 ) -> Dict[str, Any]:
     """Crea una nueva nota para el usuario actual."""
     # Verificar si la categoría existe (si se proporcionó)
@@ -81,70 +219,109 @@ async def create_note(
                 detail="La categoría especificada no existe",
             )
 
-    # Crear la nota
-    note = Notes(
-        title=note_create.title,
-        content=note_create.content,
-        category_id=note_create.category_id,
-        published=note_create.published,
-    )
+    def insert_note(session: Session) -> str:
+        note = Notes(
+            title=note_create.title,
+            content=note_create.content,
+            category_id=note_create.category_id,
+            published=note_create.published,
+        )
+        session.add(note)
+        session.flush()  # Para obtener el ID asignado
+        # Asociar al usuario actual sin cargar su fila
+        session.add(UserNotes(user_id=current_user.id, note_id=note.id))
+        return note.id
+
+    note_id = await run_write(db, insert_note)
+    note = db.execute(
+        select(Notes).options(*NOTE_DETAIL_OPTIONS).where(Notes.id == note_id)
+    ).scalar_one()
+    response.headers["ETag"] = version_etag(note.version)
 
-    # Guardar en base de datos
-    db.add(note)
-    db.flush()  # Para obtener el ID asignado
+    return {"data": note}
 
-    # Asociar al usuario actual
-    note.users.append(current_user)
-    db.commit()
-    db.refresh(note)
 
-    return {"data": note}
+@router.get("/export", response_class=StreamingResponse)
+async def export_user_notes(
+    request: Request,
+    format: ExportFormat = ExportFormat.NDJSON,
+    attachments: bool = False,
+    current_user: TokenData = Depends(get_active_token_data),
+) -> StreamingResponse:
+    """Exporta todas las notas del usuario actual en NDJSON o CSV."""
+    return StreamingResponse(
+        export_notes(
+            current_user.id,
+            format,
+            settings.EXPORT_BATCH_SIZE,
+            attachments,
+            session_factory=lambda: session_for(request),
+        ),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="notes.{format.value}"'},
+    )
 
 
-@router.get("/{note_id}", response_model=NoteDetailResponse)
-async def get_note(
-    note_id: str,
+@router.post("/import", response_model=NoteImportResponse)
+async def import_user_notes(
+    request: Request,
+    format: ExportFormat = ExportFormat.NDJSON,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: TokenData = Depends(get_active_token_data),
 ) -> Dict[str, Any]:
-    """Obtiene una nota por ID."""
-    # Obtener la nota asegurándose de que pertenezca al usuario actual
-    note = (
-        db.query(Notes)
-        .filter(Notes.id == note_id, Notes.users.any(id=current_user.id))
-        .first()
+    """
+    Importa notas en NDJSON o CSV (el formato de `GET /notes/export`).
+
+    El cuerpo se lee en streaming: las líneas se validan e insertan por lotes
+    sin cargar el fichero completo en memoria.
+    """
+    stream = request.stream()
+
+    def body_chunks() -> Iterator[bytes]:
+        # Se ejecuta en el hilo de la importación: pide cada trozo al event loop
+        while True:
+            try:
+                yield anyio.from_thread.run(stream.__anext__)
+            except StopAsyncIteration:
+                return
+
+    report = await run_in_threadpool(
+        import_notes,
+        db,
+        current_user.id,
+        parse_records(
+            iter_text_lines(body_chunks(), settings.IMPORT_MAX_LINE_LENGTH), format
+        ),
+        settings.IMPORT_BATCH_SIZE,
+        settings.IMPORT_MAX_ERRORS,
     )
+    return {"data": report}
 
-    if not note:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Nota no encontrada o no tienes permiso para acceder a ella",
-        )
 
+@router.get("/{note_id}", response_model=NoteDetailResponse)
+async def get_note(
+    response: Response,
+    note: Notes = Depends(note_detail_access),
+) -> Dict[str, Any]:
+    """Obtiene una nota por ID."""
+    response.headers["ETag"] = version_etag(note.version)
     return {"data": note}
 
 
 @router.put("/{note_id}", response_model=NoteDetailResponse)
 async def update_note(
-    note_id: str,
     note_update: NoteUpdate,
+    response: Response,
+    versions: Optional[FrozenSet[int]] = Depends(if_match_versions),
+    note: Notes = Depends(note_detail_access),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
 ) -> Dict[str, Any]:
-    """Actualiza una nota por ID."""
-    # Obtener la nota asegurándose de que pertenezca al usuario actual
-    note = (
-        db.query(Notes)
-        .filter(Notes.id == note_id, Notes.users.any(id=current_user.id))
-        .first()
-    )
-
-    if not note:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Nota no encontrada o no tienes permiso para actualizarla",
-        )
+    """
+    Actualiza una nota por ID.
 
+    Requiere `If-Match` con la ETag de la nota: si otra petición la modificó
+    después, responde 412 en lugar de sobrescribir sus cambios.
+    """
     # Verificar si la categoría existe (si se proporciona)
     if note_update.category_id:
         category = (
@@ -157,292 +334,568 @@ async def update_note(
             )
 
     # Actualizar la nota
-    updated_note = controllers.notes.update(db=db, model=note, schema=note_update)
+    changes = note_update.model_dump(exclude_unset=True)
+
+    def apply_update(session: Session) -> None:
+        target = session.get(Notes, note.id)
+        check_version(target, versions)
+        for field, value in changes.items():
+            setattr(target, field, value)
+
+    try:
+        await run_write(db, apply_update)
+    except StaleDataError:
+        # Otra petición la actualizó entre la lectura y el UPDATE
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED, detail=VERSION_CONFLICT
+        )
+    updated_note = db.execute(
+        select(Notes)
+        .options(*NOTE_DETAIL_OPTIONS)
+        .where(Notes.id == note.id)
+        .execution_options(populate_existing=True)
+    ).scalar_one()
+    response.headers["ETag"] = version_etag(updated_note.version)
     return {"data": updated_note}
 
 
 @router.delete("/{note_id}", response_model=ResponseSchemaBase)
 async def delete_note(
-    note_id: str,
+    note: Notes = Depends(require_note_access),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
 ) -> Dict[str, str]:
-    """Elimina una nota por ID."""
-    # Obtener la nota asegurándose de que pertenezca al usuario actual
-    note = (
-        db.query(Notes)
-        .filter(Notes.id == note_id, Notes.users.any(id=current_user.id))
-        .first()
-    )
+    """
+    Elimina una nota por ID.
+
+    Solo marca la nota como borrada; el purgador elimina después sus archivos
+    adjuntos, las filas de `usernotes` y la propia nota.
+    """
+
+    def mark_deleted(session: Session) -> None:
+        target = session.get(Notes, note.id)
+        if target is not None:
+            target.soft_delete()
 
-    if not note:
+    try:
+        await run_write(db, mark_deleted)
+    except StaleDataError:
+        # Otra petición la modificó entre la lectura y el UPDATE
+        db.rollback()
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Nota no encontrada o no tienes permiso para eliminarla",
+            status_code=status.HTTP_412_PRECONDITION_FAILED, detail=VERSION_CONFLICT
         )
 
-    # Eliminar archivos adjuntos relacionados
-    attachments = db.query(Attachment).filter(Attachment.note_id == note_id).all()
-    for attachment in attachments:
-        # Eliminar el archivo físico
-        try:
-            os.remove(attachment.file_path)
-        finally:
-            db.delete(attachment)
+    return {"message": "Nota y archivos adjuntos eliminados correctamente"}
 
-    # Eliminar la nota
-    db.delete(note)
-    db.commit()
 
-    return {"message": "Nota y archivos adjuntos eliminados correctamente"}
+@router.post("/{note_id}/share", response_model=NoteShareResponse)
+async def share_note_with_users(
+    share: NoteShareRequest,
+    note: Notes = Depends(note_ref_access),
+    db: Session = Depends(get_db),
+) -> Dict[str, Any]:
+    """Comparte una nota con varios usuarios (ids o nombres de usuario)."""
+    user_ids, not_found = resolve_users(db, share.users)
+    shared = await run_write(db, lambda session: share_with(session, note.id, user_ids))
+
+    return {
+        "data": {
+            "shared": shared,
+            "already_shared": len(user_ids) - shared,
+            "not_found": not_found,
+        }
+    }
+
+
+def unshare_unit(note_id: str, user_ids: List[str]) -> Callable[[Session], int]:
+    """Unidad de escritura que quita accesos; 400 si dejaría la nota sin usuarios."""
+
+    def unit(session: Session) -> int:
+        unshared = unshare_with(session, note_id, user_ids)
+        # El DELETE no borra nada si la nota se quedaría sin usuarios
+        if not unshared and shared_with_any(session, note_id, user_ids):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No se puede quitar al último usuario con acceso a la nota",
+            )
+        return unshared
+
+    return unit
+
+
+@router.post("/{note_id}/unshare", response_model=NoteUnshareResponse)
+async def unshare_note_with_users(
+    unshare: NoteShareRequest,
+    note: Notes = Depends(note_ref_access),
+    db: Session = Depends(get_db),
+) -> Dict[str, Any]:
+    """Deja de compartir una nota con varios usuarios (ids o nombres de usuario)."""
+    user_ids, not_found = resolve_users(db, unshare.users)
+    unshared = await run_write(db, unshare_unit(note.id, user_ids))
+
+    return {
+        "data": {
+            "unshared": unshared,
+            "not_shared": len(user_ids) - unshared,
+            "not_found": not_found,
+        }
+    }
 
 
 @router.post("/{note_id}/share/{user_id}", response_model=ResponseSchemaBase)
 async def share_note(
-    note_id: str,
     user_id: str,
+    note: Notes = Depends(note_ref_access),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
 ) -> Dict[str, str]:
     """Comparte una nota con otro usuario."""
-    # Verificar que la nota exista y pertenezca al usuario actual
-    note = (
-        db.query(Notes)
-        .filter(Notes.id == note_id, Notes.users.any(id=current_user.id))
-        .first()
-    )
-
-    if not note:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Nota no encontrada o no tienes permiso para compartirla",
-        )
-
     # Verificar que el usuario exista
-    user_to_share = db.query(User).filter(User.id == user_id).first()
-    if not user_to_share:
+    user_ids, _ = resolve_users(db, [user_id])
+    if not user_ids:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Usuario no encontrado",
         )
 
-    # Verificar que la nota no esté ya compartida con el usuario
-    if user_to_share in note.users:
+    # Compartir la nota; si ya estaba compartida no se inserta nada
+    if not await run_write(db, lambda session: share_with(session, note.id, user_ids)):
         return {"message": "La nota ya está compartida con este usuario"}
 
-    # Compartir la nota
-    note.users.append(user_to_share)
-    db.commit()
-
     return {"message": "Nota compartida correctamente"}
 
 
 @router.delete("/{note_id}/share/{user_id}", response_model=ResponseSchemaBase)
 async def unshare_note(
-    note_id: str,
     user_id: str,
+    note: Notes = Depends(note_ref_access),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
 ) -> Dict[str, str]:
     """Deja de compartir una nota con otro usuario."""
-    # Verificar que la nota exista y pertenezca al usuario actual
-    note = (
-        db.query(Notes)
-        .filter(Notes.id == note_id, Notes.users.any(id=current_user.id))
-        .first()
-    )
-
-    if not note:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Nota no encontrada o no tienes permiso para modificar su compartición",
-        )
-
     # Verificar que el usuario exista
-    user_to_unshare = db.query(User).filter(User.id == user_id).first()
-    if not user_to_unshare:
+    user_ids, _ = resolve_users(db, [user_id])
+    if not user_ids:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Usuario no encontrado",
         )
 
-    # No permitir quitar al propietario original (asumiendo que es el que la creó primero)
-    if len(note.users) <= 1:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="No se puede quitar al último usuario con acceso a la nota",
-        )
-
-    # Verificar que la nota esté compartida con el usuario
-    if user_to_unshare not in note.users:
-        return {"message": "La nota no está compartida con este usuario"}
-
     # Dejar de compartir la nota
-    note.users.remove(user_to_unshare)
-    db.commit()
+    if not await run_write(db, unshare_unit(note.id, user_ids)):
+        return {"message": "La nota no está compartida con este usuario"}
 
     return {"message": "Se ha dejado de compartir la nota con el usuario"}
 
 
 # UPLOADS AND ATTACHMENTS
 
-UPLOAD_DIR = Path("./uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
+
+# Solo se conserva una extensión corta y sin caracteres raros: la clave tiene
+# que ser válida en todos los backends
+KEY_EXTENSION = re.compile(r"\.[A-Za-z0-9_-]{1,16}")
+
+
+def attachment_key(user_id: str, filename: str) -> str:
+    """Clave única en el almacenamiento, agrupada por usuario."""
+    file_extension = os.path.splitext(filename)[1]
+    if not KEY_EXTENSION.fullmatch(file_extension):
+        file_extension = ""
+    return f"{user_id}/{uuid.uuid4()}{file_extension}"
+
+
+async def upload_chunks(file: UploadFile) -> AsyncIterator[bytes]:
+    while chunk := await file.read(CHUNK_SIZE):
+        yield chunk
 
 
 @router.post("/{note_id}/attachments", response_model=AttachmentDetailResponse)
 async def create_attachment(
-    note_id: str,
+    background_tasks: BackgroundTasks,
+    note: Notes = Depends(note_ref_access),
     file: UploadFile = File(...),
     description: str = Form(None),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: TokenData = Depends(get_active_token_data),
 ) -> Dict[str, Any]:
     """
     Sube un archivo y lo adjunta a una nota.
     """
-    # Verificar que la nota exista y pertenezca al usuario actual
-    note = (
-        db.query(Notes)
-        .filter(Notes.id == note_id, Notes.users.any(id=current_user.id))
-        .first()
-    )
-
-    if not note:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Nota no encontrada o no tienes permiso para adjuntar archivos",
-        )
-
-    # Crear directorio para el usuario si no existe
-    user_upload_dir = UPLOAD_DIR / current_user.id
-    user_upload_dir.mkdir(exist_ok=True)
-
-    # Generar nombre de archivo único
-    file_id = str(uuid.uuid4())
-    file_extension = os.path.splitext(file.filename)[1]
-    safe_filename = f"{file_id}{file_extension}"
-    file_path = user_upload_dir / safe_filename
-
-    # Guardar el archivo
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    key = attachment_key(current_user.id, file.filename)
+    file_size = await storage.put(key, upload_chunks(file))
 
     # Crear registro en la base de datos
     attachment = Attachment(
         filename=file.filename,
-        file_path=str(file_path),
-        file_size=os.path.getsize(file_path),
+        file_path=key,
+        file_size=file_size,
         mime_type=file.content_type or "application/octet-stream",
         description=description,
-        note_id=note_id,
+        note_id=note.id,
+        user_id=current_user.id,
     )
+    await save_attachment(db, background_tasks, attachment)
+
+    return {"data": attachment}
 
+
+async def save_attachment(
+    db: Session,
+    background_tasks: BackgroundTasks,
+    attachment: Attachment,
+    reserved: bool = False,
+) -> None:
+    """
+    Guarda el adjunto de un objeto ya subido y reserva su uso en la misma
+    transacción (salvo que ya esté `reserved`); si falla, borra el objeto.
+    """
     db.add(attachment)
-    db.commit()
+    try:
+        if not reserved:
+            # El uso se reserva en la misma transacción que el adjunto
+            charge(db, attachment.user_id, attachment.note_id, attachment.file_size)
+        db.commit()
+    except Exception:
+        db.rollback()
+        await storage.delete(attachment.file_path)
+        raise
     db.refresh(attachment)
 
-    return {"data": attachment}
+    # Las miniaturas se generan en el pool, fuera de la petición
+    if supports_thumbnails(attachment.mime_type):
+        background_tasks.add_task(thumbnails.enqueue, attachment.file_path)
 
 
-@router.get("/{note_id}/attachments", response_model=AttachmentListResponse)
-async def get_attachments(
-    note_id: str,
+@router.post(
+    "/{note_id}/uploads",
+    response_model=UploadSessionDetailResponse,
+    status_code=status.HTTP_201_CREATED,
+)
+async def create_upload(
+    request: Request,
+    response: Response,
+    upload_in: UploadSessionCreate,
+    note: Notes = Depends(note_ref_access),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: TokenData = Depends(get_active_token_data),
 ) -> Dict[str, Any]:
     """
-    Obtiene todos los archivos adjuntos a una nota.
+    Abre una subida reanudable de `size` bytes a la nota. Los fragmentos se
+    envían con `PATCH /notes/uploads/{upload_id}`.
     """
-    # Verificar que la nota exista y pertenezca al usuario actual
-    note = (
-        db.query(Notes)
-        .filter(Notes.id == note_id, Notes.users.any(id=current_user.id))
-        .first()
+    upload = UploadSession(
+        id=str(uuid.uuid4()),
+        user_id=current_user.id,
+        note_id=note.id,
+        filename=upload_in.filename,
+        mime_type=upload_in.mime_type or "application/octet-stream",
+        description=upload_in.description,
+        size=upload_in.size,
+        received=0,
+        sha256=upload_in.sha256.lower() if upload_in.sha256 else None,
+        expiresAt=session_expiry(),
+    )
+    await run_in_threadpool(create_part, upload.id)
+    db.add(upload)
+    try:
+        # La cuota se reserva al abrir la sesión: varias subidas en paralelo
+        # no pueden superarla juntas, y al finalizar ya no puede fallar
+        charge(db, current_user.id, note.id, upload.size)
+        db.commit()
+    except Exception:
+        db.rollback()
+        await run_in_threadpool(discard_part, upload.id)
+        raise
+    db.refresh(upload)
+
+    response.headers["Location"] = str(
+        request.url_for("get_upload", upload_id=upload.id)
     )
+    response.headers["Upload-Offset"] = "0"
+    return {"data": upload}
 
-    if not note:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Nota no encontrada o no tienes permiso para ver sus adjuntos",
+
+@router.get("/uploads/{upload_id}", response_model=UploadSessionDetailResponse)
+async def get_upload(
+    response: Response,
+    upload: UploadSession = Depends(require_upload_access),
+) -> Dict[str, Any]:
+    """
+    Estado de una subida reanudable: `offset` es el byte desde el que seguir.
+    """
+    response.headers["Upload-Offset"] = str(upload.received)
+    return {"data": upload}
+
+
+@router.patch("/uploads/{upload_id}", response_model=UploadSessionDetailResponse)
+async def upload_chunk(
+    request: Request,
+    response: Response,
+    upload_offset: int = Header(..., ge=0),
+    upload_checksum: Optional[str] = Header(None),
+    content_length: Optional[int] = Header(None, ge=0),
+    upload: UploadSession = Depends(require_upload_access),
+    db: Session = Depends(get_db),
+) -> Dict[str, Any]:
+    """
+    Añade el cuerpo de la petición a la subida a partir de `Upload-Offset`,
+    que debe ser el `offset` actual. Con `Upload-Checksum: <algoritmo>
+    <base64>` (md5, sha1 o sha256) el fragmento se descarta si no coincide.
+    """
+    checksum = parse_checksum(upload_checksum)
+    async with locked_part(upload.id) as fd:
+        # Otro PATCH pudo avanzar la subida antes de tomar el bloqueo
+        db.refresh(upload)
+        if upload_offset != upload.received:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Upload-Offset debe ser {upload.received}",
+            )
+        max_bytes = min(upload.size - upload.received, settings.UPLOAD_CHUNK_MAX_BYTES)
+        if content_length is not None and content_length > max_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="El fragmento supera el tamaño permitido",
+            )
+        written = await write_chunk(
+            fd, upload_offset, request.stream(), max_bytes, checksum
+        )
+        db.execute(
+            update(UploadSession)
+            .where(UploadSession.id == upload.id)
+            .values(received=upload_offset + written, expiresAt=session_expiry())
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+    db.refresh(upload)
+
+    response.headers["Upload-Offset"] = str(upload.received)
+    return {"data": upload}
+
+
+@router.post("/uploads/{upload_id}/complete", response_model=AttachmentDetailResponse)
+async def complete_upload(
+    background_tasks: BackgroundTasks,
+    upload: UploadSession = Depends(require_upload_access),
+    db: Session = Depends(get_db),
+) -> Dict[str, Any]:
+    """
+    Convierte una subida completa en adjunto de su nota.
+    """
+    async with locked_part(upload.id):
+        db.refresh(upload)
+        if upload.received != upload.size:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Faltan bytes: recibidos {upload.received} de {upload.size}",
+            )
+        if upload.sha256 and await part_sha256(upload.id) != upload.sha256:
+            # Los bytes recibidos no tienen arreglo: se descarta la subida
+            await discard_session(db, upload)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="El checksum del archivo no coincide; la subida se ha descartado",
+            )
+        key = attachment_key(upload.user_id, upload.filename)
+        file_size = await store_part(storage, upload.id, key)
+
+    attachment = Attachment(
+        filename=upload.filename,
+        file_path=key,
+        file_size=file_size,
+        mime_type=upload.mime_type,
+        description=upload.description,
+        note_id=upload.note_id,
+        user_id=upload.user_id,
+    )
+    # La sesión desaparece en la misma transacción que crea el adjunto, que
+    # hereda su reserva de cuota
+    db.delete(upload)
+    try:
+        await save_attachment(db, background_tasks, attachment, reserved=True)
+    except Exception:
+        # El fichero de trabajo ya no existe: la sesión no se puede reintentar
+        await discard_session(db, upload)
+        raise
+
+    return {"data": attachment}
+
+
+@router.delete("/uploads/{upload_id}", response_model=ResponseSchemaBase)
+async def cancel_upload(
+    upload: UploadSession = Depends(require_upload_access),
+    db: Session = Depends(get_db),
+) -> Dict[str, str]:
+    """
+    Cancela una subida reanudable y descarta lo recibido.
+    """
+    await discard_session(db, upload)
+
+    return {"message": "Subida cancelada correctamente"}
+
+
+@router.get("/{note_id}/attachments.zip", response_class=StreamingResponse)
+async def download_attachments_zip(
+    note: Notes = Depends(note_ref_access),
+    db: Session = Depends(get_db),
+) -> StreamingResponse:
+    """
+    Descarga todos los adjuntos de una nota en un ZIP que se genera mientras
+    se envía, leyendo cada archivo del almacenamiento por fragmentos.
+    """
+    attachments = db.execute(
+        select(
+            Attachment.filename,
+            Attachment.file_path,
+            Attachment.mime_type,
+            Attachment.file_size,
+            Attachment.createdAt,
         )
+        .where(Attachment.note_id == note.id)
+        .order_by(Attachment.createdAt, Attachment.id)
+    ).all()
+    names = entry_names(attachment.filename for attachment in attachments)
+
+    async def entries() -> AsyncIterator[ZipEntry]:
+        for name, (_, key, mime_type, size, created_at) in zip(names, attachments):
+            yield ZipEntry(
+                name,
+                storage.get(key),
+                created_at or datetime.now(timezone.utc),
+                compress=not is_precompressed(mime_type),
+                size=size,
+            )
+
+    return StreamingResponse(
+        stream_zip(entries(), settings.ZIP_DEFLATE_LEVEL),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{note.id}.zip"'},
+    )
+
 
+@router.get("/{note_id}/attachments", response_model=AttachmentListResponse)
+async def get_attachments(
+    note: Notes = Depends(note_ref_access),
+    db: Session = Depends(get_db),
+) -> Dict[str, Any]:
+    """
+    Obtiene todos los archivos adjuntos a una nota.
+    """
     # Obtener adjuntos
-    attachments = db.query(Attachment).filter(Attachment.note_id == note_id).all()
+    attachments = db.query(Attachment).filter(Attachment.note_id == note.id).all()
 
     return {"data": attachments, "metadata": {"total_items": len(attachments)}}
 
 
 @router.get("/attachments/{attachment_id}", response_model=AttachmentDetailResponse)
 async def get_attachment(
-    attachment_id: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    attachment: Attachment = Depends(require_attachment_access),
 ) -> Dict[str, Any]:
     """
     Obtiene un archivo adjunto específico.
     """
-    # Obtener el adjunto y verificar permisos
-    attachment = db.query(Attachment).filter(Attachment.id == attachment_id).first()
+    return {"data": attachment}
 
-    if not attachment:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Archivo adjunto no encontrado",
-        )
 
-    # Verificar que el usuario tenga acceso a la nota asociada
-    note = (
-        db.query(Notes)
-        .filter(Notes.id == attachment.note_id, Notes.users.any(id=current_user.id))
-        .first()
+@router.get("/attachments/{attachment_id}/url", response_model=AttachmentUrlResponse)
+async def get_attachment_url(
+    request: Request,
+    expires_in: int = Query(
+        settings.SIGNED_URL_TTL_SECONDS, gt=0, le=settings.SIGNED_URL_MAX_TTL_SECONDS
+    ),
+    attachment: Attachment = Depends(require_attachment_access),
+) -> Dict[str, Any]:
+    """
+    Emite una URL firmada para descargar el adjunto durante `expires_in`
+    segundos sin token; la descarga no consulta la base de datos.
+    """
+    expires = int(time.time()) + expires_in
+    key = attachment.file_path
+    url = request.url_for(
+        "download_attachment", attachment_id=attachment.id, key=key
+    ).include_query_params(
+        **sign(attachment.id, key, expires, attachment.filename, attachment.mime_type)
     )
+    return {
+        "data": {
+            "url": str(url),
+            "expires_at": datetime.fromtimestamp(expires, timezone.utc),
+        }
+    }
 
-    if not note:
+
+@router.get("/attachments/{attachment_id}/thumbnail", response_class=StreamingResponse)
+async def get_attachment_thumbnail(
+    size: int = Query(max(THUMBNAIL_SIZES)),
+    attachment: Attachment = Depends(require_attachment_access),
+) -> StreamingResponse:
+    """
+    Devuelve la miniatura WebP de un adjunto de imagen; `size` es el lado
+    máximo en píxeles y debe ser uno de los tamaños configurados.
+    """
+    if size not in THUMBNAIL_SIZES:
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="No tienes permiso para acceder a este archivo adjunto",
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Tamaño no válido; disponibles: {list(THUMBNAIL_SIZES)}",
         )
-
-    return {"data": attachment}
+    if not supports_thumbnails(attachment.mime_type):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="El adjunto no tiene miniatura",
+        )
+    key = thumbnail_key(attachment.file_path, size)
+    try:
+        info = await storage.stat(key)
+    except ObjectNotFound:
+        # Aún no generada (o se perdió): se genera ahora en el pool
+        try:
+            await thumbnails.ensure(attachment.file_path)
+            info = await storage.stat(key)
+        except ImageTooLarge:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="La imagen es demasiado grande para generar su miniatura",
+            )
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="El adjunto no tiene miniatura",
+            )
+    # Un adjunto no cambia: su miniatura se puede cachear indefinidamente
+    return StreamingResponse(
+        storage.get(key),
+        media_type=THUMBNAIL_MEDIA_TYPE,
+        headers={
+            "Content-Length": str(info.size),
+            "Cache-Control": "private, max-age=31536000, immutable",
+        },
+    )
 
 
 @router.delete("/attachments/{attachment_id}", response_model=ResponseSchemaBase)
 async def delete_attachment(
-    attachment_id: str,
+    attachment: Attachment = Depends(require_attachment_access),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
 ) -> Dict[str, str]:
     """
     Elimina un archivo adjunto.
     """
-    # Obtener el adjunto y verificar permisos
-    attachment = db.query(Attachment).filter(Attachment.id == attachment_id).first()
-
-    if not attachment:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Archivo adjunto no encontrado",
-        )
+    key = attachment.file_path
 
-    # Verificar que el usuario tenga acceso a la nota asociada
-    note = (
-        db.query(Notes)
-        .filter(Notes.id == attachment.note_id, Notes.users.any(id=current_user.id))
-        .first()
-    )
+    def remove(session: Session) -> None:
+        target = session.get(Attachment, attachment.id)
+        if target is not None:
+            release(session, target.user_id, target.note_id, target.file_size)
+            session.delete(target)
 
-    if not note:
+    try:
+        await run_write(db, remove)
+    except StaleDataError:
+        db.rollback()
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="No tienes permiso para eliminar este archivo adjunto",
+            status_code=status.HTTP_412_PRECONDITION_FAILED, detail=VERSION_CONFLICT
         )
 
-    # Eliminar el archivo físico
-    try:
-        os.remove(attachment.file_path)
-    finally:
-        db.delete(attachment)
-        db.commit()
+    # El archivo se borra cuando la fila ya no existe
+    await storage.delete_many([key, *thumbnail_keys(key)])
 
     return {"message": "Archivo adjunto eliminado correctamente"}
@@ -2,21 +2,30 @@ from typing import Any, Dict
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 
 from app import controllers
 from app.auth.jwt import (
+    TokenData,
+    bump_token_version,
+    current_bcrypt_rounds,
+    get_admin_token_data,
     get_current_active_user,
-    get_current_admin_user,
     get_password_hash,
+    password_cost_distribution,
+    publish_token_version,
 )
 from app.config.database import get_db
 from app.helpers.response import ResponseHelper
+from app.helpers.versioning import VERSION_CONFLICT
 from app.models.users import User
 from app.schemas.base import ResponseSchemaBase
 from app.schemas.users import (
+    PasswordHashMetricsResponse,
     UserCreate,
     UserDetailResponse,
     UserListResponse,
+    UserSelfUpdate,
     UserUpdate,
 )
 
@@ -28,8 +37,8 @@ async def get_users(
     page: int = 0,
     page_size: int = 10,
     db: Session = Depends(get_db),
-    current_user: User = Depends(
-        get_current_admin_user
+    current_user: TokenData = Depends(
+        get_admin_token_data
     ),  # Solo admin puede ver todos los usuarios
 ) -> Dict[str, Any]:
     """Obtiene todos los usuarios (solo admin)."""
@@ -53,6 +62,8 @@ async def create_user(
         .filter(
             (User.username == user_create.username) | (User.email == user_create.email)
         )
+        # Los usuarios borrados conservan su nombre y email hasta la purga
+        .execution_options(include_deleted=True)
         .first()
     )
     if db_user:
@@ -81,17 +92,21 @@ async def read_user_me(
 
 @router.put("/me", response_model=UserDetailResponse)
 async def update_user_me(
-    user_update: UserUpdate,
+    user_update: UserSelfUpdate,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
 ) -> Dict[str, Any]:
-    """Actualiza la información del usuario actual."""
-    # Si se actualiza la contraseña, hashearla
+    """
+    Actualiza la información del usuario actual. El estado y el rol solo los
+    cambia un admin (`PUT /users/{user_id}`).
+    """
+    # Si se actualiza la contraseña, hashearla e invalidar los tokens previos
     if user_update.password:
         user_dict = user_update.model_dump(exclude_unset=True)
         user_dict["hashed_password"] = get_password_hash(user_dict.pop("password"))
         for key, value in user_dict.items():
             setattr(current_user, key, value)
+        bump_token_version(current_user)
     else:
         # Actualizar solo los campos proporcionados
         for key, value in user_update.model_dump(
@@ -100,17 +115,45 @@ async def update_user_me(
             setattr(current_user, key, value)
 
     db.add(current_user)
-    db.commit()
+    try:
+        db.commit()
+    except StaleDataError:
+        # Otra petición cambió el usuario después de cargarlo
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED, detail=VERSION_CONFLICT
+        )
     db.refresh(current_user)
+    if user_update.password:
+        publish_token_version(current_user)
     return {"data": current_user}
 
 
+@router.get("/metrics/password-hashes", response_model=PasswordHashMetricsResponse)
+async def get_password_hash_metrics(
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_admin_token_data),
+) -> Dict[str, Any]:
+    """Distribución de usuarios por coste bcrypt (solo admin)."""
+    distribution = password_cost_distribution(db)
+    rounds = current_bcrypt_rounds()
+    return {
+        "data": {
+            "current_rounds": rounds,
+            "outdated_users": sum(
+                count for cost, count in distribution.items() if cost < rounds
+            ),
+            "users_by_rounds": distribution,
+        }
+    }
+
+
 @router.get("/{user_id}", response_model=UserDetailResponse)
 async def get_user(
     user_id: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(
-        get_current_admin_user
+    current_user: TokenData = Depends(
+        get_admin_token_data
     ),  # Solo admin puede ver otros usuarios
 ) -> Dict[str, Any]:
     """Obtiene un usuario por ID (solo admin)."""
@@ -123,13 +166,22 @@ async def update_user(
     user_id: str,
     user_update: UserUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(
-        get_current_admin_user
+    current_user: TokenData = Depends(
+        get_admin_token_data
     ),  # Solo admin puede actualizar otros usuarios
 ) -> Dict[str, Any]:
     """Actualiza un usuario por ID (solo admin)."""
     user = controllers.users.get(id=user_id, db=db, error_out=True)
 
+    # Cambios de contraseña, estado o rol invalidan los tokens emitidos
+    changes = user_update.model_dump(exclude_unset=True)
+    revoke = bool(changes.get("password")) or any(
+        key in changes and changes[key] != getattr(user, key)
+        for key in ("is_active", "is_admin")
+    )
+    if revoke:
+        bump_token_version(user)
+
     # Si se actualiza la contraseña, hashearla
     if user_update.password:
         user_dict = user_update.model_dump(exclude_unset=True)
@@ -141,6 +193,8 @@ async def update_user(
             model=user,
             schema=user_update.model_dump(exclude_unset=True, exclude={"password"}),
         )
+    if revoke:
+        publish_token_version(user)
 
     return {"data": user}
 
@@ -149,8 +203,8 @@ async def update_user(
 async def delete_user(
     user_id: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(
-        get_current_admin_user
+    current_user: TokenData = Depends(
+        get_admin_token_data
     ),  # Solo admin puede eliminar usuarios
 ) -> Dict[str, str]:
     """Elimina un usuario por ID (solo admin)."""
@@ -161,5 +215,9 @@ async def delete_user(
             detail="No puedes eliminar tu propio usuario",
         )
 
+    # Los tokens del usuario dejan de valer también en los demás workers
+    user = controllers.users.get(id=user_id, db=db, error_out=True)
+    bump_token_version(user)
     controllers.users.delete(db=db, id=user_id)
+    publish_token_version(user)
     return {"message": "Usuario eliminado correctamente"}
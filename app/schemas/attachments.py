@@ -65,3 +65,16 @@ class AttachmentDetailResponse(BaseModel):
     """Esquema para detalle de archivo adjunto"""
 
     data: AttachmentResponse
+
+
+class AttachmentUrl(BaseModel):
+    """URL firmada de descarga de un adjunto"""
+
+    url: str
+    expires_at: datetime
+
+
+class AttachmentUrlResponse(BaseModel):
+    """Esquema para la URL firmada de un adjunto"""
+
+    data: AttachmentUrl
@@ -1,7 +1,8 @@
 from datetime import datetime
-from typing import List, Optional
+from functools import lru_cache
+from typing import FrozenSet, List, Optional, Type
 
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, create_model
 
 from app.schemas.categories import CategoryResponse
 from app.schemas.users import UserResponse
@@ -51,6 +52,8 @@ class NoteResponse(NoteBase):
     """Esquema para respuesta de nota"""
 
     id: str
+    preview: Optional[str] = None
+    version: Optional[int] = None
     createdAt: datetime
     updatedAt: Optional[datetime] = None
     category: Optional[CategoryResponse] = None
@@ -64,7 +67,80 @@ class NoteListResponse(BaseModel):
     metadata: dict
 
 
+@lru_cache(maxsize=128)
+def sparse_note_list_model(fields: FrozenSet[str]) -> Type[BaseModel]:
+    """Esquema de lista de notas con solo los campos pedidos en `fields=`."""
+    item = create_model(  # type: ignore[call-overload]
+        "NoteSparseResponse",
+        __config__=NoteResponse.model_config,
+        **{
+            name: (info.annotation, info)
+            for name, info in NoteResponse.model_fields.items()
+            if name in fields
+        },
+    )
+    return create_model(
+        "NoteSparseListResponse", data=(List[item], ...), metadata=(dict, ...)
+    )
+
+
 class NoteDetailResponse(BaseModel):
     """Esquema para detalle de nota"""
 
     data: NoteResponse
+
+
+class NoteShareRequest(BaseModel):
+    """Esquema para compartir o dejar de compartir una nota"""
+
+    # Ids o nombres de usuario
+    users: List[str] = Field(..., min_length=1, max_length=1000)
+
+
+class NoteShareResult(BaseModel):
+    """Esquema para el resultado de compartir una nota"""
+
+    shared: int
+    already_shared: int
+    not_found: List[str]
+
+
+class NoteShareResponse(BaseModel):
+    """Esquema para respuesta de compartir una nota"""
+
+    data: NoteShareResult
+
+
+class NoteUnshareResult(BaseModel):
+    """Esquema para el resultado de dejar de compartir una nota"""
+
+    unshared: int
+    not_shared: int
+    not_found: List[str]
+
+
+class NoteUnshareResponse(BaseModel):
+    """Esquema para respuesta de dejar de compartir una nota"""
+
+    data: NoteUnshareResult
+
+
+class NoteImportError(BaseModel):
+    """Esquema para un error de importación"""
+
+    line: int
+    error: str
+
+
+class NoteImportResult(BaseModel):
+    """Esquema para el resultado de una importación"""
+
+    imported: int
+    failed: int
+    errors: List[NoteImportError]
+
+
+class NoteImportResponse(BaseModel):
+    """Esquema para respuesta de importación de notas"""
+
+    data: NoteImportResult
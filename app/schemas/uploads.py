@@ -0,0 +1,35 @@
+from datetime import datetime
+from typing import Optional
+
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field
+
+
+class UploadSessionCreate(BaseModel):
+    """Esquema para abrir una subida reanudable"""
+
+    filename: str = Field(..., min_length=1, max_length=255)
+    size: int = Field(..., gt=0)
+    mime_type: Optional[str] = Field(None, max_length=100)
+    description: Optional[str] = Field(None, max_length=255)
+    sha256: Optional[str] = Field(None, pattern=r"^[0-9a-fA-F]{64}$")
+
+
+class UploadSessionResponse(BaseModel):
+    """Esquema para el estado de una subida reanudable"""
+
+    id: str
+    note_id: str
+    filename: str
+    size: int
+    offset: int = Field(validation_alias=AliasChoices("offset", "received"))
+    expiresAt: datetime
+
+    model_config = ConfigDict(
+        from_attributes=True, populate_by_name=True, arbitrary_types_allowed=True
+    )
+
+
+class UploadSessionDetailResponse(BaseModel):
+    """Esquema para detalle de una subida reanudable"""
+
+    data: UploadSessionResponse
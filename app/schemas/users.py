@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, ConfigDict, EmailStr, Field
 
@@ -24,14 +24,12 @@ class UserCreate(UserBase):
     password: str = Field(..., min_length=8)
 
 
-class UserUpdate(BaseModel):
-    """Esquema para actualización de usuarios"""
+class UserSelfUpdate(BaseModel):
+    """Esquema para que un usuario actualice sus propios datos"""
 
     username: Optional[str] = Field(None, min_length=3, max_length=50)
     email: Optional[EmailStr] = None
     full_name: Optional[str] = None
-    is_active: Optional[bool] = None
-    is_admin: Optional[bool] = None
     password: Optional[str] = Field(None, min_length=8)
 
     model_config = ConfigDict(
@@ -39,6 +37,13 @@ class UserUpdate(BaseModel):
     )
 
 
+class UserUpdate(UserSelfUpdate):
+    """Esquema para actualización de usuarios (solo admin)"""
+
+    is_active: Optional[bool] = None
+    is_admin: Optional[bool] = None
+
+
 class UserInDB(UserBase):
     """Esquema para usuario en la base de datos"""
 
@@ -67,3 +72,17 @@ class UserDetailResponse(BaseModel):
     """Esquema para detalle de usuario"""
 
     data: UserResponse
+
+
+class PasswordHashMetrics(BaseModel):
+    """Esquema para la distribución de costes de hash de contraseñas"""
+
+    current_rounds: int
+    outdated_users: int
+    users_by_rounds: Dict[int, int]
+
+
+class PasswordHashMetricsResponse(BaseModel):
+    """Esquema para respuesta de métricas de hash de contraseñas"""
+
+    data: PasswordHashMetrics
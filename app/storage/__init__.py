@@ -0,0 +1,40 @@
+"""
+Almacenamiento de los adjuntos.
+
+`Attachment.file_path` es una clave del backend (`<user_id>/<uuid>.<ext>`), no
+una ruta: el backend se elige con `STORAGE_BACKEND` ("local", "memory" o "s3").
+"""
+
+from app.config.settings import Settings, settings
+from app.storage.base import (
+    InvalidKey,
+    ObjectInfo,
+    ObjectNotFound,
+    Storage,
+    StorageError,
+    sibling_key,
+    validate_key,
+)
+from app.storage.local import LocalStorage
+from app.storage.memory import MemoryStorage
+from app.storage.s3 import S3Storage
+
+
+def create_storage(settings: Settings) -> Storage:
+    backend = settings.STORAGE_BACKEND.lower()
+    if backend == "local":
+        return LocalStorage(settings.UPLOAD_DIR)
+    if backend == "memory":
+        return MemoryStorage()
+    if backend == "s3":
+        return S3Storage(
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            bucket=settings.S3_BUCKET,
+            access_key=settings.S3_ACCESS_KEY_ID,
+            secret_key=settings.S3_SECRET_ACCESS_KEY,
+            region=settings.S3_REGION,
+        )
+    raise ValueError(f"STORAGE_BACKEND desconocido: {settings.STORAGE_BACKEND}")
+
+
+storage = create_storage(settings)
@@ -0,0 +1,96 @@
+from dataclasses import dataclass
+from pathlib import PurePosixPath
+from typing import AsyncIterable, AsyncIterator, Iterable, Optional
+
+# Tamaño de los trozos que se leen y escriben
+CHUNK_SIZE = 64 * 1024
+
+
+class StorageError(Exception):
+    """Error del backend de almacenamiento."""
+
+
+class ObjectNotFound(StorageError):
+    """No existe ningún objeto con esa clave."""
+
+
+class InvalidKey(StorageError, ValueError):
+    """Clave vacía, absoluta o con segmentos `.`/`..`."""
+
+
+@dataclass(frozen=True)
+class ObjectInfo:
+    key: str
+    size: int
+
+
+def validate_key(key: str) -> str:
+    """
+    Las claves son rutas relativas con `/` (`<user_id>/<uuid>.pdf`); ningún
+    backend debe poder salirse de su raíz.
+    """
+    parts = key.split("/")
+    if (
+        not key
+        or "\\" in key
+        or "\0" in key
+        or any(part in ("", ".", "..") for part in parts)
+    ):
+        raise InvalidKey(key)
+    return key
+
+
+def sibling_key(key: str, name: str) -> str:
+    """Clave de `name` en el mismo «directorio» que `key`."""
+    return PurePosixPath(key).with_name(name).as_posix()
+
+
+class Storage:
+    """
+    Almacenamiento asíncrono de adjuntos por clave.
+
+    Las subclases implementan `put`, `get`, `delete` y `stat`; el resto son
+    atajos sobre ellas.
+    """
+
+    async def put(self, key: str, chunks: AsyncIterable[bytes]) -> int:
+        """Guarda (o reemplaza) el objeto y devuelve su tamaño en bytes."""
+        raise NotImplementedError
+
+    def get(
+        self, key: str, start: int = 0, end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """Trozos del objeto entre `start` y `end` (excluido; `None`: hasta el
+        final). Lanza `ObjectNotFound` en la primera iteración si no existe."""
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        """Borra el objeto; no es un error que no exista."""
+        raise NotImplementedError
+
+    async def stat(self, key: str) -> ObjectInfo:
+        """Metadatos del objeto; lanza `ObjectNotFound` si no existe."""
+        raise NotImplementedError
+
+    async def aclose(self) -> None:
+        """Libera conexiones o clientes abiertos."""
+
+    async def exists(self, key: str) -> bool:
+        try:
+            await self.stat(key)
+        except ObjectNotFound:
+            return False
+        return True
+
+    async def put_bytes(self, key: str, data: bytes) -> int:
+        async def chunks() -> AsyncIterator[bytes]:
+            yield data
+
+        return await self.put(key, chunks())
+
+    async def read(self, key: str) -> bytes:
+        return b"".join([chunk async for chunk in self.get(key)])
+
+    async def delete_many(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            await self.delete(key)
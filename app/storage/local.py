@@ -0,0 +1,85 @@
+import os
+import uuid
+from pathlib import Path
+from typing import AsyncIterable, AsyncIterator, Optional
+
+import anyio
+
+from app.storage.base import (
+    CHUNK_SIZE,
+    ObjectInfo,
+    ObjectNotFound,
+    Storage,
+    validate_key,
+)
+
+
+class LocalStorage(Storage):
+    """
+    Objetos como ficheros bajo `root`. La E/S va a hilos de anyio para no
+    bloquear el bucle de eventos, y cada escritura se hace en un fichero
+    temporal que se renombra al terminar: un lector nunca ve uno a medias.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = Path(root)
+
+    def path(self, key: str) -> Path:
+        return self.root.joinpath(*validate_key(key).split("/"))
+
+    async def put(self, key: str, chunks: AsyncIterable[bytes]) -> int:
+        path = self.path(key)
+        await anyio.Path(path.parent).mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(f".{path.name}.{uuid.uuid4().hex}.part")
+        size = 0
+        try:
+            async with await anyio.open_file(temporary, "wb") as file:
+                async for chunk in chunks:
+                    await file.write(chunk)
+                    size += len(chunk)
+            await anyio.to_thread.run_sync(os.replace, temporary, path)
+        except BaseException:
+            await anyio.Path(temporary).unlink(missing_ok=True)
+            raise
+        return size
+
+    async def adopt(self, key: str, source: Path) -> int:
+        """
+        Mueve el fichero `source` a `key` con un renombrado, sin copiar su
+        contenido; debe estar en el mismo sistema de ficheros que `root`.
+        """
+        path = self.path(key)
+        await anyio.Path(path.parent).mkdir(parents=True, exist_ok=True)
+        size = (await anyio.Path(source).stat()).st_size
+        await anyio.to_thread.run_sync(os.replace, source, path)
+        return size
+
+    async def get(
+        self, key: str, start: int = 0, end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        try:
+            file = await anyio.open_file(self.path(key), "rb")
+        except FileNotFoundError:
+            raise ObjectNotFound(key)
+        async with file:
+            if start:
+                await file.seek(start)
+            remaining = None if end is None else end - start
+            while remaining is None or remaining > 0:
+                size = CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining)
+                chunk = await file.read(size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    async def delete(self, key: str) -> None:
+        await anyio.Path(self.path(key)).unlink(missing_ok=True)
+
+    async def stat(self, key: str) -> ObjectInfo:
+        try:
+            result = await anyio.Path(self.path(key)).stat()
+        except FileNotFoundError:
+            raise ObjectNotFound(key)
+        return ObjectInfo(key, result.st_size)
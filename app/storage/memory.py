@@ -0,0 +1,42 @@
+from typing import AsyncIterable, AsyncIterator, Dict, Optional
+
+from app.storage.base import (
+    CHUNK_SIZE,
+    ObjectInfo,
+    ObjectNotFound,
+    Storage,
+    validate_key,
+)
+
+
+class MemoryStorage(Storage):
+    """Objetos en un diccionario del proceso; para pruebas y desarrollo."""
+
+    def __init__(self) -> None:
+        self.objects: Dict[str, bytes] = {}
+
+    async def put(self, key: str, chunks: AsyncIterable[bytes]) -> int:
+        validate_key(key)
+        data = b"".join([chunk async for chunk in chunks])
+        self.objects[key] = data
+        return len(data)
+
+    async def get(
+        self, key: str, start: int = 0, end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        try:
+            data = self.objects[validate_key(key)]
+        except KeyError:
+            raise ObjectNotFound(key)
+        end = len(data) if end is None else min(end, len(data))
+        for offset in range(start, end, CHUNK_SIZE):
+            yield data[offset : min(offset + CHUNK_SIZE, end)]
+
+    async def delete(self, key: str) -> None:
+        self.objects.pop(validate_key(key), None)
+
+    async def stat(self, key: str) -> ObjectInfo:
+        try:
+            return ObjectInfo(key, len(self.objects[validate_key(key)]))
+        except KeyError:
+            raise ObjectNotFound(key)
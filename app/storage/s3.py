@@ -0,0 +1,212 @@
+"""
+Backend compatible con S3 (AWS, MinIO, Ceph, R2...) sobre httpx.
+
+Habla directamente la API REST con direccionamiento por ruta
+(`<endpoint>/<bucket>/<clave>`) y firma AWS Signature V4. Un PUT de S3 necesita
+la longitud y el hash del cuerpo por adelantado, así que `put` vuelca el
+objeto a un fichero temporal (en memoria si es pequeño) mientras lo calcula.
+"""
+
+import datetime
+import hashlib
+import hmac
+import tempfile
+from typing import AsyncIterable, AsyncIterator, Dict, Optional
+from urllib.parse import quote
+
+import anyio
+import httpx
+
+from app.storage.base import (
+    CHUNK_SIZE,
+    ObjectInfo,
+    ObjectNotFound,
+    Storage,
+    StorageError,
+    validate_key,
+)
+
+EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+# Objetos por encima de este tamaño se vuelcan a disco antes de subirlos
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+
+
+def _hmac(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode(), hashlib.sha256).digest()
+
+
+def sign_request(
+    method: str,
+    host: str,
+    path: str,
+    payload_hash: str,
+    access_key: str,
+    secret_key: str,
+    region: str,
+    now: datetime.datetime,
+    query: str = "",
+) -> Dict[str, str]:
+    """
+    Cabeceras `Authorization`, `x-amz-date` y `x-amz-content-sha256`.
+
+    `query` es la query canónica (parámetros codificados y ordenados).
+    """
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    date = amz_date[:8]
+    headers = {
+        "host": host,
+        "x-amz-content-sha256": payload_hash,
+        "x-amz-date": amz_date,
+    }
+    signed_headers = ";".join(sorted(headers))
+    canonical_request = "\n".join(
+        [
+            method,
+            path,
+            query,
+            *(f"{name}:{headers[name]}" for name in sorted(headers)),
+            "",
+            signed_headers,
+            payload_hash,
+        ]
+    )
+    scope = f"{date}/{region}/s3/aws4_request"
+    string_to_sign = "\n".join(
+        [
+            "AWS4-HMAC-SHA256",
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode()).hexdigest(),
+        ]
+    )
+    signing_key = _hmac(
+        _hmac(_hmac(_hmac(f"AWS4{secret_key}".encode(), date), region), "s3"),
+        "aws4_request",
+    )
+    signature = hmac.new(
+        signing_key, string_to_sign.encode(), hashlib.sha256
+    ).hexdigest()
+    return {
+        "authorization": (
+            f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, "
+            f"SignedHeaders={signed_headers}, Signature={signature}"
+        ),
+        "x-amz-content-sha256": payload_hash,
+        "x-amz-date": amz_date,
+    }
+
+
+class S3Storage(Storage):
+    """Objetos en un bucket S3; `transport` permite probarlo contra un doble."""
+
+    def __init__(
+        self,
+        endpoint_url: str,
+        bucket: str,
+        access_key: str,
+        secret_key: str,
+        region: str = "us-east-1",
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
+        self.endpoint_url = endpoint_url.rstrip("/")
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.endpoint_url, transport=self.transport, timeout=60
+            )
+        return self._client
+
+    def _request(
+        self,
+        method: str,
+        key: str,
+        payload_hash: str = EMPTY_SHA256,
+        headers: Optional[Dict[str, str]] = None,
+        content: Optional[AsyncIterable[bytes]] = None,
+    ) -> httpx.Request:
+        path = quote(f"/{self.bucket}/{validate_key(key)}", safe="/-_.~")
+        url = httpx.URL(self.endpoint_url + path)
+        signed = sign_request(
+            method,
+            url.netloc.decode(),
+            url.raw_path.decode(),
+            payload_hash,
+            self.access_key,
+            self.secret_key,
+            self.region,
+            datetime.datetime.now(datetime.timezone.utc),
+        )
+        return self.client.build_request(
+            method, url, headers={**(headers or {}), **signed}, content=content
+        )
+
+    @staticmethod
+    def _check(response: httpx.Response, key: str) -> None:
+        if response.status_code == 404:
+            raise ObjectNotFound(key)
+        if response.status_code >= 300:
+            raise StorageError(f"S3 respondió {response.status_code} para {key}")
+
+    async def put(self, key: str, chunks: AsyncIterable[bytes]) -> int:
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY) as spool:
+            digest = hashlib.sha256()
+            size = 0
+            async for chunk in chunks:
+                digest.update(chunk)
+                size += len(chunk)
+                await anyio.to_thread.run_sync(spool.write, chunk)
+            spool.seek(0)
+
+            async def body() -> AsyncIterator[bytes]:
+                while chunk := await anyio.to_thread.run_sync(spool.read, CHUNK_SIZE):
+                    yield chunk
+
+            request = self._request(
+                "PUT",
+                key,
+                payload_hash=digest.hexdigest(),
+                headers={"content-length": str(size)},
+                content=body(),
+            )
+            response = await self.client.send(request)
+        self._check(response, key)
+        return size
+
+    async def get(
+        self, key: str, start: int = 0, end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        headers = {}
+        if start or end is not None:
+            last = "" if end is None else str(end - 1)
+            headers["range"] = f"bytes={start}-{last}"
+        request = self._request("GET", key, headers=headers)
+        response = await self.client.send(request, stream=True)
+        try:
+            self._check(response, key)
+            async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                yield chunk
+        finally:
+            await response.aclose()
+
+    async def delete(self, key: str) -> None:
+        response = await self.client.send(self._request("DELETE", key))
+        if response.status_code != 404:
+            self._check(response, key)
+
+    async def stat(self, key: str) -> ObjectInfo:
+        response = await self.client.send(self._request("HEAD", key))
+        self._check(response, key)
+        return ObjectInfo(key, int(response.headers["content-length"]))
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
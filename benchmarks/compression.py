@@ -0,0 +1,131 @@
+"""
+Banda y CPU de la compresión de respuestas sobre páginas de notas típicas.
+
+Genera páginas de `GET /notes` con el generador sintético (contenido, usuarios
+y categoría anidados) y mide, para cada codificación y nivel, el tamaño
+comprimido, el ratio y el tiempo de compresión y descompresión.
+
+Uso:
+    python -m benchmarks.compression --page-sizes 20 100 500 --repeat 20
+"""
+
+import argparse
+import json
+import statistics
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.cli.seed import SeedConfig, SyntheticDataset
+from app.middleware.compression import (
+    AVAILABLE_ENCODINGS,
+    CompressionMiddleware,
+    brotli,
+    zstandard,
+)
+
+LEVELS = {
+    "gzip": (1, 4, 6, 9),
+    "br": (1, 4, 6, 11),
+    "zstd": (1, 3, 6, 12),
+}
+
+
+def note_page(dataset: SyntheticDataset, size: int) -> bytes:
+    """Serializa una página con la forma de `NoteListResponse`."""
+    users = {row["id"]: row for row in dataset.users("x")}
+    categories = {row["id"]: row for row in dataset.categories()}
+    notes, links, _ = dataset.note_graph(size)
+    owners: Dict[str, List[str]] = {}
+    for link in links:
+        owners.setdefault(link["note_id"], []).append(link["user_id"])
+
+    def user(user_id: str) -> Dict[str, Any]:
+        row = users[user_id]
+        return {
+            key: row[key]
+            for key in ("id", "username", "email", "full_name", "is_active")
+        } | {"is_admin": row["is_admin"], "createdAt": row["createdAt"]}
+
+    data = [
+        {
+            **note,
+            "updatedAt": None,
+            "category": categories.get(note["category_id"]),
+            "users": [user(user_id) for user_id in owners[note["id"]]],
+        }
+        for note in notes
+    ]
+    payload = {"data": data, "metadata": {"total": size, "skip": 0, "limit": size}}
+    return json.dumps(payload, default=str).encode()
+
+
+def decompressor(encoding: str) -> Callable[[bytes], bytes]:
+    if encoding == "zstd":
+        return (
+            lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        )
+    if encoding == "br":
+        return brotli.decompress
+    return lambda data: zlib.decompress(data, 31)
+
+
+def measure(
+    encoding: str, level: int, body: bytes, repeat: int
+) -> Tuple[int, float, float]:
+    """Devuelve (bytes comprimidos, ms de compresión, ms de descompresión)."""
+    middleware = CompressionMiddleware(
+        None, gzip_level=level, brotli_quality=level, zstd_level=level
+    )
+    decompress = decompressor(encoding)
+    compress_times, decompress_times = [], []
+    for _ in range(repeat):
+        compress, flush = middleware.compressor(encoding)
+        start = time.perf_counter()
+        data = compress(body) + flush()
+        compress_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        assert decompress(data) == body
+        decompress_times.append(time.perf_counter() - start)
+    return (
+        len(data),
+        statistics.median(compress_times) * 1000,
+        statistics.median(decompress_times) * 1000,
+    )
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[20, 100, 500])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    args = parse_args(argv)
+    print(
+        f"{'notas':>6} {'codif.':>6} {'nivel':>5} {'bytes':>10} {'ratio':>6} "
+        f"{'comp. ms':>9} {'MB/s':>7} {'desc. ms':>9}"
+    )
+    for size in args.page_sizes:
+        config = SeedConfig(users=200, categories=20, seed=args.seed)
+        body = note_page(SyntheticDataset(config), size)
+        print(f"{size:>6} {'-':>6} {'-':>5} {len(body):>10} {1:>6.2f}")
+        for encoding, levels in LEVELS.items():
+            if encoding not in AVAILABLE_ENCODINGS:
+                continue
+            for level in levels:
+                compressed, comp_ms, decomp_ms = measure(
+                    encoding, level, body, args.repeat
+                )
+                throughput = len(body) / 1e6 / (comp_ms / 1000)
+                print(
+                    f"{size:>6} {encoding:>6} {level:>5} {compressed:>10} "
+                    f"{len(body) / compressed:>6.2f} {comp_ms:>9.2f} "
+                    f"{throughput:>7.1f} {decomp_ms:>9.2f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
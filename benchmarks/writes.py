@@ -0,0 +1,140 @@
+"""
+Rendimiento de escritura en SQLite con y sin la cola de escritura.
+
+Para cada número de escritores concurrentes inserta notas en una base de datos
+temporal de dos formas: cada hilo con su sesión y su commit (como las rutas sin
+`DB_WRITE_QUEUE`) o a través de `WriteQueue` con commit agrupado. Mide notas
+por segundo, latencia p50/p99, errores ("database is locked") y commits.
+
+Uso:
+    python -m benchmarks.writes --writers 1 16 64 --writes 200
+"""
+
+import argparse
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.config.writer import WriteQueue
+from app.models.base import Base
+from app.models.categories import Category  # noqa: F401
+from app.models.notes import Notes
+from app.models.tokens import RevokedToken  # noqa: F401
+from app.models.users import User  # noqa: F401
+
+CONTENT = "Contenido de una nota de prueba. " * 20
+
+
+def insert_note(db: Session) -> str:
+    note = Notes(title="benchmark", content=CONTENT, published=False)
+    db.add(note)
+    db.flush()
+    return note.id
+
+
+def direct_writer(url: str) -> Tuple[Callable[[], None], Callable[[], int]]:
+    """Cada escritura abre su sesión en un engine compartido y hace commit."""
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "timeout": 5},
+        pool_size=64,
+        max_overflow=0,
+    )
+    commits = [0]
+    lock = threading.Lock()
+
+    @event.listens_for(engine, "commit")
+    def count_commit(_: object) -> None:
+        with lock:
+            commits[0] += 1
+
+    session_factory = sessionmaker(bind=engine, autoflush=False)
+
+    def write() -> None:
+        with session_factory() as db:
+            insert_note(db)
+            db.commit()
+
+    return write, lambda: commits[0]
+
+
+def run(
+    writers: int, writes: int, write: Callable[[], None]
+) -> Tuple[float, List[float], int]:
+    """Lanza `writers` hilos con `writes` escrituras: (segundos, latencias, errores)."""
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker() -> None:
+        for _ in range(writes):
+            start = time.perf_counter()
+            try:
+                write()
+            except OperationalError:
+                with lock:
+                    errors[0] += 1
+                continue
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=writers) as pool:
+        for _ in range(writers):
+            pool.submit(worker)
+    return time.perf_counter() - start, latencies, errors[0]
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--writers", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument(
+        "--writes", type=int, default=200, help="escrituras por escritor"
+    )
+    parser.add_argument("--max-batch", type=int, default=64)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    args = parse_args(argv)
+    print(
+        f"{'escrit.':>7} {'modo':>6} {'notas/s':>9} {'p50 ms':>8} {'p99 ms':>8} "
+        f"{'errores':>8} {'commits':>8}"
+    )
+    for writers in args.writers:
+        for mode in ("direct", "queue"):
+            with tempfile.TemporaryDirectory() as tmp:
+                url = f"sqlite:///{Path(tmp) / 'bench.db'}"
+                Base.metadata.create_all(create_engine(url))
+                if mode == "queue":
+                    queue = WriteQueue(url, max_batch=args.max_batch)
+                    queue.start()
+                    elapsed, latencies, errors = run(
+                        writers, args.writes, lambda: queue.run(insert_note)
+                    )
+                    queue.stop()
+                    commits = queue.commits
+                else:
+                    write, commit_count = direct_writer(url)
+                    elapsed, latencies, errors = run(writers, args.writes, write)
+                    commits = commit_count()
+            latencies.sort()
+            p50 = statistics.median(latencies) * 1000 if latencies else 0.0
+            p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0.0
+            print(
+                f"{writers:>7} {mode:>6} {len(latencies) / elapsed:>9.0f} "
+                f"{p50:>8.2f} {p99:>8.2f} {errors:>8} {commits:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
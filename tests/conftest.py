@@ -0,0 +1,50 @@
+import os
+import tempfile
+
+# Las pruebas corren en modo estricto: una carga implícita de una relación
+# falla en lugar de lanzar una consulta oculta
+os.environ.setdefault("ORM_STRICT_LOADING", "raise")
+# Los adjuntos se guardan en memoria, no en UPLOAD_DIR
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+# Las subidas reanudables escriben sus fragmentos en un directorio temporal
+os.environ.setdefault("UPLOAD_STAGING_DIR", tempfile.mkdtemp(prefix="staging-"))
+
+import uuid  # noqa: E402
+from typing import Callable, Dict, Tuple  # noqa: E402
+
+import pytest  # noqa: E402
+
+from app.auth.jwt import create_access_token, get_password_hash  # noqa: E402
+from app.config.database import SessionLocal  # noqa: E402
+
+# Todos los modelos registrados para que SQLAlchemy resuelva las relaciones
+from app.models.categories import Category  # noqa: E402, F401
+from app.models.notes import Notes  # noqa: E402, F401
+from app.models.tokens import RevokedToken  # noqa: E402, F401
+from app.models.users import User  # noqa: E402
+
+UserHeaders = Callable[[], Tuple[str, Dict[str, str]]]
+
+
+@pytest.fixture
+def user_headers() -> UserHeaders:
+    """Crea usuarios activos; cada llamada devuelve su id y su cabecera Bearer."""
+
+    def create() -> Tuple[str, Dict[str, str]]:
+        username = f"user_{uuid.uuid4().hex[:8]}"
+        with SessionLocal() as db:
+            user = User(
+                username=username,
+                email=f"{username}@example.com",
+                hashed_password=get_password_hash("password123"),
+                full_name="Test User",
+                is_active=True,
+                is_admin=False,
+            )
+            db.add(user)
+            db.commit()
+            db.refresh(user)
+        token = create_access_token(data={}, user=user)
+        return user.id, {"Authorization": f"Bearer {token}"}
+
+    return create
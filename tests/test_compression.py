@@ -0,0 +1,132 @@
+import zlib
+from typing import Optional
+
+import pytest
+from fastapi import FastAPI, Header
+from fastapi.responses import (
+    JSONResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
+from fastapi.testclient import TestClient
+
+from app.middleware.compression import (
+    AVAILABLE_ENCODINGS,
+    CompressionMiddleware,
+    encoded_etag,
+    negotiate_encoding,
+)
+
+BIG = {
+    "data": [{"title": f"nota {i}", "content": "contenido " * 20} for i in range(50)]
+}
+
+
+@pytest.fixture
+def client() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+
+    @app.get("/big")
+    def big() -> dict:
+        return BIG
+
+    @app.get("/versioned")
+    def versioned(if_match: Optional[str] = Header(None)) -> JSONResponse:
+        return JSONResponse({**BIG, "if_match": if_match}, headers={"ETag": '"3"'})
+
+    @app.get("/small")
+    def small() -> dict:
+        return {"ok": True}
+
+    @app.get("/image")
+    def image() -> Response:
+        return Response(b"\x89PNG" + b"\x00" * 5000, media_type="image/png")
+
+    @app.get("/stream")
+    def stream() -> StreamingResponse:
+        lines = (f'{{"line": {i}}}\n'.encode() for i in range(2000))
+        return StreamingResponse(lines, media_type="application/x-ndjson")
+
+    @app.get("/events")
+    def events() -> PlainTextResponse:
+        return PlainTextResponse("x" * 5000, media_type="text/event-stream")
+
+    return TestClient(app)
+
+
+def test_negotiate_encoding_weights_and_preference() -> None:
+    order = ["zstd", "br", "gzip"]
+    assert negotiate_encoding("gzip, deflate, br, zstd", order) == "zstd"
+    assert negotiate_encoding("gzip;q=1.0, br;q=0.5", order) == "gzip"
+    assert negotiate_encoding("br;q=0, gzip;q=0.1", order) == "gzip"
+    assert negotiate_encoding("*;q=0.5, zstd;q=0", order) == "br"
+    assert negotiate_encoding("identity", order) is None
+
+
+def test_gzip_compresses_large_json(client: TestClient) -> None:
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.json() == BIG
+    raw_length = int(response.headers["content-length"])
+    assert raw_length < len(response.content) / 5
+
+
+@pytest.mark.parametrize("encoding", sorted(AVAILABLE_ENCODINGS))
+def test_every_available_encoding_round_trips(
+    client: TestClient, encoding: str
+) -> None:
+    response = client.get("/big", headers={"Accept-Encoding": encoding})
+    assert response.headers["content-encoding"] == encoding
+    assert response.json() == BIG
+
+
+def test_small_and_binary_bodies_are_not_compressed(client: TestClient) -> None:
+    headers = {"Accept-Encoding": "gzip"}
+    small = client.get("/small", headers=headers)
+    assert "content-encoding" not in small.headers
+    assert small.json() == {"ok": True}
+
+    image = client.get("/image", headers=headers)
+    assert "content-encoding" not in image.headers
+    assert "vary" not in image.headers
+    assert len(image.content) == 5004
+
+    events = client.get("/events", headers=headers)
+    assert "content-encoding" not in events.headers
+
+
+def test_streaming_body_is_compressed_incrementally(client: TestClient) -> None:
+    with client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as r:
+        assert r.headers["content-encoding"] == "gzip"
+        assert "content-length" not in r.headers
+        raw = b"".join(r.iter_raw())
+    lines = zlib.decompress(raw, 31).decode().splitlines()
+    assert len(lines) == 2000
+    assert lines[-1] == '{"line": 1999}'
+
+
+def test_no_accept_encoding_passes_through(client: TestClient) -> None:
+    response = client.get("/big", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.json() == BIG
+    # También sin comprimir: una caché no debe servirla a quien acepta gzip
+    assert "Accept-Encoding" in response.headers["vary"]
+
+
+def test_compressed_etag_gets_encoding_suffix(client: TestClient) -> None:
+    plain = client.get("/versioned", headers={"Accept-Encoding": "identity"})
+    assert plain.headers["etag"] == '"3"'
+    assert "Accept-Encoding" in plain.headers["vary"]
+
+    response = client.get("/versioned", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["etag"] == '"3-gzip"'
+    # La ruta recibe la ETag original en las cabeceras condicionales
+    response = client.get(
+        "/versioned",
+        headers={"Accept-Encoding": "gzip", "If-Match": '"3-gzip", "4-br"'},
+    )
+    assert response.json()["if_match"] == '"3", "4"'
+    assert encoded_etag('W/"3"', "gzip") == 'W/"3"'
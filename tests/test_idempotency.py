@@ -0,0 +1,218 @@
+import uuid
+from typing import List, Tuple
+
+import anyio
+import httpx
+from fastapi import status
+from fastapi.testclient import TestClient
+from starlette.types import Receive, Scope, Send
+
+from app.config.settings import settings
+from app.main import app
+from app.middleware.idempotency import IdempotencyMiddleware, ResponseStore
+from tests.conftest import UserHeaders
+
+NOTES_URL = f"{settings.API_PREFIX}/notes"
+USERS_URL = f"{settings.API_PREFIX}/users"
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_response_store_ttl_and_table_fallback() -> None:
+    clock = FakeClock()
+    store = ResponseStore(ttl=60, cache_size=1, clock=clock)
+    key = uuid.uuid4().hex
+    headers = [("content-type", "application/json"), ("etag", '"1"')]
+    store.save(key, 201, headers, b'{"ok":true}')
+    assert store.cached(key).body == b'{"ok":true}'
+
+    # Otro proceso (caché vacía) la encuentra en la tabla
+    other = ResponseStore(ttl=60, clock=clock)
+    assert other.cached(key) is None
+    assert other.get(key).status_code == 201
+    assert other.get(key).headers == headers
+
+    clock.now += 61
+    assert store.get(key) is None
+    assert ResponseStore(ttl=60, clock=clock).get(key) is None
+
+
+def test_idempotent_note_creation_replays_response(user_headers: UserHeaders) -> None:
+    client = TestClient(app)
+    _, headers = user_headers()
+    headers["Idempotency-Key"] = uuid.uuid4().hex
+    body = {"title": "Reintento", "content": "Una sola vez"}
+
+    first = client.post(NOTES_URL, json=body, headers=headers)
+    assert first.status_code == status.HTTP_201_CREATED
+    assert "idempotent-replayed" not in first.headers
+    # Las respuestas que genera el middleware también llevan las cabeceras CORS
+    origin = "https://app.example.com"
+    replay = client.post(NOTES_URL, json=body, headers={**headers, "Origin": origin})
+    assert replay.status_code == status.HTTP_201_CREATED
+    assert "access-control-allow-origin" in replay.headers
+    assert replay.headers["idempotent-replayed"] == "true"
+    assert replay.json() == first.json()
+    # Con sus cabeceras: la ETag sirve para el If-Match de la edición
+    assert replay.headers["etag"] == first.headers["etag"]
+
+    # Otro cuerpo con la misma clave es otra petición
+    other = client.post(NOTES_URL, json={**body, "title": "Otra"}, headers=headers)
+    assert other.json()["data"]["id"] != first.json()["data"]["id"]
+
+    response = client.get(NOTES_URL, headers=headers)
+    assert response.json()["metadata"]["total_items"] == 2
+
+    response = client.post(
+        NOTES_URL,
+        json=body,
+        headers={**headers, "Idempotency-Key": "", "Origin": origin},
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "access-control-allow-origin" in response.headers
+
+
+def test_revoked_token_does_not_replay(user_headers: UserHeaders) -> None:
+    client = TestClient(app)
+    _, headers = user_headers()
+    headers["Idempotency-Key"] = uuid.uuid4().hex
+    body = {"title": "Antes del logout", "content": "x"}
+    assert client.post(NOTES_URL, json=body, headers=headers).status_code == (
+        status.HTTP_201_CREATED
+    )
+
+    client.post(f"{settings.API_PREFIX}/auth/logout", headers=headers)
+    response = client.post(NOTES_URL, json=body, headers=headers)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert "idempotent-replayed" not in response.headers
+
+
+def test_idempotent_attachment_upload(user_headers: UserHeaders) -> None:
+    client = TestClient(app)
+    _, headers = user_headers()
+    note_id = client.post(
+        NOTES_URL, json={"title": "Adjuntos", "content": "x"}, headers=headers
+    ).json()["data"]["id"]
+    headers["Idempotency-Key"] = uuid.uuid4().hex
+    files = {"file": ("datos.txt", b"contenido", "text/plain")}
+    boundary = {"Content-Type": "multipart/form-data; boundary=fijo"}
+    first = client.post(
+        f"{NOTES_URL}/{note_id}/attachments",
+        files=files,
+        headers={**headers, **boundary},
+    )
+    replay = client.post(
+        f"{NOTES_URL}/{note_id}/attachments",
+        files=files,
+        headers={**headers, **boundary},
+    )
+    assert first.status_code == status.HTTP_200_OK
+    assert replay.headers["idempotent-replayed"] == "true"
+    assert replay.json()["data"]["id"] == first.json()["data"]["id"]
+    response = client.get(f"{NOTES_URL}/{note_id}/attachments", headers=headers)
+    assert len(response.json()["data"]) == 1
+
+
+def test_concurrent_duplicates_wait_for_inflight_request() -> None:
+    username = f"idem_{uuid.uuid4().hex[:8]}"
+    body = {
+        "username": username,
+        "email": f"{username}@example.com",
+        "password": "password123",
+        "full_name": "Concurrent User",
+    }
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+    responses: List[httpx.Response] = []
+
+    async def post(client: httpx.AsyncClient) -> None:
+        responses.append(await client.post(USERS_URL, json=body, headers=headers))
+
+    async def main() -> None:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            async with anyio.create_task_group() as tg:
+                for _ in range(3):
+                    tg.start_soon(post, client)
+
+    anyio.run(main)
+    assert [r.status_code for r in responses] == [status.HTTP_201_CREATED] * 3
+    assert len({r.json()["data"]["id"] for r in responses}) == 1
+    assert sum("idempotent-replayed" in r.headers for r in responses) == 2
+
+
+def _post_twice(
+    responses: List[Tuple[int, bytes]], max_response_bytes: int = 1024
+) -> Tuple[List[httpx.Response], int]:
+    """Envía la misma petición tantas veces como respuestas programadas."""
+    calls = 0
+
+    async def endpoint(scope: Scope, receive: Receive, send: Send) -> None:
+        nonlocal calls
+        status_code, body = responses[calls]
+        calls += 1
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status_code,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"etag", b'"7"'),
+                    (b"set-cookie", b"db_primary_until=123; Path=/"),
+                    (b"connection", b"close"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    middleware = IdempotencyMiddleware(
+        endpoint,
+        paths=["/things"],
+        store=ResponseStore(ttl=60),
+        max_response_bytes=max_response_bytes,
+    )
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+    received: List[httpx.Response] = []
+
+    async def main() -> None:
+        transport = httpx.ASGITransport(app=middleware)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://t"
+        ) as client:
+            for _ in responses:
+                received.append(await client.post("/things", json={}, headers=headers))
+
+    anyio.run(main)
+    return received, calls
+
+
+def test_only_deterministic_responses_are_stored() -> None:
+    # Una cuota agotada puede liberarse y un 400 puede depender del estado
+    # (una categoría que aún no existe): el reintento vuelve a ejecutar la ruta
+    responses, calls = _post_twice(
+        [(413, b"{}"), (400, b"{}"), (201, b'{"id":1}'), (500, b"{}")]
+    )
+    assert calls == 3
+    assert [r.status_code for r in responses] == [413, 400, 201, 201]
+    replay = responses[3]
+    assert replay.headers["idempotent-replayed"] == "true"
+    assert replay.headers["etag"] == '"7"'
+    assert replay.headers["set-cookie"] == "db_primary_until=123; Path=/"
+    assert "connection" not in replay.headers
+
+
+def test_oversized_response_replays_conflict() -> None:
+    responses, calls = _post_twice(
+        [(201, b'{"id":"' + b"x" * 100 + b'"}'), (201, b"{}")], max_response_bytes=10
+    )
+    assert calls == 1
+    assert responses[0].status_code == status.HTTP_201_CREATED
+    assert responses[1].status_code == status.HTTP_409_CONFLICT
+    assert responses[1].headers["idempotent-replayed"] == "true"
@@ -1,23 +1,42 @@
+import csv
 import io
-import os
-import tempfile
+import json
+import logging
 import uuid
-from typing import Any, Dict, Generator
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Generator, List
 
+import anyio
 import pytest
-from fastapi import status  # Asegúrate de importar status
+from fastapi import HTTPException, status  # Asegúrate de importar status
 from fastapi.testclient import TestClient
-from sqlalchemy.orm import Session
-
-from app.auth.jwt import create_access_token, get_password_hash
+from sqlalchemy import event, func, select, update
+from sqlalchemy.exc import IntegrityError, InvalidRequestError
+from sqlalchemy.orm import Session, lazyload, selectinload
+from sqlalchemy.orm.exc import StaleDataError
+
+from app import controllers
+from app.auth.jwt import (
+    calibrate_bcrypt_rounds,
+    create_access_token,
+    get_password_hash,
+    pwd_context,
+)
 from app.config.database import (  # Importar SessionLocal y engine
     SessionLocal,
+    engine,
     get_db,
+    log_lazy_load,
 )
+from app.config.settings import settings
+from app.helpers.leases import acquire_lease
+from app.helpers.notes_io import iter_text_lines
+from app.helpers.purge import purge_notes, purge_users
 from app.main import app
 from app.models.categories import Category
-from app.models.notes import Attachment, Notes
-from app.models.users import User
+from app.models.notes import PREVIEW_LENGTH, Attachment, Notes
+from app.models.users import User, UserNotes
+from app.storage import storage
 
 
 @pytest.fixture
@@ -107,13 +126,13 @@ def other_normal_user(db_session: Session) -> User:
 @pytest.fixture(scope="function")
 def normal_user_token(normal_user: User) -> str:
     """Genera un token JWT para el usuario normal."""
-    return create_access_token(data={"sub": normal_user.username})
+    return create_access_token(data={}, user=normal_user)
 
 
 @pytest.fixture(scope="function")
 def admin_user_token(admin_user: User) -> str:
     """Genera un token JWT para el usuario administrador."""
-    return create_access_token(data={"sub": admin_user.username})
+    return create_access_token(data={}, user=admin_user)
 
 
 @pytest.fixture(scope="function")
@@ -147,10 +166,9 @@ def test_note(db_session: Session, normal_user: User, test_category: Category) -
         content="This is a test note content",
         published=True,
         category_id=test_category.id,
+        users=[normal_user],  # Asociar con el usuario antes de persistir
     )
     db_session.add(note)
-    db_session.flush()  # Para obtener el ID antes de la relación
-    note.users.append(normal_user)  # Asociar con el usuario
     db_session.commit()
     db_session.refresh(note)
     return note
@@ -188,6 +206,93 @@ def test_login_invalid_credentials(client: TestClient, normal_user: User) -> Non
     assert response.status_code == status.HTTP_401_UNAUTHORIZED
 
 
+def test_logout_revokes_token(
+    client: TestClient, normal_headers: Dict[str, str], normal_user: User
+) -> None:
+    """Prueba que el token deje de ser válido tras cerrar sesión."""
+    other_token = create_access_token(data={}, user=normal_user)
+    response = client.post("/api/v1/auth/logout", headers=normal_headers)
+    assert response.status_code == status.HTTP_200_OK
+
+    response = client.get("/api/v1/users/me", headers=normal_headers)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    # Otros tokens del mismo usuario siguen siendo válidos
+    response = client.get(
+        "/api/v1/users/me", headers={"Authorization": f"Bearer {other_token}"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_login_rate_limited(
+    client: TestClient, normal_user: User, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Prueba que el login se limite antes de verificar la contraseña."""
+    from app.auth.ratelimit import InMemoryRateLimitBackend, login_rate_limiter
+
+    monkeypatch.setattr(login_rate_limiter, "backend", InMemoryRateLimitBackend())
+    monkeypatch.setattr(login_rate_limiter, "max_failures", 2)
+    for _ in range(2):
+        response = client.post(
+            "/api/v1/auth/token",
+            data={"username": normal_user.username, "password": "wrongpassword"},
+        )
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    # Bloqueado incluso con la contraseña correcta
+    response = client.post(
+        "/api/v1/auth/token",
+        data={"username": normal_user.username, "password": "password123"},
+    )
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert int(response.headers["Retry-After"]) > 0
+
+
+def test_login_rehashes_outdated_password(
+    client: TestClient, db_session: Session
+) -> None:
+    """Prueba que un hash con coste antiguo se actualice tras el login."""
+    username = f"legacy_{uuid.uuid4().hex[:8]}"
+    old_hash = pwd_context.handler("bcrypt").using(rounds=4).hash("password123")
+    user = User(
+        username=username,
+        email=f"{username}@example.com",
+        hashed_password=old_hash,
+    )
+    db_session.add(user)
+    db_session.commit()
+
+    response = client.post(
+        "/api/v1/auth/token",
+        data={"username": username, "password": "password123"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    db_session.refresh(user)
+    assert user.hashed_password != old_hash
+    assert not pwd_context.needs_update(user.hashed_password)
+    assert pwd_context.verify("password123", user.hashed_password)
+
+
+def test_calibrate_bcrypt_rounds() -> None:
+    """Prueba que la calibración respete los límites de coste."""
+    assert calibrate_bcrypt_rounds(0, min_rounds=4, max_rounds=8) == 4
+    assert calibrate_bcrypt_rounds(10**9, min_rounds=4, max_rounds=6) == 6
+
+
+def test_password_hash_metrics_admin(
+    client: TestClient, admin_headers: Dict[str, str]
+) -> None:
+    """Prueba la distribución de costes de hash (como admin)."""
+    response = client.get(
+        "/api/v1/users/metrics/password-hashes", headers=admin_headers
+    )
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()["data"]
+    rounds = str(data["current_rounds"])
+    assert data["users_by_rounds"][rounds] >= 1
+
+
 # Tests para usuarios
 def test_create_user(client: TestClient) -> None:
     """Prueba la creación de un usuario."""
@@ -306,6 +411,141 @@ def test_update_user_admin(
     assert data["is_active"] is False
 
 
+def test_password_change_revokes_tokens(
+    client: TestClient, normal_headers: Dict[str, str]
+) -> None:
+    """Prueba que cambiar la contraseña invalide los tokens emitidos."""
+    response = client.put(
+        "/api/v1/users/me", headers=normal_headers, json={"password": "newpass123"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    response = client.get("/api/v1/users/me", headers=normal_headers)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_deactivation_revokes_tokens(
+    client: TestClient,
+    admin_headers: Dict[str, str],
+    normal_headers: Dict[str, str],
+    normal_user: User,
+) -> None:
+    """Prueba que desactivar un usuario invalide sus tokens."""
+    response = client.get("/api/v1/notes", headers=normal_headers)
+    assert response.status_code == status.HTTP_200_OK
+
+    response = client.put(
+        f"/api/v1/users/{normal_user.id}",
+        headers=admin_headers,
+        json={"is_active": False},
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    response = client.get("/api/v1/notes", headers=normal_headers)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_self_update_cannot_change_role_or_status(
+    client: TestClient, normal_headers: Dict[str, str], normal_user: User
+) -> None:
+    """Prueba que un usuario no pueda hacerse admin ni reactivarse."""
+    response = client.put(
+        "/api/v1/users/me",
+        headers=normal_headers,
+        json={"full_name": "Nuevo nombre", "is_admin": True, "is_active": False},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()["data"]
+    assert data["full_name"] == "Nuevo nombre"
+    assert data["is_admin"] is False
+    assert data["is_active"] is True
+    # Nada relevante para la autorización cambió: el token sigue valiendo
+    response = client.get("/api/v1/notes", headers=normal_headers)
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_delete_user_bumps_token_version(
+    client: TestClient,
+    db_session: Session,
+    admin_headers: Dict[str, str],
+    normal_user: User,
+) -> None:
+    """Prueba que borrar un usuario invalide sus tokens en todos los workers."""
+    version, user_id = normal_user.token_version, normal_user.id
+    response = client.delete(f"/api/v1/users/{user_id}", headers=admin_headers)
+    assert response.status_code == status.HTTP_200_OK
+    stored = db_session.scalar(
+        select(User.token_version)
+        .where(User.id == user_id)
+        .execution_options(include_deleted=True)
+    )
+    assert stored == version + 1
+
+
+def test_failed_update_keeps_tokens(
+    client: TestClient,
+    admin_headers: Dict[str, str],
+    normal_headers: Dict[str, str],
+    normal_user: User,
+    admin_user: User,
+) -> None:
+    """Prueba que un cambio que no llega a guardarse no invalide los tokens."""
+    with pytest.raises(IntegrityError):
+        client.put(
+            f"/api/v1/users/{normal_user.id}",
+            headers=admin_headers,
+            json={"is_active": False, "email": admin_user.email},
+        )
+
+    response = client.get("/api/v1/notes", headers=normal_headers)
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_claims_authorize_without_loading_user(
+    client: TestClient, normal_user: User
+) -> None:
+    """Prueba que los claims del token decidan la autorización."""
+    normal_user.is_active = False
+    token = create_access_token(data={}, user=normal_user)
+    response = client.get(
+        "/api/v1/notes", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_strict_loading_rejects_implicit_loads(
+    db_session: Session, test_note: Notes, caplog: pytest.LogCaptureFixture
+) -> None:
+    """Prueba que las relaciones solo se carguen con loaders explícitos."""
+    note = db_session.query(Notes).filter(Notes.id == test_note.id).one()
+    with pytest.raises(InvalidRequestError):
+        note.users
+
+    note = (
+        db_session.query(Notes)
+        .options(selectinload(Notes.users))
+        .filter(Notes.id == test_note.id)
+        .populate_existing()
+        .one()
+    )
+    assert len(note.users) == 1
+
+    # Modo "warn": la carga implícita se hace pero queda registrada
+    event.listen(db_session, "do_orm_execute", log_lazy_load)
+    try:
+        with caplog.at_level(logging.WARNING, logger="app.config.database"):
+            note = (
+                db_session.query(Notes)
+                .options(lazyload(Notes.attachments))
+                .filter(Notes.id == test_note.id)
+                .one()
+            )
+            assert note.attachments == []
+    finally:
+        event.remove(db_session, "do_orm_execute", log_lazy_load)
+    assert "Notes.attachments" in caplog.text
+
+
 # Tests para categorías
 def test_create_category_admin(
     client: TestClient, admin_headers: Dict[str, str]
@@ -498,6 +738,170 @@ def test_get_all_notes(
     assert any(note["id"] == test_note.id for note in data)
 
 
+def test_get_notes_sparse_fields(
+    client: TestClient, normal_headers: Dict[str, str], test_note: Notes
+) -> None:
+    """Prueba que `fields=` limite los campos devueltos y las columnas leídas."""
+    statements = []
+
+    def capture(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        response = client.get(
+            "/api/v1/notes?fields=title,preview,updatedAt", headers=normal_headers
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    assert response.status_code == status.HTTP_200_OK
+    note = next(n for n in response.json()["data"] if n["id"] == test_note.id)
+    assert set(note) == {"id", "title", "preview", "updatedAt"}
+    assert note["preview"] == test_note.content
+    selects = [sql for sql in statements if "FROM notes" in sql and "LIMIT" in sql]
+    assert selects and all("notes.content" not in sql for sql in selects)
+
+    response = client.get("/api/v1/notes?fields=id,secret", headers=normal_headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_note_preview_follows_content(
+    client: TestClient, normal_headers: Dict[str, str], test_note: Notes
+) -> None:
+    """Prueba que `preview` se recalcule al cambiar el contenido."""
+    content = "x" * (PREVIEW_LENGTH + 50)
+    response = client.put(
+        f"/api/v1/notes/{test_note.id}",
+        headers={**normal_headers, "If-Match": '"1"'},
+        json={"content": content},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["data"]["preview"] == "x" * PREVIEW_LENGTH
+
+
+def test_export_notes_streams_ndjson_and_csv(
+    client: TestClient,
+    db_session: Session,
+    normal_headers: Dict[str, str],
+    normal_user: User,
+    test_note: Notes,
+    test_category: Category,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Prueba la exportación en streaming por lotes, con y sin adjuntos."""
+    monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 2)
+    for i in range(2):
+        note = Notes(title=f"Export {i}", content=f"Contenido, con \"comillas\" {i}")
+        note.users.append(normal_user)
+        db_session.add(note)
+    db_session.add(
+        Attachment(
+            filename="a.txt",
+            file_path="uploads/a.txt",
+            file_size=3,
+            mime_type="text/plain",
+            note_id=test_note.id,
+        )
+    )
+    db_session.commit()
+
+    response = client.get(
+        "/api/v1/notes/export?attachments=true", headers=normal_headers
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 3
+    exported = next(row for row in rows if row["id"] == test_note.id)
+    assert exported["category"] == test_category.name
+    assert [a["filename"] for a in exported["attachments"]] == ["a.txt"]
+
+    response = client.get("/api/v1/notes/export?format=csv", headers=normal_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/csv")
+    records = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(records) == 3
+    assert {r["content"] for r in records} >= {'Contenido, con "comillas" 0'}
+
+
+def test_import_notes_in_batches(
+    client: TestClient,
+    normal_headers: Dict[str, str],
+    test_note: Notes,
+    test_category: Category,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Prueba la importación por lotes con errores por línea."""
+    monkeypatch.setattr(settings, "IMPORT_BATCH_SIZE", 2)
+    lines = [
+        {"title": "Uno", "content": "Primera nota"},
+        {"title": "Dos", "content": "Segunda", "category": test_category.name},
+        {"title": "Tres", "content": "Tercera", "category_id": test_category.id},
+        {"title": "Sin contenido"},
+        {"title": "Cuatro", "content": "x", "category": "No existe"},
+    ]
+    body = "\n".join(json.dumps(line) for line in lines) + "\n{roto\n"
+    response = client.post(
+        "/api/v1/notes/import", headers=normal_headers, content=body.encode()
+    )
+    assert response.status_code == status.HTTP_200_OK
+    report = response.json()["data"]
+    assert report["imported"] == 3
+    assert report["failed"] == 3
+    assert [error["line"] for error in report["errors"]] == [4, 5, 6]
+
+    # La exportación CSV se puede volver a importar tal cual
+    exported = client.get("/api/v1/notes/export?format=csv", headers=normal_headers)
+    response = client.post(
+        "/api/v1/notes/import?format=csv",
+        headers=normal_headers,
+        content=exported.content,
+    )
+    assert response.json()["data"] == {"imported": 4, "failed": 0, "errors": []}
+    response = client.get(
+        "/api/v1/notes?fields=title,category", headers=normal_headers
+    )
+    assert response.json()["metadata"]["total_items"] == 8
+    titles = [n["title"] for n in response.json()["data"] if n["category"]]
+    assert titles.count("Dos") == 2
+
+
+def test_import_rejects_long_lines(
+    client: TestClient,
+    normal_headers: Dict[str, str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Una línea más larga que el límite es un error sin cargarla en memoria."""
+    monkeypatch.setattr(settings, "IMPORT_MAX_LINE_LENGTH", 100)
+    long_line = json.dumps({"title": "Larga", "content": "x" * 1000})
+    body = "\n".join(
+        [json.dumps({"title": "Corta", "content": "x"}), long_line, "{roto"]
+    )
+    response = client.post(
+        "/api/v1/notes/import", headers=normal_headers, content=body.encode()
+    )
+    report = response.json()["data"]
+    assert report["imported"] == 1
+    assert [error["line"] for error in report["errors"]] == [2, 3]
+    assert report["errors"][0]["error"] == "Línea demasiado larga"
+
+    # En CSV el resto del fichero ya no se puede interpretar
+    body = f"title,content\nCorta,x\nLarga,{'x' * 1000}\nOtra,y\n"
+    response = client.post(
+        "/api/v1/notes/import?format=csv",
+        headers=normal_headers,
+        content=body.encode(),
+    )
+    report = response.json()["data"]
+    assert report["imported"] == 1
+    assert [error["line"] for error in report["errors"]] == [3]
+
+
+def test_iter_text_lines_caps_length() -> None:
+    chunks = [b"ab\n", b"x" * 10, b"x" * 10, b"x\ncd", b"\n", b"y" * 11]
+    assert list(iter_text_lines(chunks, 10)) == ["ab\n", None, "cd\n", None]
+
+
 def test_get_specific_note(
     client: TestClient, normal_headers: Dict[str, str], test_note: Notes
 ) -> None:
@@ -525,9 +929,12 @@ def test_update_note(
     """Prueba actualizar una nota."""
     updated_title = "Updated Note Title"
     updated_content = "Updated note content."
+    etag = client.get(
+        f"/api/v1/notes/{test_note.id}", headers=normal_headers
+    ).headers["ETag"]
     response = client.put(
         f"/api/v1/notes/{test_note.id}",
-        headers=normal_headers,
+        headers={**normal_headers, "If-Match": etag},
         json={"title": updated_title, "content": updated_content, "published": False},
     )
     # CORREGIDO: Esperar 200 OK
@@ -536,6 +943,64 @@ def test_update_note(
     assert data["title"] == updated_title
     assert data["content"] == updated_content
     assert data["published"] is False
+    assert response.headers["ETag"] == f'"{data["version"]}"' != etag
+
+
+def test_update_note_requires_current_version(
+    client: TestClient,
+    db_session: Session,
+    normal_headers: Dict[str, str],
+    test_note: Notes,
+) -> None:
+    """Prueba que una actualización con una versión antigua responda 412."""
+    url = f"/api/v1/notes/{test_note.id}"
+    response = client.put(url, headers=normal_headers, json={"title": "Sin If-Match"})
+    assert response.status_code == status.HTTP_428_PRECONDITION_REQUIRED
+
+    headers = {**normal_headers, "If-Match": '"1"'}
+    response = client.put(url, headers=headers, json={"title": "Primera"})
+    assert response.status_code == status.HTTP_200_OK
+    # El segundo cliente editaba sobre la versión 1
+    response = client.put(url, headers=headers, json={"title": "Segunda"})
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+    response = client.put(
+        url, headers={**normal_headers, "If-Match": 'W/"2"'}, json={"title": "Débil"}
+    )
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+    response = client.get(url, headers=normal_headers)
+    assert response.json()["data"]["title"] == "Primera"
+    assert response.headers["ETag"] == '"2"'
+
+
+def test_version_column_rejects_stale_flush(
+    db_session: Session, test_note: Notes
+) -> None:
+    """Un UPDATE sobre una versión ya cambiada por otra sesión falla."""
+    db_session.execute(
+        update(Notes)
+        .where(Notes.id == test_note.id)
+        .values(version=Notes.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    test_note.title = "Sobrescritura"
+    with pytest.raises(StaleDataError):
+        db_session.flush()
+
+
+def test_controller_delete_rejects_stale_version(
+    db_session: Session, normal_user: User
+) -> None:
+    """Un borrado sobre una versión ya cambiada responde 412, no 500."""
+    db_session.execute(
+        update(User)
+        .where(User.id == normal_user.id)
+        .values(version=normal_user.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    with pytest.raises(HTTPException) as exc_info:
+        controllers.users.delete(db=db_session, id=normal_user.id)
+    assert exc_info.value.status_code == status.HTTP_412_PRECONDITION_FAILED
 
 
 def test_share_note(
@@ -569,7 +1034,12 @@ def test_unshare_note(
 ) -> None:
     """Prueba dejar de compartir una nota."""
     # Primero compartir la nota
-    note = db_session.query(Notes).filter(Notes.id == test_note.id).first()
+    note = (
+        db_session.query(Notes)
+        .options(selectinload(Notes.users))
+        .filter(Notes.id == test_note.id)
+        .first()
+    )
     if other_normal_user not in note.users:
         note.users.append(other_normal_user)
         db_session.commit()
@@ -592,6 +1062,48 @@ def test_unshare_note(
     assert get_resp.status_code == status.HTTP_404_NOT_FOUND
 
 
+def test_share_note_with_many_users(
+    client: TestClient,
+    normal_headers: Dict[str, str],
+    normal_user: User,
+    test_note: Notes,
+    other_normal_user: User,
+    admin_user: User,
+) -> None:
+    """Prueba compartir y dejar de compartir con varios usuarios a la vez."""
+    url = f"/api/v1/notes/{test_note.id}"
+    users = [other_normal_user.id, admin_user.username, "nadie", admin_user.id]
+    response = client.post(f"{url}/share", headers=normal_headers, json={"users": users})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["data"] == {
+        "shared": 2,
+        "already_shared": 0,
+        "not_found": ["nadie"],
+    }
+
+    # Repetir la petición no duplica filas
+    response = client.post(f"{url}/share", headers=normal_headers, json={"users": users})
+    assert response.json()["data"]["already_shared"] == 2
+
+    # No se puede dejar la nota sin usuarios
+    everyone = [normal_user.id, other_normal_user.id, admin_user.id]
+    response = client.post(
+        f"{url}/unshare", headers=normal_headers, json={"users": everyone}
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    response = client.post(
+        f"{url}/unshare",
+        headers=normal_headers,
+        json={"users": [other_normal_user.username, admin_user.id]},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["data"] == {"unshared": 2, "not_shared": 0, "not_found": []}
+
+    response = client.delete(f"{url}/share/{normal_user.id}", headers=normal_headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
 def test_delete_note(
     client: TestClient, normal_headers: Dict[str, str], test_note: Notes
 ) -> None:
@@ -604,6 +1116,108 @@ def test_delete_note(
     assert get_response.status_code == status.HTTP_404_NOT_FOUND
 
 
+def test_delete_note_is_soft_until_purged(
+    client: TestClient,
+    db_session: Session,
+    normal_headers: Dict[str, str],
+    test_note: Notes,
+) -> None:
+    """Prueba que borrar una nota solo la marque y que la purga la elimine."""
+    key = f"{uuid.uuid4()}/adjunto.txt"
+    anyio.run(storage.put_bytes, key, b"adjunto")
+    attachment = Attachment(
+        filename="adjunto.txt",
+        file_path=key,
+        file_size=7,
+        mime_type="text/plain",
+        note_id=test_note.id,
+    )
+    db_session.add(attachment)
+    db_session.commit()
+    attachment_id, note_id = attachment.id, test_note.id
+
+    response = client.delete(f"/api/v1/notes/{note_id}", headers=normal_headers)
+    assert response.status_code == status.HTTP_200_OK
+    response = client.get("/api/v1/notes", headers=normal_headers)
+    assert note_id not in [note["id"] for note in response.json()["data"]]
+    response = client.get(
+        f"/api/v1/notes/attachments/{attachment_id}", headers=normal_headers
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    # La fila sigue ahí, oculta, y el archivo no se ha tocado
+    assert db_session.scalar(select(Notes.id).where(Notes.id == note_id)) is None
+    deleted = select(Notes.deletedAt).where(Notes.id == note_id)
+    assert db_session.scalar(deleted.execution_options(include_deleted=True))
+    assert anyio.run(storage.exists, key)
+
+    keys: List[str] = []
+    while purge_notes(db_session, batch_size=10, keys=keys):
+        pass
+    assert db_session.scalar(deleted.execution_options(include_deleted=True)) is None
+    assert not db_session.scalar(
+        select(func.count(UserNotes.id))
+        .where(UserNotes.note_id == note_id)
+        .execution_options(include_deleted=True)
+    )
+    assert key in keys
+
+
+def test_delete_user_purges_only_owned_notes(
+    client: TestClient,
+    db_session: Session,
+    admin_headers: Dict[str, str],
+    normal_headers: Dict[str, str],
+    normal_user: User,
+    other_normal_user: User,
+    test_note: Notes,
+) -> None:
+    """Prueba que purgar un usuario borre sus notas pero no las compartidas."""
+    shared = Notes(
+        title="Compartida", content="x", users=[normal_user, other_normal_user]
+    )
+    db_session.add(shared)
+    db_session.commit()
+    shared_id, owned_id, user_id = shared.id, test_note.id, normal_user.id
+
+    response = client.delete(f"/api/v1/users/{user_id}", headers=admin_headers)
+    assert response.status_code == status.HTTP_200_OK
+    response = client.get("/api/v1/notes", headers=normal_headers)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    while purge_users(db_session, batch_size=1) or purge_notes(
+        db_session, batch_size=10, keys=[]
+    ):
+        pass
+    include_deleted = {"include_deleted": True}
+    remaining = db_session.scalars(
+        select(Notes.id)
+        .where(Notes.id.in_([shared_id, owned_id]))
+        .execution_options(**include_deleted)
+    ).all()
+    assert remaining == [shared_id]
+    assert (
+        db_session.scalar(
+            select(User.id)
+            .where(User.id == user_id)
+            .execution_options(**include_deleted)
+        )
+        is None
+    )
+
+
+def test_purge_lease_elects_one_worker() -> None:
+    """Prueba que el turno de purga lo tenga un solo worker hasta que caduque."""
+    name = f"test-{uuid.uuid4().hex[:8]}"
+    now = datetime.now(timezone.utc)
+    assert acquire_lease(name, 60, holder="a", now=now)
+    assert not acquire_lease(name, 60, holder="b", now=now)
+    # Quien lo tiene lo renueva; al caducar sin renovarlo lo toma otro
+    assert acquire_lease(name, 60, holder="a", now=now + timedelta(seconds=30))
+    assert not acquire_lease(name, 60, holder="b", now=now + timedelta(seconds=80))
+    assert acquire_lease(name, 60, holder="b", now=now + timedelta(seconds=91))
+    assert not acquire_lease(name, 60, holder="a", now=now + timedelta(seconds=92))
+
+
 # Tests para archivos adjuntos
 def test_upload_attachment(
     client: TestClient,
@@ -630,6 +1244,28 @@ def test_upload_attachment(
         os.remove(f"uploads/{data['filename']}")
 
 
+def test_upload_attachment_with_odd_extension(
+    client: TestClient,
+    normal_headers: Dict[str, str],
+    test_note: Notes,
+    db_session: Session,
+) -> None:
+    """Una extensión que no vale como clave se descarta en vez de dar 500."""
+    keys = []
+    for filename in ("informe.a\\b", "informe.txt"):
+        response = client.post(
+            f"/api/v1/notes/{test_note.id}/attachments",
+            headers=normal_headers,
+            files={"file": (filename, b"datos", "text/plain")},
+        )
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()["data"]
+        assert data["filename"] == filename
+        keys.append(db_session.get(Attachment, data["id"]).file_path)
+    assert "." not in keys[0].rsplit("/", 1)[1]
+    assert keys[1].endswith(".txt")
+
+
 def test_get_attachments(
     client: TestClient,
     normal_headers: Dict[str, str],
@@ -659,6 +1295,53 @@ def test_get_attachments(
     assert data[0]["filename"] == "attach1.txt"
 
 
+def test_get_attachment_access_in_one_query(
+    client: TestClient,
+    normal_headers: Dict[str, str],
+    other_normal_user: User,
+    test_note: Notes,
+    db_session: Session,
+) -> None:
+    """Prueba que el acceso a un adjunto se resuelva en una sola consulta."""
+    attachment = Attachment(
+        filename="attach2.txt",
+        file_path="/fake/path2.txt",
+        file_size=100,
+        mime_type="text/plain",
+        note_id=test_note.id,
+    )
+    db_session.add(attachment)
+    db_session.commit()
+    attachment_id = attachment.id
+    statements = []
+
+    def capture(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        response = client.get(
+            f"/api/v1/notes/attachments/{attachment_id}", headers=normal_headers
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["data"]["filename"] == "attach2.txt"
+    assert len([sql for sql in statements if "FROM attachment" in sql]) == 1
+    assert not [sql for sql in statements if "FROM notes" in sql]
+
+    other_token = create_access_token(data={}, user=other_normal_user)
+    response = client.get(
+        f"/api/v1/notes/attachments/{attachment_id}",
+        headers={"Authorization": f"Bearer {other_token}"},
+    )
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+    response = client.get(
+        f"/api/v1/notes/attachments/{uuid.uuid4()}", headers=normal_headers
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
 def test_delete_attachment(
     client: TestClient,
     normal_headers: Dict[str, str],
@@ -666,16 +1349,15 @@ def test_delete_attachment(
     db_session: Session,
 ) -> None:
     """Prueba eliminar un archivo adjunto."""
-    # Create a temporary file to simulate an actual file
-    with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-        temp_file.write(b"Temporary file content")
-        temp_file_path = temp_file.name
+    # Store an object to simulate an actual file
+    key = f"{uuid.uuid4()}/to_delete.txt"
+    file_size = anyio.run(storage.put_bytes, key, b"Temporary file content")
 
-    # Create an attachment with the temporary file path
+    # Create an attachment with the storage key
     attachment = Attachment(
         filename="to_delete.txt",
-        file_path=temp_file_path,
-        file_size=os.path.getsize(temp_file_path),
+        file_path=key,
+        file_size=file_size,
         mime_type="text/plain",
         note_id=test_note.id,
     )
@@ -692,7 +1374,7 @@ def test_delete_attachment(
     assert response.json()["message"] == "Archivo adjunto eliminado correctamente"
 
     # Verify the file is deleted
-    assert not os.path.exists(temp_file_path)
+    assert not anyio.run(storage.exists, key)
 
     # Verify the attachment no longer exists in the API
     get_response = client.get(
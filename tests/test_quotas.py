@@ -0,0 +1,120 @@
+from typing import Dict, Tuple
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+from app.config.database import SessionLocal
+from app.config.settings import settings
+from app.helpers import quotas
+from app.helpers.quotas import Quota, get_usage, reconcile_usage
+from app.main import app
+from app.models.usage import StorageUsage
+from tests.conftest import UserHeaders
+
+NOTES_URL = f"{settings.API_PREFIX}/notes"
+
+
+def _usage(*owner_ids: str) -> Dict[str, Tuple[int, int]]:
+    with SessionLocal() as db:
+        return get_usage(db, *owner_ids)
+
+
+def _upload(client: TestClient, note_id: str, headers: Dict[str, str], size: int):
+    return client.post(
+        f"{NOTES_URL}/{note_id}/attachments",
+        files={"file": ("datos.bin", b"x" * size, "application/octet-stream")},
+        headers=headers,
+    )
+
+
+@pytest.fixture
+def note_quota(monkeypatch: pytest.MonkeyPatch) -> Quota:
+    quota = Quota(max_bytes=100, max_files=2)
+    monkeypatch.setattr(quotas, "NOTE_QUOTA", quota)
+    return quota
+
+
+def test_usage_counters_follow_attachments(
+    note_quota: Quota, user_headers: UserHeaders
+) -> None:
+    client = TestClient(app)
+    user_id, headers = user_headers()
+    note_id = client.post(
+        NOTES_URL, json={"title": "Cuota", "content": "x"}, headers=headers
+    ).json()["data"]["id"]
+
+    first = _upload(client, note_id, headers, 60)
+    assert first.status_code == status.HTTP_200_OK
+    assert _usage(user_id, note_id) == {user_id: (60, 1), note_id: (60, 1)}
+
+    # No cabe en los bytes que quedan: la ruta la rechaza al guardarla
+    response = _upload(client, note_id, headers, 50)
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    assert _usage(note_id)[note_id] == (60, 1)
+
+    assert _upload(client, note_id, headers, 40).status_code == status.HTTP_200_OK
+    # Sin hueco para otro fichero: el middleware responde sin leer el cuerpo
+    response = _upload(client, note_id, headers, 1)
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    assert _usage(note_id)[note_id] == (100, 2)
+
+    client.delete(
+        f"{NOTES_URL}/attachments/{first.json()['data']['id']}", headers=headers
+    )
+    assert _usage(user_id, note_id) == {user_id: (40, 1), note_id: (40, 1)}
+
+    # Un contador desviado se corrige al recalcular
+    with SessionLocal() as db:
+        db.execute(
+            update(StorageUsage)
+            .where(StorageUsage.owner_id == user_id)
+            .values(bytes=999, files=9)
+        )
+        db.commit()
+    reconcile_usage()
+    assert _usage(user_id, note_id) == {user_id: (40, 1), note_id: (40, 1)}
+
+
+def test_oversized_upload_rejected_before_body(
+    note_quota: Quota, user_headers: UserHeaders
+) -> None:
+    client = TestClient(app)
+    _, headers = user_headers()
+    note_id = client.post(
+        NOTES_URL, json={"title": "Grande", "content": "x"}, headers=headers
+    ).json()["data"]["id"]
+
+    response = _upload(client, note_id, headers, 256 * 1024)
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    response = client.get(f"{NOTES_URL}/{note_id}/attachments", headers=headers)
+    assert response.json()["metadata"]["total_items"] == 0
+
+
+def test_idempotent_retry_replays_when_quota_is_full(
+    note_quota: Quota, user_headers: UserHeaders
+) -> None:
+    client = TestClient(app)
+    _, headers = user_headers()
+    note_id = client.post(
+        NOTES_URL, json={"title": "Reintento", "content": "x"}, headers=headers
+    ).json()["data"]["id"]
+    # Mismo boundary: el reintento envía exactamente el mismo cuerpo
+    keyed = {
+        **headers,
+        "Idempotency-Key": "adjunto-1",
+        "Content-Type": "multipart/form-data; boundary=reintento",
+    }
+
+    first = _upload(client, note_id, keyed, 60)
+    assert first.status_code == status.HTTP_200_OK
+    assert _upload(client, note_id, headers, 10).status_code == status.HTTP_200_OK
+    # Ya no cabe otro fichero, pero el reintento recibe la respuesta guardada
+    retry = _upload(client, note_id, keyed, 60)
+    assert retry.status_code == status.HTTP_200_OK
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.json() == first.json()
+    assert _upload(client, note_id, headers, 1).status_code == (
+        status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    )
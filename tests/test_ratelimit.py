@@ -0,0 +1,125 @@
+import pytest
+from fastapi import HTTPException, status
+
+from app.auth.ratelimit import (
+    HashAdmission,
+    InMemoryRateLimitBackend,
+    LoginRateLimiter,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def limiter(clock: FakeClock) -> LoginRateLimiter:
+    limiter = LoginRateLimiter(clock=clock)
+    limiter.enabled = True
+    limiter.username_burst = 3
+    limiter.username_per_minute = 6  # un token cada 10 segundos
+    limiter.ip_burst = 100
+    limiter.ip_per_minute = 600
+    limiter.max_failures = 5
+    limiter.max_ip_failures = 8
+    limiter.failure_window = 60
+    limiter.lockout = 300
+    return limiter
+
+
+def test_token_bucket_burst_and_refill(
+    limiter: LoginRateLimiter, clock: FakeClock
+) -> None:
+    for _ in range(3):
+        limiter.check("alice", "10.0.0.1")
+    with pytest.raises(HTTPException) as exc:
+        limiter.check("alice", "10.0.0.1")
+    assert exc.value.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert exc.value.headers == {"Retry-After": "10"}
+
+    # Otro usuario desde la misma IP no se ve afectado
+    limiter.check("bob", "10.0.0.1")
+
+    clock.now += 10
+    limiter.check("ALICE", "10.0.0.1")
+
+
+def test_lockout_after_failures_in_window(
+    limiter: LoginRateLimiter, clock: FakeClock
+) -> None:
+    limiter.username_burst = 100
+    for _ in range(4):
+        limiter.register_failure("carol", "10.0.0.2")
+    # Los fallos fuera de la ventana deslizante no cuentan
+    clock.now += 61
+    limiter.register_failure("carol", "10.0.0.2")
+    limiter.check("carol", "10.0.0.2")
+
+    for _ in range(4):
+        limiter.register_failure("carol", "10.0.0.2")
+    with pytest.raises(HTTPException) as exc:
+        limiter.check("carol", "10.0.0.3")
+    assert exc.value.headers == {"Retry-After": "300"}
+
+    clock.now += 301
+    limiter.check("carol", "10.0.0.3")
+
+
+def test_ip_lockout_has_its_own_threshold(
+    limiter: LoginRateLimiter, clock: FakeClock
+) -> None:
+    # Fallos de usuarios distintos desde una IP compartida
+    for i in range(7):
+        limiter.register_failure(f"user{i}", "10.0.0.6")
+    limiter.check("erin", "10.0.0.6")
+
+    limiter.register_failure("user7", "10.0.0.6")
+    with pytest.raises(HTTPException) as exc:
+        limiter.check("erin", "10.0.0.6")
+    assert exc.value.headers == {"Retry-After": "300"}
+    limiter.check("erin", "10.0.0.7")
+
+
+def test_success_clears_username_failures(
+    limiter: LoginRateLimiter, clock: FakeClock
+) -> None:
+    for _ in range(4):
+        limiter.register_failure("dave", "10.0.0.4")
+    limiter.register_success("dave", "10.0.0.4")
+    limiter.register_failure("dave", "10.0.0.5")
+    limiter.check("dave", "10.0.0.5")
+
+
+def test_hash_admission_rejects_when_saturated() -> None:
+    admission = HashAdmission(slots=1, timeout=0)
+    with admission.admit():
+        with pytest.raises(HTTPException) as exc:
+            with admission.admit():
+                pass
+    assert exc.value.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    with admission.admit():
+        pass
+
+
+def test_lockouts_are_bounded() -> None:
+    backend = InMemoryRateLimitBackend(max_keys=2)
+    backend.lock("a", until=1_300, now=1_000)
+    backend.lock("b", until=1_310, now=1_010)
+    # Los bloqueos caducados se descartan al registrar otro
+    backend.lock("c", until=1_700, now=1_400)
+    assert list(backend._locks) == ["c"]
+
+    # Por encima de `max_keys` se descarta el más antiguo
+    backend.lock("d", until=1_710, now=1_410)
+    backend.lock("e", until=1_720, now=1_420)
+    assert list(backend._locks) == ["d", "e"]
+    assert backend.locked_until("e", now=1_500) == 1_720
@@ -0,0 +1,125 @@
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, Generator, List
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from app.config import database
+from app.config.database import PRIMARY_UNTIL_HEADER, ReplicaSet, engine
+from app.config.settings import settings
+from app.main import app
+from tests.conftest import UserHeaders
+
+NOTES_URL = f"{settings.API_PREFIX}/notes"
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _replica_set(urls: List[str], clock: FakeClock) -> ReplicaSet:
+    return ReplicaSet(urls, retry_seconds=30, clock=clock)
+
+
+def test_replica_set_round_robin_and_retry(tmp_path: Path) -> None:
+    for name in ("a.db", "b.db"):
+        shutil.copyfile(engine.url.database, tmp_path / name)
+    clock = FakeClock()
+    replicas = _replica_set(
+        [f"sqlite:///{tmp_path}/a.db", f"sqlite:///{tmp_path}/b.db"], clock
+    )
+    first, second = replicas.engines
+    assert [replicas.pick() for _ in range(4)] == [first, second, first, second]
+
+    replicas.mark_down(first)
+    assert [replicas.pick() for _ in range(3)] == [second] * 3
+    # Pasado el intervalo de reintento vuelve a repartirse
+    clock.now = 31
+    assert set(replicas.healthy()) == {first, second}
+
+    replicas.mark_down(first)
+    replicas.mark_down(second)
+    assert replicas.pick() is None
+    replicas.check()
+    assert all(replicas.status().values())
+    replicas.dispose()
+
+
+def test_check_marks_empty_replica_down(tmp_path: Path) -> None:
+    # SQLite crea el fichero al conectar: sin tablas no es una réplica válida
+    replicas = _replica_set([f"sqlite:///{tmp_path}/empty.db"], FakeClock())
+    replicas.check()
+    assert list(replicas.status().values()) == [False]
+    replicas.dispose()
+
+
+@pytest.fixture
+def replica_headers(
+    tmp_path: Path, user_headers: UserHeaders
+) -> Generator[Dict[str, str], None, None]:
+    """Usuario en el primario y una réplica copiada del fichero SQLite."""
+    _, headers = user_headers()
+    replica_file = tmp_path / "replica.db"
+    shutil.copyfile(engine.url.database, replica_file)
+    original = database.replicas
+    database.replicas = _replica_set(
+        [f"sqlite:///{tmp_path}/missing/down.db", f"sqlite:///{replica_file}"],
+        FakeClock(),
+    )
+    yield headers
+    database.replicas.dispose()
+    database.replicas = original
+
+
+def test_reads_go_to_replica_until_write(replica_headers: Dict[str, str]) -> None:
+    headers = replica_headers
+    client = TestClient(app)
+
+    response = client.post(
+        f"{NOTES_URL}/", json={"title": "Primaria", "content": "x"}, headers=headers
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    marker = response.headers[PRIMARY_UNTIL_HEADER]
+    assert client.cookies.get(database.PRIMARY_UNTIL_COOKIE) == marker
+
+    # La cookie de la escritura fuerza leer del primario: la nota se ve
+    response = client.get(f"{NOTES_URL}/", headers=headers)
+    assert response.json()["metadata"]["total_items"] == 1
+
+    # Sin la marca, la lectura va a la réplica, que no tiene la nota
+    client.cookies.clear()
+    response = client.get(f"{NOTES_URL}/", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["metadata"]["total_items"] == 0
+    # La réplica inaccesible quedó marcada como caída
+    assert list(database.replicas.status().values()) == [False, True]
+
+    # La cabecera sirve igual que la cookie a clientes sin cookies
+    response = client.get(
+        f"{NOTES_URL}/", headers={**headers, PRIMARY_UNTIL_HEADER: marker}
+    )
+    assert response.json()["metadata"]["total_items"] == 1
+
+    # Una marca más allá de la ventana no la ha emitido el servidor
+    forged = f"{time.time() + 3600:.3f}"
+    response = client.get(
+        f"{NOTES_URL}/", headers={**headers, PRIMARY_UNTIL_HEADER: forged}
+    )
+    assert response.json()["metadata"]["total_items"] == 0
+
+    # La marca llega también en respuestas que no genera la ruta (errores)
+    response = client.put(
+        f"{NOTES_URL}/no-existe",
+        json={"title": "x", "content": "x"},
+        headers={**headers, "If-Match": '"1"'},
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert PRIMARY_UNTIL_HEADER in response.headers
+    assert client.cookies.get(database.PRIMARY_UNTIL_COOKIE)
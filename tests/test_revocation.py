@@ -0,0 +1,74 @@
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete
+
+from app.auth.revocation import BloomFilter, TokenDenylist
+from app.config.database import SessionLocal
+from app.models.tokens import RevokedToken
+from app.models.users import User  # noqa: F401
+
+
+def test_bloom_filter_has_no_false_negatives() -> None:
+    bloom = BloomFilter(capacity=1_000, error_rate=0.01)
+    keys = [str(uuid.uuid4()) for _ in range(1_000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+
+    others = [str(uuid.uuid4()) for _ in range(10_000)]
+    false_positives = sum(key in bloom for key in others)
+    assert false_positives < 300
+
+
+def test_denylist_expiry_and_prune() -> None:
+    denylist = TokenDenylist(capacity=4)
+    for i in range(10):
+        denylist.add(f"jti-{i}", expires_at=100.0 + i)
+    assert denylist.is_revoked("jti-0", now=50.0)
+    assert not denylist.is_revoked("jti-unknown", now=50.0)
+    # Un token expirado ya no cuenta como revocado aunque siga en memoria
+    assert not denylist.is_revoked("jti-0", now=100.0)
+
+    assert denylist.prune(now=105.0) == 6
+    assert len(denylist) == 4
+    assert denylist.is_revoked("jti-9", now=105.0)
+    assert not denylist.is_revoked("jti-1", now=0.0)
+
+
+def test_denylist_sync_loads_rows_incrementally() -> None:
+    """Revocaciones hechas por otro proceso llegan al sincronizar."""
+    denylist = TokenDenylist()
+    denylist.sync(force=True)
+    expires = datetime.now(timezone.utc) + timedelta(minutes=5)
+    jtis = [str(uuid.uuid4()) for _ in range(3)]
+    with SessionLocal() as db:
+        db.add(RevokedToken(jti=jtis[0], expiresAt=expires))
+        db.commit()
+    assert not denylist.is_revoked(jtis[0])
+    denylist.sync(force=True)
+    assert denylist.is_revoked(jtis[0])
+    assert denylist.is_revoked(jtis[0], now=time.time())
+
+    with SessionLocal() as db:
+        # Una transacción lenta: su `createdAt` es anterior a la última fila
+        # vista, pero se confirma después
+        db.add(
+            RevokedToken(
+                jti=jtis[1],
+                expiresAt=expires,
+                createdAt=datetime.now(timezone.utc) - timedelta(minutes=1),
+            )
+        )
+        db.commit()
+    denylist.sync(force=True)
+    assert denylist.is_revoked(jtis[1])
+
+    with SessionLocal() as db:
+        # Purgar las filas más recientes no hace reutilizar su `seq`
+        db.execute(delete(RevokedToken).where(RevokedToken.jti.in_(jtis[:2])))
+        db.add(RevokedToken(jti=jtis[2], expiresAt=expires))
+        db.commit()
+    denylist.sync(force=True)
+    assert denylist.is_revoked(jtis[2])
@@ -0,0 +1,143 @@
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from sqlalchemy import create_engine, func, select, union_all
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.cli.seed import SeedConfig, seed
+from app.models.base import Base
+from app.models.idempotency import IdempotencyRecord
+from app.models.notes import Attachment, Notes
+from app.models.tokens import RevokedToken
+from app.models.uploads import UploadSession
+from app.models.usage import StorageUsage
+from app.models.users import User, UserNotes
+
+
+def _load(path: Path, config: SeedConfig) -> list:
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    try:
+        totals = seed(config, engine, verbose=False)
+        with engine.connect() as conn:
+            assert conn.scalar(select(func.count()).select_from(Notes)) == 200
+            assert (
+                conn.scalar(select(func.count()).select_from(UserNotes))
+                == totals["usernotes"]
+            )
+            # Todos los usuarios comparten el mismo hash precalculado
+            hashes = conn.scalars(select(User.hashed_password).distinct()).all()
+            assert len(hashes) == 1
+            return conn.execute(
+                select(Notes.id, Notes.title).order_by(Notes.id)
+            ).all()
+    finally:
+        engine.dispose()
+
+
+def test_seed_is_deterministic(tmp_path: Path) -> None:
+    """La misma semilla produce exactamente el mismo dataset."""
+    config = SeedConfig(
+        users=20, notes=200, categories=3, batch_size=64, transaction_size=100
+    )
+    first = _load(tmp_path / "a.db", config)
+    second = _load(tmp_path / "b.db", config)
+    assert first == second
+
+
+def test_seed_restores_previous_pragmas(tmp_path: Path) -> None:
+    """Tras la carga, la base de datos conserva su modo de journal (WAL)."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'wal.db'}", poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    try:
+        with engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA journal_mode = WAL")
+            synchronous = conn.exec_driver_sql("PRAGMA synchronous").scalar()
+        seed(SeedConfig(users=2, notes=5, categories=1), engine, verbose=False)
+        # StaticPool: es la misma conexión que usó la carga
+        with engine.connect() as conn:
+            assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+            assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == synchronous
+            assert conn.exec_driver_sql("PRAGMA locking_mode").scalar() == "normal"
+    finally:
+        engine.dispose()
+
+
+def test_seed_writes_storage_usage(tmp_path: Path) -> None:
+    """Los adjuntos tienen quien los subió y `storageusage` cuadra con ellos."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'usage.db'}")
+    Base.metadata.create_all(engine)
+    try:
+        totals = seed(
+            SeedConfig(users=5, notes=50, categories=1, attachment_ratio=0.5),
+            engine,
+            verbose=False,
+        )
+        with engine.connect() as conn:
+            assert totals["attachment"] > 0
+            assert not conn.scalar(
+                select(func.count())
+                .select_from(Attachment)
+                .where(Attachment.user_id.is_(None))
+            )
+            owners = union_all(
+                select(Attachment.user_id.label("owner_id"), Attachment.file_size),
+                select(Attachment.note_id, Attachment.file_size),
+            ).subquery()
+            expected = conn.execute(
+                select(owners.c.owner_id, func.sum(owners.c.file_size), func.count())
+                .group_by(owners.c.owner_id)
+                .order_by(owners.c.owner_id)
+            ).all()
+            usage = conn.execute(
+                select(
+                    StorageUsage.owner_id, StorageUsage.bytes, StorageUsage.files
+                ).order_by(StorageUsage.owner_id)
+            ).all()
+            assert usage == expected
+            assert totals["storageusage"] == len(usage)
+    finally:
+        engine.dispose()
+
+
+def test_seed_reset_clears_dependent_tables(tmp_path: Path) -> None:
+    """`--reset` también vacía cuotas, subidas, revocaciones e idempotencia."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'reset.db'}")
+    Base.metadata.create_all(engine)
+    config = SeedConfig(users=3, notes=10, categories=1)
+    expires = datetime.now(timezone.utc) + timedelta(hours=1)
+    try:
+        seed(config, engine, verbose=False)
+        with Session(engine) as db:
+            user_id = db.scalars(select(User.id).limit(1)).one()
+            note_id = db.scalars(select(Notes.id).limit(1)).one()
+            db.add_all(
+                [
+                    UploadSession(
+                        user_id=user_id,
+                        note_id=note_id,
+                        filename="a.bin",
+                        mime_type="application/octet-stream",
+                        size=10,
+                        expiresAt=expires,
+                    ),
+                    IdempotencyRecord(
+                        key="k",
+                        status_code=200,
+                        headers=[],
+                        body=b"",
+                        expiresAt=expires,
+                    ),
+                    RevokedToken(jti="jti", user_id=user_id, expiresAt=expires),
+                ]
+            )
+            db.commit()
+
+        seed(config, engine, reset=True, verbose=False)
+        with engine.connect() as conn:
+            for model in (UploadSession, IdempotencyRecord, RevokedToken):
+                assert not conn.scalar(select(func.count()).select_from(model))
+            assert conn.scalar(select(func.count()).select_from(User)) == 3
+    finally:
+        engine.dispose()
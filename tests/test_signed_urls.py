@@ -0,0 +1,85 @@
+import time
+from typing import List
+from urllib.parse import urlsplit
+
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.config.database import engine
+from app.config.settings import settings
+from app.helpers.signed_urls import sign, verify
+from app.main import app
+from tests.conftest import UserHeaders
+
+NOTES_URL = f"{settings.API_PREFIX}/notes"
+FILES_URL = f"{settings.API_PREFIX}/files"
+
+
+def test_signature_covers_every_field() -> None:
+    params = sign("a1", "u1/f.txt", 2_000, "f.txt", "text/plain")
+    fields = ("a1", "u1/f.txt", 2_000, "f.txt", "text/plain")
+    assert verify(*fields, params["signature"], now=1_000)
+    assert not verify(*fields, params["signature"], now=2_000)
+    assert not verify("a2", *fields[1:], params["signature"], now=1_000)
+    assert not verify("a1", "u2/f.txt", *fields[2:], params["signature"], now=1_000)
+    assert not verify(*fields[:4], "text/html", params["signature"], now=1_000)
+
+
+def test_signed_download_skips_auth_and_database(user_headers: UserHeaders) -> None:
+    client = TestClient(app)
+    _, headers = user_headers()
+    note_id = client.post(
+        NOTES_URL, json={"title": "Descargas", "content": "x"}, headers=headers
+    ).json()["data"]["id"]
+    attachment_id = client.post(
+        f"{NOTES_URL}/{note_id}/attachments",
+        files={"file": ("datos.txt", b"contenido firmado", "text/plain")},
+        headers=headers,
+    ).json()["data"]["id"]
+
+    response = client.get(
+        f"{NOTES_URL}/attachments/{attachment_id}/url?expires_in=60", headers=headers
+    )
+    assert response.status_code == status.HTTP_200_OK
+    url = urlsplit(response.json()["data"]["url"])
+    download = f"{url.path}?{url.query}"
+    assert url.path.startswith(f"{FILES_URL}/{attachment_id}/")
+
+    statements: List[str] = []
+
+    def record(conn, cursor, statement, *args) -> None:  # type: ignore[no-untyped-def]
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get(download)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content == b"contenido firmado"
+    assert "datos.txt" in response.headers["content-disposition"]
+    assert statements == []
+
+    response = client.get(download, headers={"Range": "bytes=0-8"})
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert response.content == b"contenido"
+    assert response.headers["content-range"] == "bytes 0-8/17"
+    response = client.get(download, headers={"Range": "bytes=-7"})
+    assert response.content == b"firmado"
+    response = client.get(download, headers={"Range": "bytes=99-"})
+    assert response.status_code == status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+
+    response = client.get(download.replace("signature=", "signature=0"))
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    key = url.path.split(f"{attachment_id}/", 1)[1]
+    expired = sign(attachment_id, key, int(time.time()) - 1, "datos.txt", "text/plain")
+    response = client.get(url.path, params=expired)
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    response = client.get(
+        f"{NOTES_URL}/attachments/{attachment_id}/url?expires_in=999999",
+        headers=headers,
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
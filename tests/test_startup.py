@@ -0,0 +1,93 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from app.config.settings import settings
+from app.main import create_app, server_options
+
+ROOT = Path(__file__).resolve().parent.parent
+# Presupuesto de importación de la aplicación completa (ms); ajustable en CI
+IMPORT_BUDGET_MS = float(os.environ.get("IMPORT_BUDGET_MS", "3000"))
+
+
+def _import_times(code: str) -> List[Tuple[int, str, int]]:
+    """Ejecuta `code` con `-X importtime`: (profundidad, módulo, µs acumulados)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            depth = len(name) - len(name.lstrip())
+            times.append((depth, name.strip(), int(cumulative)))
+    return times
+
+
+def test_import_main_is_lazy() -> None:
+    """`import app.main` no debe cargar FastAPI, SQLAlchemy ni las rutas."""
+    modules = {name for _, name, _ in _import_times("import app.main")}
+    assert "app.main" in modules
+    for heavy in ("fastapi", "sqlalchemy", "app.routes.api", "app.config.database"):
+        assert heavy not in modules
+
+
+def test_import_budget() -> None:
+    """Construir `app.main:app` debe caber en el presupuesto de arranque."""
+    times = _import_times("from app.main import app")
+    top_level = [(name, us) for depth, name, us in times if depth == 1]
+    total_ms = sum(us for _, us in top_level) / 1000
+    slowest = sorted(top_level, key=lambda item: -item[1])[:10]
+    assert total_ms < IMPORT_BUDGET_MS, slowest
+
+
+def test_prebuilt_openapi_schema(tmp_path: Path) -> None:
+    """La aplicación sirve el esquema OpenAPI desde el fichero generado."""
+    schema_file = tmp_path / "openapi.json"
+    schema_file.write_text(json.dumps({"openapi": "3.1.0", "info": {"x": 1}}))
+    app = create_app(
+        settings.model_copy(update={"OPENAPI_SCHEMA_FILE": str(schema_file)})
+    )
+    response = TestClient(app).get("/openapi.json")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["info"] == {"x": 1}
+
+
+def test_lifespan_creates_upload_dir(tmp_path: Path) -> None:
+    upload_dir = tmp_path / "uploads"
+    app = create_app(settings.model_copy(update={"UPLOAD_DIR": str(upload_dir)}))
+    with TestClient(app) as client:
+        assert upload_dir.is_dir()
+        response = client.get("/api/healthchecker")
+        assert response.status_code == status.HTTP_200_OK
+
+
+def test_server_options_from_settings() -> None:
+    """El lanzador de producción toma su configuración de `Settings`."""
+    options = server_options(
+        settings.model_copy(
+            update={
+                "SERVER_WORKERS": None,
+                "SERVER_LOOP": "uvloop",
+                "SERVER_MAX_REQUESTS": 500,
+                "SERVER_LIMIT_CONCURRENCY": 100,
+            }
+        )
+    )
+    assert options["workers"] == (os.cpu_count() or 1)
+    assert options["loop"] in ("uvloop", "asyncio")
+    assert options["limit_max_requests"] == 500
+    assert options["limit_concurrency"] == 100
+    assert options["timeout_graceful_shutdown"] == settings.SERVER_GRACEFUL_TIMEOUT_SECONDS
@@ -0,0 +1,143 @@
+import io
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+import anyio
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.config.database import SessionLocal
+from app.config.settings import settings
+from app.helpers.thumbnails import (
+    THUMBNAIL_SIZES,
+    ImageTooLarge,
+    ThumbnailPool,
+    generate_thumbnails,
+    thumbnail_key,
+    thumbnails,
+)
+from app.main import app
+from app.models.notes import Attachment
+from app.storage import MemoryStorage, storage
+from tests.conftest import UserHeaders
+
+NOTES_URL = f"{settings.API_PREFIX}/notes"
+
+
+def _png(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def test_generate_thumbnails_keeps_aspect_ratio(tmp_path: Path) -> None:
+    source = tmp_path / "foto.png"
+    source.write_bytes(_png(1000, 500))
+    generated = generate_thumbnails(str(source), [64, 256])
+    assert sorted(generated) == [64, 256]
+    with Image.open(io.BytesIO(generated[64])) as thumb:
+        assert thumb.format == "WEBP"
+        assert thumb.size == (64, 32)
+
+
+def test_oversized_images_are_rejected(tmp_path: Path) -> None:
+    source = tmp_path / "grande.png"
+    source.write_bytes(_png(200, 100))
+    with pytest.raises(ImageTooLarge):
+        generate_thumbnails(str(source), [64], max_pixels=200 * 100 - 1)
+
+
+def test_pool_stores_only_missing_thumbnails() -> None:
+    memory = MemoryStorage()
+    pool = ThumbnailPool(memory, workers=1, sizes=(64,))
+    anyio.run(memory.put_bytes, "u1/foto.png", _png(300, 300))
+    try:
+        anyio.run(pool.ensure, "u1/foto.png")
+        assert thumbnail_key("u1/foto.png", 64) == "u1/foto.thumb-64.webp"
+        assert memory.objects["u1/foto.thumb-64.webp"].startswith(b"RIFF")
+
+        # Las existentes no se regeneran
+        memory.objects["u1/foto.thumb-64.webp"] = b"cacheada"
+        anyio.run(pool.ensure, "u1/foto.png")
+        assert memory.objects["u1/foto.thumb-64.webp"] == b"cacheada"
+    finally:
+        pool.shutdown()
+
+
+def test_concurrent_requests_share_one_generation() -> None:
+    memory = MemoryStorage()
+    pool = ThumbnailPool(memory, workers=1, sizes=(64,))
+    sources: List[bytes] = []
+
+    def submit(path: str, sizes: Sequence[int]) -> "Future[Dict[int, bytes]]":
+        with open(path, "rb") as source:
+            sources.append(source.read())
+        future: "Future[Dict[int, bytes]]" = Future()
+        future.set_result({64: b"miniatura"})
+        return future
+
+    pool.submit = submit  # type: ignore[method-assign]
+
+    async def main() -> None:
+        await memory.put_bytes("u1/foto.png", b"original")
+        async with anyio.create_task_group() as tg:
+            for _ in range(3):
+                tg.start_soon(pool.ensure, "u1/foto.png")
+
+    anyio.run(main)
+    # Una sola generación, a partir de una copia en disco del original
+    assert sources == [b"original"]
+    assert memory.objects["u1/foto.thumb-64.webp"] == b"miniatura"
+
+
+def test_thumbnail_endpoint(user_headers: UserHeaders) -> None:
+    client = TestClient(app)
+    _, headers = user_headers()
+    note_id = client.post(
+        NOTES_URL, json={"title": "Fotos", "content": "x"}, headers=headers
+    ).json()["data"]["id"]
+
+    response = client.post(
+        f"{NOTES_URL}/{note_id}/attachments",
+        files={"file": ("foto.png", _png(800, 600), "image/png")},
+        headers=headers,
+    )
+    attachment = response.json()["data"]
+    with SessionLocal() as db:
+        key = db.get(Attachment, attachment["id"]).file_path
+    size = THUMBNAIL_SIZES[0]
+    try:
+        response = client.get(
+            f"{NOTES_URL}/attachments/{attachment['id']}/thumbnail?size={size}",
+            headers=headers,
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"] == "image/webp"
+        assert "immutable" in response.headers["cache-control"]
+        with Image.open(io.BytesIO(response.content)) as thumb:
+            assert max(thumb.size) == size
+
+        response = client.get(
+            f"{NOTES_URL}/attachments/{attachment['id']}/thumbnail?size=13",
+            headers=headers,
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        text = client.post(
+            f"{NOTES_URL}/{note_id}/attachments",
+            files={"file": ("datos.txt", b"contenido", "text/plain")},
+            headers=headers,
+        ).json()["data"]
+        response = client.get(
+            f"{NOTES_URL}/attachments/{text['id']}/thumbnail", headers=headers
+        )
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+        # Al borrar el adjunto se borran también sus miniaturas
+        client.delete(f"{NOTES_URL}/attachments/{attachment['id']}", headers=headers)
+        assert not anyio.run(storage.exists, thumbnail_key(key, size))
+    finally:
+        thumbnails.shutdown()
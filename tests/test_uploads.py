@@ -0,0 +1,313 @@
+import base64
+import hashlib
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Tuple
+
+import anyio
+import pytest
+from fastapi import HTTPException, status
+from fastapi.testclient import TestClient
+
+from app.config.database import SessionLocal
+from app.config.settings import settings
+from app.helpers import quotas, uploads
+from app.helpers.quotas import Quota, get_usage
+from app.helpers.uploads import (
+    create_part,
+    discard_part,
+    expire_sessions,
+    locked_part,
+    staging_path,
+    store_part,
+    write_chunk,
+)
+from app.main import app
+from app.models.notes import Attachment
+from app.models.uploads import UploadSession
+from app.routes.v1 import notes
+from app.storage import LocalStorage, storage
+from tests.conftest import UserHeaders
+
+NOTES_URL = f"{settings.API_PREFIX}/notes"
+CONTENT = bytes(range(256)) * 40
+
+
+def _usage(*owner_ids: str) -> Dict[str, Tuple[int, int]]:
+    with SessionLocal() as db:
+        return get_usage(db, *owner_ids)
+
+
+def _note(client: TestClient, headers: Dict[str, str]) -> str:
+    return client.post(
+        NOTES_URL, json={"title": "Subida", "content": "x"}, headers=headers
+    ).json()["data"]["id"]
+
+
+def _checksum(data: bytes) -> str:
+    return "sha256 " + base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+
+def _patch(client: TestClient, upload_id: str, headers, offset: int, data: bytes):
+    return client.patch(
+        f"{NOTES_URL}/uploads/{upload_id}",
+        content=data,
+        headers={
+            **headers,
+            "Upload-Offset": str(offset),
+            "Upload-Checksum": _checksum(data),
+            "Content-Type": "application/offset+octet-stream",
+        },
+    )
+
+
+def test_resumable_upload(user_headers: UserHeaders) -> None:
+    client = TestClient(app)
+    _, headers = user_headers()
+    note_id = _note(client, headers)
+
+    response = client.post(
+        f"{NOTES_URL}/{note_id}/uploads",
+        json={
+            "filename": "grande.bin",
+            "size": len(CONTENT),
+            "sha256": hashlib.sha256(CONTENT).hexdigest(),
+        },
+        headers=headers,
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    upload = response.json()["data"]
+    assert upload["offset"] == 0
+    assert response.headers["location"].endswith(f"/notes/uploads/{upload['id']}")
+    upload_url = f"{NOTES_URL}/uploads/{upload['id']}"
+
+    first = _patch(client, upload["id"], headers, 0, CONTENT[:4000])
+    assert first.status_code == status.HTTP_200_OK
+    assert first.headers["upload-offset"] == "4000"
+
+    # Fragmento corrupto: se descarta y el offset no avanza
+    bad = client.patch(
+        upload_url,
+        content=CONTENT[4000:6000],
+        headers={
+            **headers,
+            "Upload-Offset": "4000",
+            "Upload-Checksum": _checksum(b"otro"),
+        },
+    )
+    assert bad.status_code == status.HTTP_400_BAD_REQUEST
+    assert staging_path(upload["id"]).stat().st_size == 4000
+
+    # Offset desfasado (p. ej. un reintento de un fragmento ya recibido)
+    stale = _patch(client, upload["id"], headers, 0, CONTENT[:4000])
+    assert stale.status_code == status.HTTP_409_CONFLICT
+
+    # Tras un corte se consulta el offset y se sigue desde ahí
+    status_response = client.get(upload_url, headers=headers)
+    assert status_response.json()["data"]["offset"] == 4000
+    early = client.post(f"{upload_url}/complete", headers=headers)
+    assert early.status_code == status.HTTP_409_CONFLICT
+
+    # No se admiten más bytes que los anunciados
+    too_long = _patch(client, upload["id"], headers, 4000, CONTENT[4000:] + b"x")
+    assert too_long.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    assert _patch(client, upload["id"], headers, 4000, CONTENT[4000:]).status_code == (
+        status.HTTP_200_OK
+    )
+
+    response = client.post(f"{upload_url}/complete", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    attachment = response.json()["data"]
+    assert attachment["file_size"] == len(CONTENT)
+    assert attachment["note_id"] == note_id
+
+    with SessionLocal() as db:
+        key = db.get(Attachment, attachment["id"]).file_path
+        assert db.get(UploadSession, upload["id"]) is None
+    assert anyio.run(storage.read, key) == CONTENT
+    assert not staging_path(upload["id"]).exists()
+    assert client.get(upload_url, headers=headers).status_code == (
+        status.HTTP_404_NOT_FOUND
+    )
+
+
+def test_upload_is_private_and_cancellable(user_headers: UserHeaders) -> None:
+    client = TestClient(app)
+    _, headers = user_headers()
+    _, other_headers = user_headers()
+    note_id = _note(client, headers)
+
+    upload_id = client.post(
+        f"{NOTES_URL}/{note_id}/uploads",
+        json={"filename": "a.txt", "size": 10},
+        headers=headers,
+    ).json()["data"]["id"]
+    upload_url = f"{NOTES_URL}/uploads/{upload_id}"
+
+    assert client.get(upload_url, headers=other_headers).status_code == (
+        status.HTTP_404_NOT_FOUND
+    )
+    assert _patch(client, upload_id, other_headers, 0, b"x").status_code == (
+        status.HTTP_404_NOT_FOUND
+    )
+    response = client.patch(
+        upload_url,
+        content=b"x",
+        headers={**headers, "Upload-Offset": "0", "Upload-Checksum": "crc32 AAAA"},
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    assert client.delete(upload_url, headers=headers).status_code == (
+        status.HTTP_200_OK
+    )
+    assert not staging_path(upload_id).exists()
+    assert client.get(upload_url, headers=headers).status_code == (
+        status.HTTP_404_NOT_FOUND
+    )
+
+
+def test_abandoned_uploads_expire(user_headers: UserHeaders) -> None:
+    client = TestClient(app)
+    user_id, headers = user_headers()
+    note_id = _note(client, headers)
+
+    upload_id = client.post(
+        f"{NOTES_URL}/{note_id}/uploads",
+        json={"filename": "a.txt", "size": 10},
+        headers=headers,
+    ).json()["data"]["id"]
+    _patch(client, upload_id, headers, 0, b"hola")
+    assert _usage(user_id, note_id) == {user_id: (10, 1), note_id: (10, 1)}
+
+    # Un fichero de trabajo huérfano (su sesión ya no existe)
+    orphan = staging_path(str(uuid.uuid4()))
+    orphan.touch()
+
+    later = datetime.now(timezone.utc) + timedelta(
+        seconds=settings.UPLOAD_SESSION_TTL_SECONDS + 1
+    )
+    assert expire_sessions(now=later) >= 1
+    with SessionLocal() as db:
+        assert db.get(UploadSession, upload_id) is None
+    assert not staging_path(upload_id).exists()
+    assert not orphan.exists()
+    # La reserva de cuota de la sesión se devuelve
+    assert _usage(user_id, note_id) == {user_id: (0, 0), note_id: (0, 0)}
+
+
+def test_sessions_reserve_quota(
+    monkeypatch: pytest.MonkeyPatch, user_headers: UserHeaders
+) -> None:
+    monkeypatch.setattr(quotas, "NOTE_QUOTA", Quota(max_bytes=100))
+    client = TestClient(app)
+    user_id, headers = user_headers()
+    note_id = _note(client, headers)
+
+    def open_session(size: int):
+        return client.post(
+            f"{NOTES_URL}/{note_id}/uploads",
+            json={"filename": "a.bin", "size": size},
+            headers=headers,
+        )
+
+    first = open_session(60)
+    assert first.status_code == status.HTTP_201_CREATED
+    # Sesiones en paralelo no pueden reservar juntas más que la cuota
+    assert open_session(60).status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    assert _usage(note_id)[note_id] == (60, 1)
+
+    # Al completar, el adjunto hereda la reserva sin volver a sumarla
+    upload_id = first.json()["data"]["id"]
+    _patch(client, upload_id, headers, 0, b"x" * 60)
+    response = client.post(f"{NOTES_URL}/uploads/{upload_id}/complete", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert _usage(user_id, note_id) == {user_id: (60, 1), note_id: (60, 1)}
+
+    # Cancelar devuelve la reserva
+    second = open_session(40).json()["data"]["id"]
+    assert _usage(note_id)[note_id] == (100, 2)
+    client.delete(f"{NOTES_URL}/uploads/{second}", headers=headers)
+    assert _usage(note_id)[note_id] == (60, 1)
+
+
+def test_failed_completion_discards_session(
+    monkeypatch: pytest.MonkeyPatch, user_headers: UserHeaders
+) -> None:
+    client = TestClient(app)
+    user_id, headers = user_headers()
+    note_id = _note(client, headers)
+
+    def open_session(**fields):
+        upload_id = client.post(
+            f"{NOTES_URL}/{note_id}/uploads",
+            json={"filename": "a.bin", "size": 4, **fields},
+            headers=headers,
+        ).json()["data"]["id"]
+        _patch(client, upload_id, headers, 0, b"hola")
+        return upload_id
+
+    # Checksum del fichero erróneo: los bytes no tienen arreglo
+    upload_id = open_session(sha256="0" * 64)
+    response = client.post(f"{NOTES_URL}/uploads/{upload_id}/complete", headers=headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert client.get(
+        f"{NOTES_URL}/uploads/{upload_id}", headers=headers
+    ).status_code == (status.HTTP_404_NOT_FOUND)
+    assert not staging_path(upload_id).exists()
+
+    # Fallo al guardar el adjunto tras mover el fichero de trabajo
+    async def failing_save(db, background_tasks, attachment, reserved=False):
+        db.rollback()
+        raise RuntimeError("fallo al guardar")
+
+    monkeypatch.setattr(notes, "save_attachment", failing_save)
+    upload_id = open_session()
+    with pytest.raises(RuntimeError):
+        client.post(f"{NOTES_URL}/uploads/{upload_id}/complete", headers=headers)
+    with SessionLocal() as db:
+        assert db.get(UploadSession, upload_id) is None
+    assert not staging_path(upload_id).exists()
+    assert _usage(user_id, note_id) == {user_id: (0, 0), note_id: (0, 0)}
+
+
+def test_store_part_renames_into_local_storage(tmp_path: Path) -> None:
+    upload_id = str(uuid.uuid4())
+    staging_path(upload_id).write_bytes(b"contenido")
+    local = LocalStorage(str(tmp_path))
+
+    size = anyio.run(store_part, local, upload_id, "u1/f.bin")
+    assert size == 9
+    assert (tmp_path / "u1" / "f.bin").read_bytes() == b"contenido"
+    assert not staging_path(upload_id).exists()
+
+
+async def _chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+@pytest.mark.parametrize("posix", [True, False])
+def test_locked_part_is_exclusive(posix: bool, monkeypatch: pytest.MonkeyPatch):
+    if not posix:
+        # Como en Windows: ni `flock` ni `pwrite`
+        monkeypatch.setattr(uploads, "fcntl", None)
+        monkeypatch.delattr(uploads.os, "pwrite")
+    upload_id = str(uuid.uuid4())
+    create_part(upload_id)
+
+    async def scenario() -> None:
+        async with locked_part(upload_id) as fd:
+            assert await write_chunk(fd, 0, _chunks(b"hola ", b"mundo"), 100) == 10
+            with pytest.raises(HTTPException) as exc_info:
+                async with locked_part(upload_id):
+                    pass  # pragma: no cover
+            assert exc_info.value.status_code == status.HTTP_409_CONFLICT
+        async with locked_part(upload_id) as fd:
+            assert await write_chunk(fd, 4, _chunks(b"!"), 100) == 1
+
+    try:
+        anyio.run(scenario)
+        assert staging_path(upload_id).read_bytes() == b"hola!"
+    finally:
+        discard_part(upload_id)
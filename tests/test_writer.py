@@ -0,0 +1,132 @@
+import threading
+from pathlib import Path
+from typing import Generator
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config.settings import settings
+from app.config.writer import WriteQueue, write_queue
+from app.main import app
+from app.models.base import Base
+from app.models.categories import Category
+from tests.conftest import UserHeaders
+
+NOTES_URL = f"{settings.API_PREFIX}/notes"
+
+
+@pytest.fixture
+def writer(tmp_path: Path) -> Generator[WriteQueue, None, None]:
+    url = f"sqlite:///{tmp_path}/writer.db"
+    Base.metadata.create_all(create_engine(url))
+    queue = WriteQueue(url)
+    queue.start()
+    yield queue
+    queue.stop()
+
+
+def _add_category(name: str):  # type: ignore[no-untyped-def]
+    def unit(db: Session) -> str:
+        category = Category(name=name)
+        db.add(category)
+        db.flush()
+        return category.id
+
+    return unit
+
+
+def test_write_queue_groups_commits_and_isolates_errors(writer: WriteQueue) -> None:
+    started, release = threading.Event(), threading.Event()
+
+    def blocking(db: Session) -> str:
+        started.set()
+        release.wait(5)
+        return "first"
+
+    first = writer.submit(blocking)
+    assert started.wait(5)
+    # Mientras el escritor está ocupado, las unidades se acumulan en la cola
+    futures = [writer.submit(_add_category(f"cat-{i}")) for i in range(10)]
+    duplicate = writer.submit(_add_category("cat-0"))
+    release.set()
+
+    assert first.result(5) == "first"
+    ids = [future.result(5) for future in futures]
+    assert len(set(ids)) == 10
+    with pytest.raises(IntegrityError):
+        duplicate.result(5)
+    # Un commit para la primera unidad y otro para las once acumuladas
+    assert writer.commits == 2
+
+    count = writer.run(lambda db: db.scalar(select(func.count(Category.id))))
+    assert count == 10
+
+
+def test_write_queue_stop_drains_pending(tmp_path: Path) -> None:
+    url = f"sqlite:///{tmp_path}/drain.db"
+    Base.metadata.create_all(create_engine(url))
+    queue = WriteQueue(url, max_batch=4)
+    queue.start()
+    futures = [queue.submit(_add_category(f"drain-{i}")) for i in range(10)]
+    queue.stop()
+    assert all(future.done() and future.exception() is None for future in futures)
+    with pytest.raises(RuntimeError):
+        queue.submit(_add_category("late"))
+
+
+def test_note_routes_write_through_queue(user_headers: UserHeaders) -> None:
+    user_id, headers = user_headers()
+    client = TestClient(app)
+
+    write_queue.start()
+    try:
+        response = client.post(
+            NOTES_URL, json={"title": "Cola", "content": "x"}, headers=headers
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        note_id = response.json()["data"]["id"]
+        response = client.put(
+            f"{NOTES_URL}/{note_id}",
+            json={"title": "Cola 2"},
+            headers={**headers, "If-Match": response.headers["ETag"]},
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["data"]["title"] == "Cola 2"
+        assert write_queue.commits == 2
+
+        other_id, other_headers = user_headers()
+        share_url = f"{NOTES_URL}/{note_id}/share/{other_id}"
+        assert client.post(share_url, headers=headers).status_code == (
+            status.HTTP_200_OK
+        )
+        shared = client.get(f"{NOTES_URL}/{note_id}", headers=other_headers)
+        assert shared.json()["data"]["title"] == "Cola 2"
+        assert client.delete(share_url, headers=headers).status_code == (
+            status.HTTP_200_OK
+        )
+        # Quitar al último usuario con acceso falla dentro de la unidad
+        response = client.post(
+            f"{NOTES_URL}/{note_id}/unshare",
+            json={"users": [user_id]},
+            headers=headers,
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        response = client.post(
+            f"{NOTES_URL}/import",
+            content=b'{"title": "Importada", "content": "x"}\n',
+            headers=headers,
+        )
+        assert response.json()["data"]["imported"] == 1
+        assert client.delete(f"{NOTES_URL}/{note_id}", headers=headers).status_code == (
+            status.HTTP_200_OK
+        )
+        assert client.get(f"{NOTES_URL}/{note_id}", headers=headers).status_code == (
+            status.HTTP_404_NOT_FOUND
+        )
+        assert write_queue.commits == 7
+    finally:
+        write_queue.stop()
@@ -0,0 +1,229 @@
+import io
+import struct
+import zipfile
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, List, Tuple
+
+import anyio
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from app.config.settings import settings
+from app.helpers import zipstream
+from app.helpers.zipstream import (
+    ZipEntry,
+    entry_names,
+    is_precompressed,
+    needs_zip64,
+    stream_zip,
+)
+from app.main import app
+from app.storage import ObjectNotFound
+from tests.conftest import UserHeaders
+
+NOTES_URL = f"{settings.API_PREFIX}/notes"
+MODIFIED = datetime(2024, 5, 17, 10, 30, 24)
+
+
+async def _chunks(*parts: bytes) -> AsyncIterator[bytes]:
+    for part in parts:
+        yield part
+
+
+async def _missing() -> AsyncIterator[bytes]:
+    raise ObjectNotFound("u1/nada.txt")
+    yield b""  # pragma: no cover
+
+
+async def _archive(*entries: ZipEntry) -> bytes:
+    async def source() -> AsyncIterator[ZipEntry]:
+        for entry in entries:
+            yield entry
+
+    parts: List[bytes] = [part async for part in stream_zip(source())]
+    return b"".join(parts)
+
+
+def _build() -> bytes:
+    return anyio.run(
+        _archive,
+        ZipEntry("notas.txt", _chunks(b"hola " * 1000, b"mundo"), MODIFIED),
+        ZipEntry("foto.jpg", _chunks(b"\xff\xd8jpeg"), MODIFIED, compress=False),
+        ZipEntry("falta.txt", _missing(), MODIFIED),
+        ZipEntry("vacío.txt", _chunks(), MODIFIED),
+    )
+
+
+def test_stream_zip() -> None:
+    with zipfile.ZipFile(io.BytesIO(_build())) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == ["notas.txt", "foto.jpg", "vacío.txt"]
+        notes, photo, _ = archive.infolist()
+        assert notes.compress_type == zipfile.ZIP_DEFLATED
+        assert notes.compress_size < notes.file_size
+        assert photo.compress_type == zipfile.ZIP_STORED
+        assert notes.date_time == (2024, 5, 17, 10, 30, 24)
+        assert archive.read("notas.txt") == b"hola " * 1000 + b"mundo"
+        assert archive.read("vacío.txt") == b""
+
+
+def test_stream_zip64(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Con límites bajos todos los campos pasan a las extensiones ZIP64
+    monkeypatch.setattr(zipstream, "ZIP64_LIMIT", 1)
+    monkeypatch.setattr(zipstream, "ZIP64_COUNT_LIMIT", 1)
+    data = _build()
+    assert b"PK\x06\x06" in data and b"PK\x06\x07" in data
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        assert archive.read("foto.jpg") == b"\xff\xd8jpeg"
+        assert archive.read("notas.txt") == b"hola " * 1000 + b"mundo"
+
+
+def _walk_local_entries(data: bytes) -> List[Tuple[str, bool, bytes]]:
+    """
+    Lee el archivo como un lector en streaming: cabecera local, datos y data
+    descriptor, sin mirar el directorio central. Devuelve `(nombre, zip64,
+    contenido)` por entrada.
+    """
+    entries: List[Tuple[str, bool, bytes]] = []
+    position = 0
+    while data[position : position + 4] == b"PK\x03\x04":
+        (
+            version,
+            flags,
+            method,
+            compressed_size,
+            size,
+            name_length,
+            extra_length,
+        ) = struct.unpack_from("<4xHHH8xIIHH", data, position)
+        assert flags & 0x08
+        position += 30
+        name = data[position : position + name_length].decode()
+        extra = data[position + name_length : position + name_length + extra_length]
+        position += name_length + extra_length
+        zip64 = extra[:2] == b"\x01\x00"
+        if zip64:
+            assert version == 45
+            assert (compressed_size, size) == (0xFFFFFFFF, 0xFFFFFFFF)
+            assert struct.unpack("<HHQQ", extra) == (0x0001, 16, 0, 0)
+        else:
+            assert version == 20 and extra == b""
+        if method == zipfile.ZIP_DEFLATED:
+            decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            content = decompressor.decompress(data[position:])
+            consumed = len(data) - position - len(decompressor.unused_data)
+        else:
+            # Sin compresión el final solo se sabe por la firma del descriptor
+            consumed = data.index(b"PK\x07\x08", position) - position
+            content = data[position : position + consumed]
+        position += consumed
+        descriptor = "<IIQQ" if zip64 else "<IIII"
+        signature, crc, compressed_size, size = struct.unpack_from(
+            descriptor, data, position
+        )
+        assert signature == 0x08074B50
+        assert (crc, compressed_size, size) == (
+            zlib.crc32(content),
+            consumed,
+            len(content),
+        )
+        position += struct.calcsize(descriptor)
+        entries.append((name, zip64, content))
+    assert data[position : position + 4] == b"PK\x01\x02"
+    return entries
+
+
+def test_stream_zip_local_headers(monkeypatch: pytest.MonkeyPatch) -> None:
+    data = anyio.run(
+        _archive,
+        ZipEntry("a.txt", _chunks(b"a" * 100), MODIFIED, size=100),
+        ZipEntry("b.txt", _chunks(b"b" * 100), MODIFIED),
+        ZipEntry("c.bin", _chunks(b"c" * 10), MODIFIED, compress=False, size=10),
+    )
+    assert _walk_local_entries(data) == [
+        ("a.txt", False, b"a" * 100),
+        ("b.txt", True, b"b" * 100),
+        ("c.bin", False, b"c" * 10),
+    ]
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+
+    # Una entrada que se acerca al límite lleva el extra ZIP64 desde el
+    # principio aunque su tamaño quede por debajo
+    monkeypatch.setattr(zipstream, "ZIP64_LIMIT", 1000)
+    assert needs_zip64(990, compress=True)
+    assert not needs_zip64(990, compress=False)
+    data = anyio.run(
+        _archive,
+        ZipEntry("a.txt", _chunks(b"a" * 990), MODIFIED, size=990),
+        ZipEntry("b.bin", _chunks(b"b" * 10), MODIFIED, compress=False, size=10),
+    )
+    assert _walk_local_entries(data) == [
+        ("a.txt", True, b"a" * 990),
+        ("b.bin", False, b"b" * 10),
+    ]
+
+    # Si el contenido supera lo anunciado el archivo se corta
+    with pytest.raises(ValueError):
+        anyio.run(
+            _archive,
+            ZipEntry("c.bin", _chunks(b"c" * 1000), MODIFIED, compress=False, size=10),
+        )
+
+
+def test_entry_names() -> None:
+    assert entry_names(["a.txt", "A.txt", "a.txt", "../x/b.png", ""]) == [
+        "a.txt",
+        "A (1).txt",
+        "a (2).txt",
+        ".._x_b.png",
+        "archivo",
+    ]
+    assert is_precompressed("image/JPEG")
+    assert is_precompressed("video/mp4")
+    assert not is_precompressed("text/plain; charset=utf-8")
+    assert not is_precompressed("image/bmp")
+
+
+def test_download_attachments_zip(user_headers: UserHeaders) -> None:
+    client = TestClient(app)
+    _, headers = user_headers()
+    note_id = client.post(
+        NOTES_URL, json={"title": "Zip", "content": "x"}, headers=headers
+    ).json()["data"]["id"]
+    for filename, content, mime_type in (
+        ("informe.txt", b"linea\n" * 500, "text/plain"),
+        ("foto.png", b"\x89PNG datos", "image/png"),
+        ("informe.txt", b"otra version", "text/plain"),
+    ):
+        response = client.post(
+            f"{NOTES_URL}/{note_id}/attachments",
+            files={"file": (filename, content, mime_type)},
+            headers=headers,
+        )
+        assert response.status_code == status.HTTP_200_OK
+
+    response = client.get(f"{NOTES_URL}/{note_id}/attachments.zip", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/zip"
+    assert "content-encoding" not in response.headers
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert archive.testzip() is None
+        assert sorted(archive.namelist()) == [
+            "foto.png",
+            "informe (1).txt",
+            "informe.txt",
+        ]
+        assert archive.getinfo("foto.png").compress_type == zipfile.ZIP_STORED
+        assert archive.getinfo("informe.txt").compress_type == zipfile.ZIP_DEFLATED
+        contents = {archive.read(name) for name in archive.namelist()}
+    assert contents == {b"linea\n" * 500, b"\x89PNG datos", b"otra version"}
+    # Con el tamaño de cada adjunto ninguna entrada necesita ZIP64
+    assert not any(zip64 for _, zip64, _ in _walk_local_entries(response.content))
+
+    _, other_headers = user_headers()
+    other = client.get(f"{NOTES_URL}/{note_id}/attachments.zip", headers=other_headers)
+    assert other.status_code == status.HTTP_404_NOT_FOUND